@@ -39,6 +39,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.metrics.RequestMetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -53,7 +54,7 @@ ROOT_URLCONF = 'config.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'core.metrics.TimedDjangoTemplates',
         'DIRS': [],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -70,18 +71,59 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'config.wsgi.application'
 
-# PostgreSQL database settings from .env
+# 'wsgi' (sync gunicorn workers) or 'asgi' (gunicorn running uvicorn workers,
+# which serve the async JSON endpoints on an event loop); see gunicorn.conf.py
+SERVER_MODE = os.getenv('SERVER_MODE', 'wsgi').lower()
+
+# Connection reuse. By default each worker keeps its connection for
+# DB_CONN_MAX_AGE seconds (checked before reuse, so a dropped connection is
+# replaced rather than erroring). DB_POOL_MAX_SIZE > 0 switches to Django's
+# native connection pool instead, which needs psycopg 3: pip install "psycopg[binary,pool]".
+DB_CONN_MAX_AGE = int(os.getenv('DB_CONN_MAX_AGE', 60))
+DB_POOL_MIN_SIZE = int(os.getenv('DB_POOL_MIN_SIZE', 1))
+DB_POOL_MAX_SIZE = int(os.getenv('DB_POOL_MAX_SIZE', 0))
+DB_POOL_TIMEOUT = int(os.getenv('DB_POOL_TIMEOUT', 10))
+# Needed behind a transaction-mode pooler such as PgBouncer or Supabase's port 6543
+DB_DISABLE_SERVER_SIDE_CURSORS = os.getenv('DB_DISABLE_SERVER_SIDE_CURSORS', 'False').lower() in ('1', 'true', 'yes')
+
+
+def database_config(url=None, **fallback):
+    config = dj_database_url.parse(url) if url else {'ENGINE': 'django.db.backends.postgresql', **fallback}
+    if DB_POOL_MAX_SIZE and config['ENGINE'] == 'django.db.backends.postgresql':
+        config['CONN_MAX_AGE'] = 0
+        config.setdefault('OPTIONS', {})['pool'] = {
+            'min_size': DB_POOL_MIN_SIZE, 'max_size': DB_POOL_MAX_SIZE, 'timeout': DB_POOL_TIMEOUT,
+        }
+    else:
+        # Persistent connections aren't reliably released under ASGI; use the pool there
+        config['CONN_MAX_AGE'] = 0 if SERVER_MODE == 'asgi' else DB_CONN_MAX_AGE
+        config['CONN_HEALTH_CHECKS'] = True
+    config['DISABLE_SERVER_SIDE_CURSORS'] = DB_DISABLE_SERVER_SIDE_CURSORS
+    return config
+
+
+# PostgreSQL database settings from .env; DATABASE_URL (e.g. Supabase) wins
+# over the POSTGRES_* variables used by the bundled container
 DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.postgresql_psycopg2',
-        'NAME': os.getenv('POSTGRES_DB'),
-        'USER': os.getenv('POSTGRES_USER'),
-        'PASSWORD': os.getenv('POSTGRES_PASSWORD'),
-        'HOST': os.getenv('POSTGRES_HOST'),
-        'PORT': os.getenv('POSTGRES_PORT'),
-    }
+    'default': database_config(
+        os.getenv('DATABASE_URL'),
+        NAME=os.getenv('POSTGRES_DB'),
+        USER=os.getenv('POSTGRES_USER'),
+        PASSWORD=os.getenv('POSTGRES_PASSWORD'),
+        HOST=os.getenv('POSTGRES_HOST'),
+        PORT=os.getenv('POSTGRES_PORT'),
+    )
 }
 
+# Optional read replica. Views marked @read_from_replica (dashboard, invoice
+# list, reports, autocomplete) read from it; everything else, and every
+# write, uses the primary. Tests mirror it onto the default test database.
+if os.getenv('DATABASE_REPLICA_URL'):
+    DATABASES['replica'] = database_config(os.getenv('DATABASE_REPLICA_URL'))
+    DATABASES['replica']['TEST'] = {'MIRROR': 'default'}
+
+DATABASE_ROUTERS = ['core.db_routers.ReplicaRouter']
+
 # ------------------
 
 
@@ -122,5 +164,60 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'core', 'static')
 # ADD THIS LINE:
 STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
 
+# Rendered invoice PDF cache. Point PDF_CACHE_DIR at a shared volume so all
+# workers and containers reuse each other's renders; 0 bytes disables it.
+PDF_CACHE_DIR = os.getenv('PDF_CACHE_DIR', os.path.join(BASE_DIR, 'pdf_cache'))
+PDF_CACHE_MAX_BYTES = int(os.getenv('PDF_CACHE_MAX_BYTES', 512 * 1024 * 1024))
+
+# Render PDFs in 'manage.py run_pdf_worker' instead of the request thread.
+# Needs the PDF cache and a running worker (the 'worker' compose service).
+PDF_RENDER_ASYNC = os.getenv('PDF_RENDER_ASYNC', 'False').lower() in ('1', 'true', 'yes')
+
+# Worker processes used to render bulk PDF exports
+PDF_EXPORT_WORKERS = int(os.getenv('PDF_EXPORT_WORKERS', os.cpu_count() or 1))
+
+# Finished bulk PDF exports (core.export_jobs), shared by run_export_worker
+# and the web workers that serve the downloads; kept PDF_EXPORT_KEEP_HOURS
+PDF_EXPORT_DIR = os.getenv('PDF_EXPORT_DIR', os.path.join(BASE_DIR, 'pdf_exports'))
+PDF_EXPORT_KEEP_HOURS = int(os.getenv('PDF_EXPORT_KEEP_HOURS', 24))
+
+# 'canvas' draws invoice PDFs straight onto the canvas (core.pdf_canvas), falling
+# back to the platypus layout for invoices that do not fit it; 'platypus' always uses it
+PDF_RENDERER = os.getenv('PDF_RENDERER', 'platypus')
+
+# Final PDFs of closed financial years (core.pdf_archive); never evicted
+PDF_ARCHIVE_DIR = os.getenv('PDF_ARCHIVE_DIR', os.path.join(BASE_DIR, 'pdf_archive'))
+
+# Prefix for invoice numbers, e.g. INV/2025-26/001 (core.numbering)
+INVOICE_NUMBER_SERIES = os.getenv('INVOICE_NUMBER_SERIES', 'INV')
+
+# In-memory autocomplete index (core.autocomplete): how often each worker
+# picks up other workers' saves, and how often it rebuilds from scratch
+AUTOCOMPLETE_REFRESH_SECONDS = int(os.getenv('AUTOCOMPLETE_REFRESH_SECONDS', 30))
+AUTOCOMPLETE_REBUILD_SECONDS = int(os.getenv('AUTOCOMPLETE_REBUILD_SECONDS', 3600))
+
+# Shared cache (core.caching): 'locmem' is per process, so use 'file' (a
+# directory all workers can reach) or 'redis' (needs the redis package) when
+# running more than one worker
+CACHE_BACKENDS = {
+    'locmem': ('django.core.cache.backends.locmem.LocMemCache', 'billdash'),
+    'file': ('django.core.cache.backends.filebased.FileBasedCache', os.path.join(BASE_DIR, 'cache')),
+    'redis': ('django.core.cache.backends.redis.RedisCache', 'redis://127.0.0.1:6379/1'),
+}
+CACHE_BACKEND = os.getenv('CACHE_BACKEND', 'locmem').lower()
+CACHES = {
+    'default': {
+        'BACKEND': CACHE_BACKENDS[CACHE_BACKEND][0],
+        'LOCATION': os.getenv('CACHE_LOCATION') or CACHE_BACKENDS[CACHE_BACKEND][1],
+    }
+}
+DASHBOARD_CACHE_SECONDS = int(os.getenv('DASHBOARD_CACHE_SECONDS', 300))
+
+# Request metrics (core.metrics): Server-Timing headers on every response, and
+# where workers share their histograms for /metrics (empty = per worker only)
+SERVER_TIMING = os.getenv('SERVER_TIMING', 'True').lower() in ('1', 'true', 'yes')
+METRICS_DIR = os.getenv('METRICS_DIR', '')
+METRICS_FLUSH_SECONDS = int(os.getenv('METRICS_FLUSH_SECONDS', 10))
+
 # Default auto field
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
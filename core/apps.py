@@ -4,3 +4,19 @@ from django.apps import AppConfig
 class ApiConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'core'
+
+    def ready(self):
+        from django.db.backends.signals import connection_created
+        from django.db.models.signals import post_delete, post_save
+
+        from . import caching
+        from .metrics import install_sql_wrapper
+        from .models import Invoice, InvoiceItem
+
+        connection_created.connect(install_sql_wrapper, dispatch_uid='core.metrics.install_sql_wrapper')
+        post_save.connect(caching.invalidate, sender=Invoice, dispatch_uid='core.caching.Invoice')
+        post_save.connect(caching.invalidate, sender=InvoiceItem, dispatch_uid='core.caching.InvoiceItem')
+        post_delete.connect(caching.invalidate, sender=Invoice, dispatch_uid='core.caching.Invoice')
+        # No post_delete receiver for InvoiceItem: any receiver makes Django fetch
+        # every item before deleting it instead of one DELETE. Items are only ever
+        # deleted with their invoice or while it is being saved, which bumps already.
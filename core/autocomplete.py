@@ -0,0 +1,344 @@
+"""
+In-memory autocomplete for the invoice form.
+
+Each worker keeps one AutocompleteIndex holding every HSN code, item
+description, buyer name and buyer GSTIN seen on an invoice, with how often
+and how recently each was used. Keys live in a sorted list (prefix search by
+bisection) and a trigram map (substring search), so lookups never touch the
+database.
+
+The index is built on first use (gunicorn warms it at worker boot) and kept
+fresh incrementally: the worker that saves an invoice folds it in right after
+commit, or, if a refresh or rebuild is already running, leaves it to that one
+so the save never waits. Other workers' saves are picked up by a background check, started by
+a lookup at most every GENERATION_CHECK_SECONDS: if the shared invoice-data
+generation (core.caching) moved on, or the index is older than
+AUTOCOMPLETE_REFRESH_SECONDS, it folds in the invoices updated since the last
+refresh. Lookups themselves never wait on the cache or the database. Usage counts can drift upward when invoices are edited or
+deleted, so the whole index is rebuilt in the background every
+AUTOCOMPLETE_REBUILD_SECONDS.
+"""
+import bisect
+import heapq
+import threading
+import time
+from collections import defaultdict
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import Count, Max
+from django.utils.timezone import now
+
+from . import caching
+from .db_routers import replica_reads
+from .models import Invoice, InvoiceItem
+
+FIELDS = ('hsn', 'description', 'buyer', 'gstin')
+RANKINGS = ('frequency', 'recency')
+
+# Invoices committed a little after their updated_on was stamped (or that
+# reach the read replica late) are still picked up by the next refresh
+REFRESH_OVERLAP = timedelta(seconds=60)
+
+# How often lookups may start a check for other workers' saves
+GENERATION_CHECK_SECONDS = 2
+
+
+class _Entry:
+    __slots__ = ('value', 'count', 'last_used')
+
+    def __init__(self, value):
+        self.value = value
+        self.count = 0
+        self.last_used = None
+
+    def add(self, count, last_used):
+        self.count += count
+        if last_used and (self.last_used is None or last_used > self.last_used):
+            self.last_used = last_used
+
+    def as_dict(self):
+        return {'value': self.value, 'count': self.count, 'last_used': self.last_used}
+
+
+def _trigrams(key):
+    return {key[i:i + 3] for i in range(len(key) - 2)}
+
+
+class PrefixIndex:
+    """Case-insensitive prefix and substring search over a set of strings."""
+
+    def __init__(self):
+        self._entries = {}
+        self._keys = []
+        self._keys_sorted = True
+        self._grams = defaultdict(set)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def add(self, value, count=1, last_used=None):
+        value = (value or '').strip()
+        if not value:
+            return
+        key = value.upper()
+        entry = self._entries.get(key)
+        if entry is None:
+            entry = self._entries[key] = _Entry(value)
+            # Sorted once on the next search: insort per key makes a full build quadratic
+            self._keys.append(key)
+            self._keys_sorted = False
+            for gram in _trigrams(key):
+                self._grams[gram].add(key)
+        entry.add(count, last_used)
+
+    def search(self, query, limit=10, rank='frequency'):
+        query = query.strip().upper()
+        if not query:
+            return []
+        if not self._keys_sorted:
+            self._keys.sort()
+            self._keys_sorted = True
+
+        prefix_keys = []
+        i = bisect.bisect_left(self._keys, query)
+        while i < len(self._keys) and self._keys[i].startswith(query):
+            prefix_keys.append(self._keys[i])
+            i += 1
+
+        substring_keys = []
+        if len(query) >= 3:
+            grams = sorted((self._grams.get(g, set()) for g in _trigrams(query)), key=len)
+            candidates = set.intersection(*grams) if grams and grams[0] else set()
+            substring_keys = [k for k in candidates if query in k and not k.startswith(query)]
+
+        # Prefix matches rank above substring matches, then by usage
+        def score(key):
+            entry = self._entries[key]
+            usage = entry.count if rank == 'frequency' else (entry.last_used.toordinal() if entry.last_used else 0)
+            return -usage, key
+
+        best = heapq.nsmallest(limit, prefix_keys, key=score)
+        if len(best) < limit:
+            best += heapq.nsmallest(limit - len(best), substring_keys, key=score)
+        return [self._entries[k].as_dict() for k in best]
+
+
+class AutocompleteIndex:
+    def __init__(self):
+        self.fields = {field: PrefixIndex() for field in FIELDS}
+        self.hsn_descriptions = defaultdict(dict)  # HSN -> {description key: _Entry}
+        self.buyer_details = defaultdict(dict)     # GSTIN -> {(name, address, place): _Entry}
+
+    def add_item(self, hsn_code, description, count, last_used):
+        self.fields['hsn'].add(hsn_code, count, last_used)
+        self.fields['description'].add(description, count, last_used)
+        if hsn_code and description:
+            descriptions = self.hsn_descriptions[hsn_code.strip()]
+            entry = descriptions.setdefault(description.upper(), _Entry(description))
+            entry.add(count, last_used)
+
+    def add_buyer(self, gstin, name, address, place_of_supply, count, last_used):
+        self.fields['buyer'].add(name, count, last_used)
+        self.fields['gstin'].add(gstin, count, last_used)
+        if gstin:
+            details = self.buyer_details[gstin.strip().upper()]
+            entry = details.setdefault((name, address, place_of_supply), _Entry((name, address, place_of_supply)))
+            entry.add(count, last_used)
+
+    def load(self, invoices, items):
+        """Fold in grouped rows from the Invoice and InvoiceItem querysets."""
+        for row in items:
+            self.add_item(row['hsn_code'], row['description'], row['count'], row['last_used'])
+        for row in invoices:
+            self.add_buyer(row['buyer_gstin'], row['buyer_name'], row['buyer_address'],
+                           row['place_of_supply'], row['count'], row['last_used'])
+
+
+def _grouped_rows(invoice_filter=None):
+    invoices = Invoice.objects.all()
+    items = InvoiceItem.objects.all()
+    if invoice_filter is not None:
+        invoices = invoices.filter(**invoice_filter)
+        items = items.filter(**{f"invoice__{k}": v for k, v in invoice_filter.items()})
+    invoices = (
+        invoices.values('buyer_gstin', 'buyer_name', 'buyer_address', 'place_of_supply')
+        .annotate(count=Count('id'), last_used=Max('invoice_date')).order_by()
+    )
+    items = (
+        items.values('hsn_code', 'description')
+        .annotate(count=Count('id'), last_used=Max('invoice__invoice_date')).order_by()
+    )
+    return invoices, items
+
+
+class _IndexHolder:
+    """Owns the worker's index and keeps it fresh."""
+
+    def __init__(self):
+        self.lock = threading.Lock()           # guards the index contents
+        self.refresh_lock = threading.Lock()   # one refresh or rebuild at a time
+        self.index = None
+        self.built_at = 0.0
+        self.refreshed_at = 0.0
+        self.checked_at = 0.0
+        self.synced_until = None   # updated_on high-water mark already folded in
+        self.generation = None     # caching.generation() the index is known to include
+        self.applied = {}          # invoice id -> updated_on, for the overlap window
+        self.refreshing = False
+        self.refresh_wanted = False   # set when a refresh found another one running
+
+    def get(self):
+        if self.index is None:
+            with self.lock:
+                if self.index is None:
+                    self._build()
+        else:
+            self._maybe_refresh_in_background()
+        return self.index
+
+    def _build(self):
+        started, generation = now(), caching.generation()
+        index = AutocompleteIndex()
+        index.load(*_grouped_rows())
+        self.index = index
+        self.synced_until, self.generation = started, generation
+        self.applied = {}
+        self.built_at = self.refreshed_at = time.monotonic()
+
+    def refresh(self):
+        """
+        Fold in invoices created or edited since the last refresh.
+
+        Never waits: if a refresh or rebuild is already running, it is asked to
+        refresh again once it is done, which picks this caller's changes up.
+        """
+        self.refresh_wanted = True
+        # The holder checks refresh_wanted after releasing the lock, so a flag set
+        # while it held the lock is never dropped
+        while self.refresh_wanted and self.refresh_lock.acquire(blocking=False):
+            try:
+                self.refresh_wanted = False
+                if self.index is not None:
+                    self._refresh()
+            finally:
+                self.refresh_lock.release()
+
+    def _refresh(self):
+        started, generation = now(), caching.generation()
+        since = self.synced_until - REFRESH_OVERLAP
+        changed = dict(
+            Invoice.objects.filter(updated_on__gt=since).values_list('id', 'updated_on')
+        )
+        fresh_ids = [pk for pk, updated_on in changed.items() if self.applied.get(pk) != updated_on]
+        if fresh_ids:
+            invoices, items = _grouped_rows({'id__in': fresh_ids})
+            invoices, items = list(invoices), list(items)
+            with self.lock:
+                self.index.load(invoices, items)
+        with self.lock:
+            self.applied = {pk: u for pk, u in {**self.applied, **changed}.items() if u > since}
+            self.synced_until, self.generation = started, generation
+            self.refreshed_at = time.monotonic()
+
+    def _maybe_refresh_in_background(self):
+        # Runs on every lookup, on the event loop under ASGI: in-memory checks only
+        if self.refreshing or time.monotonic() - self.checked_at < GENERATION_CHECK_SECONDS:
+            return
+        with self.lock:
+            if self.refreshing:
+                return
+            self.refreshing = True
+            self.checked_at = time.monotonic()
+        threading.Thread(target=self._background, daemon=True).start()
+
+    def _background(self):
+        try:
+            with replica_reads():
+                self._refresh_if_stale()
+        finally:
+            self.refreshing = False
+            connections.close_all()
+
+    def _refresh_if_stale(self):
+        age = time.monotonic() - self.refreshed_at
+        if age < settings.AUTOCOMPLETE_REFRESH_SECONDS and caching.generation() == self.generation:
+            return
+        self._background_work(rebuild=time.monotonic() - self.built_at >= settings.AUTOCOMPLETE_REBUILD_SECONDS)
+
+    def _background_work(self, rebuild):
+        if rebuild:
+            with self.refresh_lock:
+                holder = _IndexHolder()
+                holder._build()
+                with self.lock:
+                    self.index, self.synced_until, self.applied = holder.index, holder.synced_until, {}
+                    self.generation = holder.generation
+                    self.built_at = self.refreshed_at = time.monotonic()
+            if self.refresh_wanted:
+                self.refresh()
+        else:
+            self.refresh()
+
+
+_holder = _IndexHolder()
+
+
+def search(field, query, limit=10, rank='frequency'):
+    index = _holder.get()
+    with _holder.lock:
+        return index.fields[field].search(query, limit=limit, rank=rank)
+
+
+def descriptions_for_hsn(hsn):
+    index = _holder.get()
+    with _holder.lock:
+        entries = list(index.hsn_descriptions.get(hsn.strip(), {}).values())
+    entries.sort(key=lambda e: -e.count)
+    return [e.value for e in entries]
+
+
+def buyers_for_gstin(gstin):
+    index = _holder.get()
+    with _holder.lock:
+        entries = list(index.buyer_details.get(gstin.strip().upper(), {}).values())
+    entries.sort(key=lambda e: (e.last_used is not None, e.last_used), reverse=True)
+    return [
+        {'buyer_name': name, 'buyer_address': address, 'place_of_supply': place}
+        for name, address, place in (e.value for e in entries)
+    ]
+
+
+# Async variants for the async views. Only building the index touches the
+# database, so that happens in a worker thread; lookups after that are
+# in-memory and run on the event loop.
+
+async def _aready():
+    if _holder.index is None:
+        await sync_to_async(_holder.get)()
+
+
+async def asearch(field, query, limit=10, rank='frequency'):
+    await _aready()
+    return search(field, query, limit=limit, rank=rank)
+
+
+async def adescriptions_for_hsn(hsn):
+    await _aready()
+    return descriptions_for_hsn(hsn)
+
+
+async def abuyers_for_gstin(gstin):
+    await _aready()
+    return buyers_for_gstin(gstin)
+
+
+def refresh_on_commit():
+    """Called by the invoice write paths so this worker sees its own saves at once."""
+    transaction.on_commit(_holder.refresh)
+
+
+def warm_up():
+    _holder.get()
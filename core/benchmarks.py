@@ -0,0 +1,238 @@
+"""
+Benchmarks for the hot paths: invoice PDF rendering, the dashboard, the
+invoice list API and the invoice create/edit views.
+
+Everything runs against a throwaway test database created the same way
+``manage.py test`` does (``--keepdb`` keeps it, with its seeded invoices, for
+the next run), so real data is never touched. The dashboard, list and write
+cases go through the test client and the full middleware stack; they are run
+at each requested dataset size, seeding only the invoices the database is
+still short of. ``dashboard`` computes the figures on every run;
+``dashboard/cached`` is the same page served from the cache.
+
+Every case runs once to warm up (that run's queries are counted), then
+``repeat`` timed runs, then one run under tracemalloc for peak Python memory.
+Tracing slows code down a lot, so it is kept out of the timed runs.
+"""
+import json
+import platform
+import statistics
+import subprocess
+import time
+import tracemalloc
+import uuid
+from datetime import date, timedelta
+from decimal import Decimal
+
+import django
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+
+from . import caching, seeding
+from .models import Invoice, InvoiceItem, User
+
+PDF_ITEM_COUNTS = (1, 8, 9, 100, 1000)   # 8 and 9 straddle ITEMS_PER_PAGE
+DATASET_SIZES = (10_000, 100_000, 1_000_000)
+
+
+class BenchmarkError(Exception):
+    """A benchmarked request did not succeed."""
+
+
+def measure(fn, repeat):
+    with CaptureQueriesContext(connection) as queries:
+        fn()
+    # Read now: the next request clears the connection's query log
+    query_count = len(queries)
+    times = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        times.append((time.perf_counter() - started) * 1000)
+    tracemalloc.start()
+    try:
+        fn()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return {
+        'wall_ms_min': round(min(times), 3),
+        'wall_ms_median': round(statistics.median(times), 3),
+        'wall_ms_max': round(max(times), 3),
+        'peak_memory_kb': round(peak / 1024, 1),
+        'queries': query_count,
+    }
+
+
+# ------------------------- Data -------------------------
+
+def invoice_with_items(count, today):
+    """A saved invoice with ``count`` items, for the PDF and edit cases."""
+    subtotal = Decimal(500 * count)
+    tax = (subtotal * Decimal('0.05')).quantize(Decimal('0.01'))
+    invoice = Invoice.objects.create(
+        invoice_number=f"BENCH/{uuid.uuid4().hex[:12]}",
+        invoice_date=today,
+        seller_name='KAVIN TEX',
+        buyer_name='BENCH BUYER',
+        buyer_gstin='33ABCDE0001F1Z5',
+        place_of_supply='33',
+        subtotal=subtotal,
+        cgst_total=tax / 2,
+        sgst_total=tax / 2,
+        grand_total=(subtotal + tax).quantize(Decimal(1)),
+        total_in_words='Benchmark Rupees Only',
+    )
+    InvoiceItem.objects.bulk_create([
+        InvoiceItem(
+            invoice=invoice, description=f"FABRIC {line % 40}", hsn_code=f"52{line % 12:02d}",
+            quantity=Decimal('10'), rate=Decimal('50.00'), gst_rate=Decimal('5.00'),
+        )
+        for line in range(count)
+    ])
+    return invoice
+
+
+def seed(target, today, log=None):
+    """Add synthetic invoices (core.seeding) over the two years to ``today`` until there are ``target``."""
+    have = Invoice.objects.count()
+    if target <= have:
+        return
+    progress = (lambda done, items: log(f"  {have + done:,}")) if log else None
+    seeding.seed_invoices(target - have, seed=have, last_day=today, years=2, progress=progress)
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE")
+
+
+def _payload(invoice_date, items):
+    return {
+        'invoice_date': invoice_date.strftime('%d-%m-%Y'),
+        'seller_name': 'KAVIN TEX', 'seller_address': 'Tharamangalam', 'seller_gstin': '33BUUPR3263F2Z9',
+        'seller_state': 'Tamil Nadu', 'seller_state_code': '33',
+        'buyer_name': 'bench buyer', 'buyer_gstin': '33ABCDE0001F1Z5', 'place_of_supply': '33',
+        'subtotal': '5000.00', 'cgst_total': '125.00', 'sgst_total': '125.00', 'igst_total': '0.00',
+        'grand_total': '5250.00', 'total_in_words': 'Five Thousand Two Hundred Fifty Rupees Only',
+        'items': items,
+    }
+
+
+# ------------------------- Cases -------------------------
+
+def _request(client, method, url, expected, **kwargs):
+    def run():
+        response = getattr(client, method)(url, **kwargs)
+        if response.status_code != expected:
+            raise BenchmarkError(f"{method.upper()} {url} returned {response.status_code}")
+        if getattr(response, 'streaming', False):
+            b''.join(response.streaming_content)
+    return run
+
+
+def pdf_cases(today):
+    from .pdf_canvas import render
+    from .views import generate_invoice_pdf_platypus
+
+    for count in PDF_ITEM_COUNTS:
+        invoice = invoice_with_items(count, today)
+        yield f"pdf/{count}_items", None, lambda invoice=invoice: generate_invoice_pdf_platypus(invoice)
+        yield f"pdf_canvas/{count}_items", None, lambda invoice=invoice: render(invoice)
+
+
+def dataset_cases(client, size, today):
+    dashboard = _request(client, 'get', '/dashboard/', 200)
+
+    def uncached_dashboard():
+        # A new generation, as after any write, so every run computes the figures
+        caching.bump()
+        dashboard()
+
+    yield 'dashboard', size, uncached_dashboard
+    yield 'dashboard/cached', size, dashboard
+    yield 'invoice_list/first_page', size, _request(client, 'get', '/core/invoices/', 200)
+    yield 'invoice_list/search_sorted', size, _request(
+        client, 'get', '/core/invoices/', 200, data={'buyer': 'SILKS', 'sort': '-grand_total'},
+    )
+
+    items = [
+        {'description': f"FABRIC {n}", 'hsn_code': '5208', 'quantity': '10', 'rate': '50', 'gst_rate': '5'}
+        for n in range(10)
+    ]
+    create = json.dumps(_payload(today, items))
+    yield 'invoice_create/10_items', size, _request(
+        client, 'post', '/invoice/', 201, data=create, content_type='application/json',
+    )
+
+    # Each edit changes every item's quantity, so there is always something to write
+    invoice = invoice_with_items(10, today)
+    saved = list(invoice.items.values('id', 'description', 'hsn_code', 'rate', 'gst_rate'))
+    quantity = iter(range(11, 10_000_000))
+
+    def edit():
+        posted = [{**item, 'quantity': str(next(quantity))} for item in saved]
+        _request(
+            client, 'post', f"/invoice/{invoice.pk}/edit/", 200,
+            data=json.dumps(_payload(today, posted), cls=DjangoJSONEncoder), content_type='application/json',
+        )()
+
+    yield 'invoice_edit/10_items', size, edit
+
+
+def run(sizes=DATASET_SIZES, repeat=5, include_pdf=True, today=None, log=None):
+    """Run the suite in the current (test) database and return the results document."""
+    today = today or date.today()
+    log = log or (lambda message: None)
+    user, _ = User.objects.get_or_create(username='benchmark')
+    client = Client()
+    client.force_login(user)
+
+    results = []
+
+    def record(case, size, fn):
+        log(f"  {case}" + (f" @ {size:,}" if size else ''))
+        results.append({'case': case, 'invoices': size, **measure(fn, repeat)})
+
+    if include_pdf:
+        log("PDF rendering")
+        for case, size, fn in pdf_cases(today):
+            record(case, size, fn)
+
+    for size in sorted(sizes):
+        log(f"Seeding {size:,} invoices")
+        seed(size, today, log=log)
+        for case, size, fn in dataset_cases(client, size, today):
+            record(case, size, fn)
+
+    return {'meta': environment(repeat), 'results': results}
+
+
+def environment(repeat):
+    try:
+        commit = subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=settings.BASE_DIR,
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        'commit': commit,
+        'database': connection.vendor,
+        'python': platform.python_version(),
+        'django': django.get_version(),
+        'repeat': repeat,
+        'run_at': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+    }
+
+
+def compare(baseline, current, threshold=0.2):
+    """Yield (case, invoices, baseline ms, current ms, change) for cases present in both runs."""
+    before = {(r['case'], r['invoices']): r for r in baseline['results']}
+    for result in current['results']:
+        old = before.get((result['case'], result['invoices']))
+        if old is None:
+            continue
+        change = result['wall_ms_median'] / old['wall_ms_median'] - 1 if old['wall_ms_median'] else 0
+        yield result['case'], result['invoices'], old['wall_ms_median'], result['wall_ms_median'], change
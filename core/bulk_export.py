@@ -0,0 +1,225 @@
+"""
+Bulk export of invoice PDFs for a date range.
+
+Invoices are rendered by ``generate_invoice_pdf`` in a pool of worker
+processes (going through the on-disk PDF cache, so already rendered invoices
+are free) and handed back one at a time. ``write_zip`` adds each PDF to a ZIP
+file as soon as it arrives; ``write_merged_pdf`` copies its pages into one
+PDF the same way (see MergedPdfWriter), so neither keeps the export in
+memory.
+
+The pool forks, so this never runs in a web worker: exports requested from
+the invoice list are PdfExportJobs built by ``manage.py run_export_worker``
+(core.export_jobs), and ``manage.py export_invoice_pdfs`` writes one from the
+command line.
+"""
+import multiprocessing
+import zipfile
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from io import BytesIO
+
+from django.conf import settings
+from django.db import connections
+
+# How many renders may be queued per worker before we wait for results
+IN_FLIGHT_PER_WORKER = 4
+
+
+def render_invoice(invoice_id, cached=True):
+    """
+    Runs in a worker process: return (filename, pdf bytes) for one invoice,
+    from the archive for closed years. ``cached=False`` renders without
+    reading or filling the PDF cache.
+    """
+    from . import pdf_archive, pdf_cache
+    from .models import Invoice
+    from .views import generate_invoice_pdf
+
+    invoice = Invoice.objects.get(pk=invoice_id)
+    filename = f"invoice_{invoice.invoice_number.replace('/', '_')}.pdf"
+    archived = pdf_archive.get(invoice)
+    if archived is not None:
+        return filename, archived
+    if not cached:
+        return filename, generate_invoice_pdf(invoice)
+    return filename, pdf_cache.get_or_render(invoice, generate_invoice_pdf)
+
+
+def render_invoices(invoice_ids, workers=None, ordered=False, cached=True):
+    """
+    Yield (filename, pdf bytes) for every id, rendered across a process pool.
+    With ``ordered`` results follow ``invoice_ids``; otherwise they come back
+    as soon as each render finishes. ``workers=0`` renders them one after
+    the other in this process, in order.
+    """
+    invoice_ids = list(invoice_ids)
+    if not invoice_ids:
+        return
+    if workers == 0:
+        for invoice_id in invoice_ids:
+            yield render_invoice(invoice_id, cached)
+        return
+
+    workers = max(1, min(workers or settings.PDF_EXPORT_WORKERS, len(invoice_ids)))
+    window = workers * IN_FLIGHT_PER_WORKER
+    remaining = iter(invoice_ids)
+
+    # Forked workers must not share the parent's database sockets: close them
+    # first so every process opens its own connection on first use.
+    connections.close_all()
+    pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('fork'))
+
+    def submit_next():
+        invoice_id = next(remaining, None)
+        return None if invoice_id is None else pool.submit(render_invoice, invoice_id, cached)
+
+    try:
+        first = [pool.submit(render_invoice, i, cached) for _, i in zip(range(window), remaining)]
+        if ordered:
+            pending = deque(first)
+            while pending:
+                result = pending.popleft().result()
+                future = submit_next()
+                if future:
+                    pending.append(future)
+                yield result
+        else:
+            pending = set(first)
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    refill = submit_next()
+                    if refill:
+                        pending.add(refill)
+                    yield future.result()
+    finally:
+        pool.shutdown(wait=True, cancel_futures=True)
+
+
+class MergedPdfWriter:
+    """
+    Write one PDF holding the pages of many, a source document at a time.
+
+    ``append`` copies a document's pages and every object they reference into
+    ``out`` straight away, renumbered past the objects already written. Only
+    each object's byte offset and the page references are kept until
+    ``close`` writes the page tree and cross-reference table, so memory stays
+    flat however many invoices go in. ``out`` must be a binary file that
+    supports ``tell``.
+    """
+
+    CATALOG, PAGE_TREE = 1, 2
+
+    def __init__(self, out):
+        self.out = out
+        self.offsets = [None, None, None]  # by object number; 0 is unused, 1 and 2 are written last
+        self.pages = []
+        out.write(b'%PDF-1.4\n%\xe2\xe3\xcf\xd3\n')
+
+    def _reserve(self):
+        self.offsets.append(None)
+        return len(self.offsets) - 1
+
+    def _write_object(self, number, obj):
+        self.offsets[number] = self.out.tell()
+        self.out.write(f"{number} 0 obj\n".encode())
+        obj.write_to_stream(self.out)
+        self.out.write(b'\nendobj\n')
+
+    def append(self, pdf_bytes):
+        from pypdf import PdfReader
+        from pypdf.generic import ArrayObject, DictionaryObject, IndirectObject, NameObject, StreamObject
+
+        numbers = {}  # (object number, generation) in the source -> object number in the output
+        pending = []
+
+        def copy(obj):
+            if isinstance(obj, IndirectObject):
+                key = (obj.idnum, obj.generation)
+                if key not in numbers:
+                    numbers[key] = self._reserve()
+                    pending.append(obj)
+                return IndirectObject(numbers[key], 0, None)
+            if isinstance(obj, StreamObject):
+                stream = StreamObject()
+                stream.update({key: copy(value) for key, value in obj.items()})
+                # The stream's bytes as stored in the source, still compressed. pypdf has
+                # no public getter for them (get_data decodes, and set_data on an encoded
+                # stream only re-encodes Flate), hence the exact pin in requirements.txt
+                stream.set_data(obj._data)
+                return stream
+            if isinstance(obj, DictionaryObject):
+                return DictionaryObject({key: copy(value) for key, value in obj.items()})
+            if isinstance(obj, ArrayObject):
+                return ArrayObject(copy(value) for value in obj)
+            return obj
+
+        reader = PdfReader(BytesIO(pdf_bytes))
+        page_tree = IndirectObject(self.PAGE_TREE, 0, None)
+        for page in reader.pages:
+            number = self._reserve()
+            if page.indirect_reference is not None:
+                # Annotations point back at their page; they must find this copy
+                ref = page.indirect_reference
+                numbers[(ref.idnum, ref.generation)] = number
+            # pypdf has already copied inherited attributes (MediaBox, Resources) onto the page
+            copied = DictionaryObject({key: copy(value) for key, value in page.items() if key != '/Parent'})
+            copied[NameObject('/Parent')] = page_tree
+            self._write_object(number, copied)
+            self.pages.append(IndirectObject(number, 0, None))
+            while pending:
+                source = pending.pop()
+                self._write_object(numbers[(source.idnum, source.generation)], copy(source.get_object()))
+
+    def close(self):
+        from pypdf.generic import ArrayObject, DictionaryObject, IndirectObject, NameObject, NumberObject
+
+        self._write_object(self.PAGE_TREE, DictionaryObject({
+            NameObject('/Type'): NameObject('/Pages'),
+            NameObject('/Kids'): ArrayObject(self.pages),
+            NameObject('/Count'): NumberObject(len(self.pages)),
+        }))
+        self._write_object(self.CATALOG, DictionaryObject({
+            NameObject('/Type'): NameObject('/Catalog'),
+            NameObject('/Pages'): IndirectObject(self.PAGE_TREE, 0, None),
+        }))
+
+        xref = self.out.tell()
+        self.out.write(f"xref\n0 {len(self.offsets)}\n0000000000 65535 f \n".encode())
+        self.out.write(b''.join(f"{offset:010d} 00000 n \n".encode() for offset in self.offsets[1:]))
+        self.out.write(
+            f"trailer\n<< /Size {len(self.offsets)} /Root {self.CATALOG} 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode()
+        )
+
+
+def write_zip(invoice_ids, out, workers=None, progress=None):
+    """Write a ZIP archive of the invoices' PDFs to the binary file ``out``."""
+    seen = set()
+    with zipfile.ZipFile(out, mode='w', compression=zipfile.ZIP_DEFLATED) as archive:
+        for done, (filename, pdf_bytes) in enumerate(render_invoices(invoice_ids, workers=workers), 1):
+            name, counter = filename, 1
+            while name in seen:
+                counter += 1
+                name = filename.replace('.pdf', f'_{counter}.pdf')
+            seen.add(name)
+            archive.writestr(name, pdf_bytes)
+            if progress:
+                progress(done)
+
+
+def write_merged_pdf(invoice_ids, out, workers=None, progress=None):
+    """Write a single PDF holding every invoice, in the order given, to the binary file ``out``."""
+    writer = MergedPdfWriter(out)
+    for done, (_, pdf_bytes) in enumerate(render_invoices(invoice_ids, workers=workers, ordered=True), 1):
+        writer.append(pdf_bytes)
+        if progress:
+            progress(done)
+    writer.close()
+
+
+# format name -> (write function, content type)
+EXPORT_FORMATS = {
+    'zip': (write_zip, 'application/zip'),
+    'pdf': (write_merged_pdf, 'application/pdf'),
+}
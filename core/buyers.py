@@ -0,0 +1,146 @@
+"""
+The buyer master: one Buyer row per customer, kept in step with invoices.
+
+A buyer is identified by its GSTIN (trimmed, upper-case) or, for buyers
+without one, by its upper-case name; that identity is Buyer.key. The name,
+address and place of supply are those of the buyer's latest invoice, and the
+first/last invoice dates span all of its invoices, so client counts and "new
+this month" are indexed lookups on Buyer rather than scans over invoices.
+
+The write paths call ``link`` on the invoices they are about to save: one
+INSERT ... ON CONFLICT DO UPDATE folds them into Buyer (concurrent writers
+widen the date range instead of overwriting each other) and sets each
+invoice's buyer. When an invoice leaves a buyer - deleted, moved to another
+buyer or redated - ``refresh`` recomputes that buyer from the invoices it
+still has and removes it once it has none.
+"""
+from django.db import connection
+from django.db.models import Case, Exists, OuterRef, Subquery, Value, When
+from django.db.models.functions import Coalesce, Concat, Trim, Upper
+
+from .models import Buyer, Invoice
+
+NAME_PREFIX = 'NAME:'
+DETAIL_FIELDS = ('gstin', 'name', 'address', 'place_of_supply')
+UPSERT_BATCH_SIZE = 500
+
+
+def buyer_key(gstin, name):
+    gstin = (gstin or '').strip().upper()
+    return gstin or NAME_PREFIX + (name or '').strip().upper()
+
+
+def key_expression():
+    """``buyer_key`` of an invoice as a database expression, for set-based work."""
+    gstin = Upper(Trim(Coalesce('buyer_gstin', Value(''))))
+    return Case(
+        When(buyer_gstin__isnull=True, then=Concat(Value(NAME_PREFIX), Upper(Trim('buyer_name')))),
+        When(buyer_gstin__regex=r'^\s*$', then=Concat(Value(NAME_PREFIX), Upper(Trim('buyer_name')))),
+        default=gstin,
+    )
+
+
+def _fold(rows):
+    """
+    Fold (key, gstin, name, address, place of supply, invoice date) rows into
+    {key: [gstin, name, address, place of supply, first date, last date]},
+    taking the details of each key's latest row.
+    """
+    buyers = {}
+    for key, gstin, name, address, place_of_supply, day in rows:
+        gstin = None if key.startswith(NAME_PREFIX) else key
+        buyer = buyers.get(key)
+        if buyer is None:
+            buyers[key] = [gstin, name, address, place_of_supply, day, day]
+            continue
+        if day >= buyer[5]:
+            buyer[:4] = [gstin, name, address, place_of_supply]
+            buyer[5] = day
+        buyer[4] = min(buyer[4], day)
+    return buyers
+
+
+def _upsert(buyers):
+    """Merge folded buyers into Buyer and return {key: buyer id}."""
+    if not buyers:
+        return {}
+
+    qn = connection.ops.quote_name
+    opts = Buyer._meta
+    table = qn(opts.db_table)
+    key, first, last = (qn(opts.get_field(f).column) for f in ('key', 'first_invoice_date', 'last_invoice_date'))
+    details = [qn(opts.get_field(f).column) for f in DETAIL_FIELDS]
+
+    # Details follow whichever side has the later invoice; the dates only ever widen
+    updates = ', '.join(
+        [
+            f"{c} = CASE WHEN EXCLUDED.{last} >= {table}.{last} THEN EXCLUDED.{c} ELSE {table}.{c} END"
+            for c in details
+        ] + [
+            f"{first} = CASE WHEN EXCLUDED.{first} < {table}.{first} THEN EXCLUDED.{first} ELSE {table}.{first} END",
+            f"{last} = CASE WHEN EXCLUDED.{last} > {table}.{last} THEN EXCLUDED.{last} ELSE {table}.{last} END",
+        ]
+    )
+    columns = [key] + details + [first, last]
+    placeholders = '(' + ', '.join(['%s'] * len(columns)) + ')'
+    rows = sorted(buyers.items())   # a fixed lock order for concurrent writers
+
+    ids = {}
+    with connection.cursor() as cursor:
+        for start in range(0, len(rows), UPSERT_BATCH_SIZE):
+            batch = rows[start:start + UPSERT_BATCH_SIZE]
+            cursor.execute(
+                f"INSERT INTO {table} ({', '.join(columns)}) "
+                f"VALUES {', '.join([placeholders] * len(batch))} "
+                f"ON CONFLICT ({key}) DO UPDATE SET {updates} "
+                f"RETURNING {key}, {qn(opts.pk.column)}",
+                [value for k, buyer in batch for value in (k, *buyer)],
+            )
+            ids.update(cursor.fetchall())
+    return ids
+
+
+def link(invoices):
+    """Fold unsaved or changed invoices into Buyer and set their ``buyer``; the caller saves them."""
+    invoices = list(invoices)
+    ids = _upsert(_fold(
+        (
+            buyer_key(i.buyer_gstin, i.buyer_name), i.buyer_gstin, i.buyer_name, i.buyer_address,
+            i.place_of_supply, i.invoice_date,
+        )
+        for i in invoices
+    ))
+    for invoice in invoices:
+        invoice.buyer_id = ids[buyer_key(invoice.buyer_gstin, invoice.buyer_name)]
+
+
+def link_unlinked(chunk_size=2000):
+    """
+    Link every invoice that has no buyer yet, set-based, for paths that write
+    invoices without going through ``link`` (seeding).
+    """
+    unlinked = Invoice.objects.filter(buyer__isnull=True).annotate(buyer_key=key_expression())
+    rows = unlinked.values_list(
+        'buyer_key', 'buyer_gstin', 'buyer_name', 'buyer_address', 'place_of_supply', 'invoice_date',
+    ).order_by()
+    _upsert(_fold(rows.iterator(chunk_size=chunk_size)))
+    unlinked.update(buyer=Subquery(Buyer.objects.filter(key=OuterRef('buyer_key')).values('pk')[:1]))
+
+
+def refresh(buyer_ids):
+    """Recompute buyers from the invoices they still have, removing those left with none."""
+    buyer_ids = {pk for pk in buyer_ids if pk is not None}
+    if not buyer_ids:
+        return
+
+    invoices = Invoice.objects.filter(buyer=OuterRef('pk'))
+    Buyer.objects.filter(pk__in=buyer_ids).exclude(Exists(invoices)).delete()
+
+    latest = invoices.order_by('-invoice_date', '-id')
+    Buyer.objects.filter(pk__in=buyer_ids).update(
+        name=Subquery(latest.values('buyer_name')[:1]),
+        address=Subquery(latest.values('buyer_address')[:1]),
+        place_of_supply=Subquery(latest.values('place_of_supply')[:1]),
+        first_invoice_date=Subquery(invoices.order_by('invoice_date').values('invoice_date')[:1]),
+        last_invoice_date=Subquery(latest.values('invoice_date')[:1]),
+    )
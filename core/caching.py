@@ -0,0 +1,69 @@
+"""
+Cached values derived from invoice data, invalidated by generation.
+
+Every key carries the current invoice-data generation: a counter in the
+shared cache that is bumped after any transaction writing Invoice or
+InvoiceItem commits - by post_save/post_delete (see ApiConfig.ready), and
+explicitly by the bulk paths that send no signals (import, seeding). One
+bump makes every entry computed from older data unreachable at once, so
+nothing is served stale and nothing ever needs flushing; the old entries
+simply expire.
+
+If the counter is evicted it restarts from the current time in milliseconds
+rather than from 1, so it never comes back to a generation whose entries are
+still cached.
+
+The counter lives in the CACHES backend (CACHE_BACKEND). The default
+local-memory cache gives every worker its own counter, which is only right
+for a single process; use the file or Redis backend with several workers.
+"""
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+
+GENERATION_KEY = 'invoice-data:generation'
+
+
+def _fresh():
+    return int(time.time() * 1000)
+
+
+def generation():
+    value = cache.get(GENERATION_KEY)
+    if value is None:
+        cache.add(GENERATION_KEY, _fresh(), timeout=None)
+        value = cache.get(GENERATION_KEY)
+    return value
+
+
+def bump():
+    try:
+        cache.incr(GENERATION_KEY)
+        # Backends without a native incr re-set the key with the default timeout
+        cache.touch(GENERATION_KEY, timeout=None)
+    except ValueError:
+        cache.add(GENERATION_KEY, _fresh(), timeout=None)
+
+
+def bump_on_commit(using=None):
+    """Bump once when the current transaction commits (right away outside one)."""
+    connection = transaction.get_connection(using)
+    if connection.in_atomic_block and any(func is bump for _, func, _ in connection.run_on_commit):
+        return
+    transaction.on_commit(bump, using=using)
+
+
+def invalidate(sender, using=None, **kwargs):
+    """post_save/post_delete receiver for Invoice and InvoiceItem."""
+    bump_on_commit(using)
+
+
+def get_or_set(name, key, compute, timeout):
+    """The cached ``compute()`` for ``name``/``key`` at the current generation."""
+    full_key = f"{name}:{generation()}:{key}"
+    value = cache.get(full_key)
+    if value is None:
+        value = compute()
+        cache.set(full_key, value, timeout)
+    return value
@@ -0,0 +1,154 @@
+"""
+Closing a financial year once its returns are filed.
+
+``close_year`` marks the year closed first. From then on ``ensure_open``
+refuses any write dated in it, from the invoice form, edit and delete views
+and the importer. Writers call it inside their transaction, where it holds a
+shared lock on the year until they commit; close_year inserts the marker
+under the matching exclusive lock, so it waits for writes already past the
+check and every later one sees the marker. It then stores the year's final
+figures on the ClosedFinancialYear row:
+
+* totals and per-month totals, from the daily rollups;
+* the top clients;
+* the GSTR-1 HSN totals, whose monthly rows gst_reports keeps for good once
+  no write can invalidate them.
+
+Last, it renders every invoice of the year into the PDF archive, from which
+the PDF views and bulk export serve them from then on.
+
+Closing can be re-run: a close that stopped partway picks up the PDFs it had
+not archived yet. A closed year is never reopened.
+"""
+from datetime import date
+from decimal import Decimal
+
+from django.db import connection, transaction
+from django.db.models import Sum
+
+from . import bulk_export, gst_reports, pdf_archive
+from .models import ClosedFinancialYear, DailyBuyerRevenue, DailyInvoiceSummary, Invoice
+from .numbering import financial_year
+from .rollups import SUMMARY_FIELDS
+
+TOP_CLIENTS = 10
+# First key of the Postgres advisory locks on financial years ('BILL'); the second is the year
+YEAR_LOCK_NAMESPACE = 0x42494C4C
+
+
+class YearClosed(Exception):
+    """A write was attempted on an invoice dated in a closed financial year."""
+
+
+def label(fy):
+    return f"{fy}-{(fy + 1) % 100:02d}"
+
+
+def closed_years():
+    return set(ClosedFinancialYear.objects.values_list('financial_year', flat=True))
+
+
+def _lock_years(years, shared):
+    """
+    Lock financial years until the current transaction ends. Only Postgres
+    needs it: SQLite lets one transaction write at a time, and one that read
+    no marker cannot then commit past a close that wrote one.
+    """
+    if connection.vendor != 'postgresql':
+        return
+    function = 'pg_advisory_xact_lock_shared' if shared else 'pg_advisory_xact_lock'
+    with connection.cursor() as cursor:
+        for fy in sorted(years):
+            cursor.execute(f"SELECT {function}(%s, %s)", [YEAR_LOCK_NAMESPACE, fy])
+
+
+def hold_open(years):
+    """
+    Keep these financial years from being closed until the current
+    transaction ends, and return the ones that are closed already.
+    """
+    years = set(years)
+    _lock_years(years, shared=True)
+    return set(
+        ClosedFinancialYear.objects.filter(financial_year__in=years).values_list('financial_year', flat=True)
+    )
+
+
+def ensure_open(*dates):
+    """
+    Raise YearClosed if any of these invoice dates falls in a closed
+    financial year. Call inside the transaction that writes the invoice.
+    """
+    closed = sorted(hold_open(financial_year(d) for d in dates if d))
+    if closed:
+        raise YearClosed(f"Financial year {label(closed[0])} is closed; its invoices can no longer be changed.")
+
+
+def snapshot(fy, today=None):
+    """The year's final figures, as stored on ClosedFinancialYear.summary."""
+    first, last = date(fy, 4, 1), date(fy + 1, 3, 31)
+    days = DailyInvoiceSummary.objects.filter(date__range=(first, last)).order_by('date')
+
+    def zero():
+        return {'invoice_count': 0, **{f: Decimal(0) for f in SUMMARY_FIELDS}}
+
+    totals, months = zero(), {}
+    for day in days.values('date', 'invoice_count', *SUMMARY_FIELDS):
+        month = months.setdefault(day['date'].strftime('%Y-%m'), zero())
+        for field in ('invoice_count',) + SUMMARY_FIELDS:
+            month[field] += day[field]
+            totals[field] += day[field]
+
+    top_clients = (
+        DailyBuyerRevenue.objects.filter(date__range=(first, last))
+        .values('buyer_name').annotate(revenue=Sum('revenue')).order_by('-revenue')[:TOP_CLIENTS]
+    )
+    hsn = gst_reports.hsn_summary(first, date(fy + 1, 3, 1), today=today)['totals']
+    return {
+        'totals': totals,
+        'months': [{'month': month, **figures} for month, figures in months.items()],
+        'top_clients': list(top_clients),
+        'hsn': hsn,
+    }
+
+
+def close_year(fy, user=None, today=None, workers=None, progress=None):
+    """
+    Close financial year ``fy`` (2024 for 2024-25), which must be over.
+    PDFs are rendered across ``workers`` processes (default
+    PDF_EXPORT_WORKERS; 0 renders in this process). ``progress`` is called
+    with the number archived so far. Returns the ClosedFinancialYear.
+    """
+    today = today or date.today()
+    if fy >= financial_year(today):
+        raise ValueError(f"Financial year {label(fy)} has not ended yet.")
+
+    with transaction.atomic():
+        # Waits for writers still in the year; any that start later see the marker
+        _lock_years([fy], shared=False)
+        closed, _ = ClosedFinancialYear.objects.get_or_create(financial_year=fy, defaults={'closed_by': user})
+
+    # The year is frozen from here on, so these figures are final
+    closed.summary = snapshot(fy, today=today)
+    closed.invoice_count = closed.summary['totals']['invoice_count']
+    closed.save(update_fields=['summary', 'invoice_count'])
+
+    invoice_ids = list(
+        Invoice.objects.filter(invoice_date__range=(date(fy, 4, 1), date(fy + 1, 3, 31)))
+        .order_by('id').values_list('id', flat=True)
+    )
+    done = pdf_archive.archived_ids(fy)
+    pending = [pk for pk in invoice_ids if pk not in done]
+    # Straight to the archive: going through the PDF cache would evict the current year's renders
+    renders = bulk_export.render_invoices(pending, workers=workers, ordered=True, cached=False)
+
+    archived = len(invoice_ids) - len(pending)
+    for invoice_id, (_, pdf_bytes) in zip(pending, renders):
+        pdf_archive.put(invoice_id, fy, pdf_bytes)
+        archived += 1
+        if progress:
+            progress(archived)
+
+    closed.pdfs_archived = archived
+    closed.save(update_fields=['pdfs_archived'])
+    return closed
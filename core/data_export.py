@@ -0,0 +1,147 @@
+"""
+Invoice and line-item extracts for reconciliation.
+
+One row per invoice item, with the invoice's columns repeated (invoices
+without items get a single row with blank item columns). Rows come from one
+query read through ``iterator(chunk_size=...)`` - a server-side cursor on
+Postgres - so memory stays flat however large the range is.
+
+CSV is written straight into the response as rows arrive. XLSX (openpyxl's
+write-only mode) and Parquet (pyarrow, one row group per chunk) need to
+finish the file before it can be sent, so they are spooled to a temporary
+file and streamed from there. openpyxl and pyarrow are optional; asking for
+their format without them installed raises ExportUnavailable.
+"""
+import csv
+import tempfile
+
+from .models import Invoice
+
+CHUNK_SIZE = 2000
+FILE_CHUNK_SIZE = 64 * 1024
+
+# (column header, Invoice values() lookup)
+COLUMNS = (
+    ('invoice_number', 'invoice_number'),
+    ('invoice_date', 'invoice_date'),
+    ('buyer_name', 'buyer_name'),
+    ('buyer_gstin', 'buyer_gstin'),
+    ('place_of_supply', 'place_of_supply'),
+    ('subtotal', 'subtotal'),
+    ('cgst_total', 'cgst_total'),
+    ('sgst_total', 'sgst_total'),
+    ('igst_total', 'igst_total'),
+    ('round_off', 'round_off'),
+    ('grand_total', 'grand_total'),
+    ('item_description', 'items__description'),
+    ('hsn_code', 'items__hsn_code'),
+    ('quantity', 'items__quantity'),
+    ('rate', 'items__rate'),
+    ('gst_rate', 'items__gst_rate'),
+    ('amount', 'items__amount'),
+)
+HEADERS = [header for header, _ in COLUMNS]
+
+
+class ExportUnavailable(Exception):
+    """The requested format needs a library that isn't installed."""
+
+
+def export_rows(from_date_str='', to_date_str=''):
+    """Yield one tuple per invoice item in the range, in COLUMNS order."""
+    lookups = [lookup for _, lookup in COLUMNS]
+    return (
+        Invoice.objects.in_date_range(from_date_str, to_date_str)
+        .order_by('invoice_date', 'id', 'items__id')
+        .values_list(*lookups)
+        .iterator(chunk_size=CHUNK_SIZE)
+    )
+
+
+def _chunks(rows, size=CHUNK_SIZE):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _stream_file(f):
+    f.seek(0)
+    while data := f.read(FILE_CHUNK_SIZE):
+        yield data
+
+
+class _Echo:
+    """csv.writer target that hands each line back instead of storing it."""
+
+    def write(self, value):
+        return value
+
+
+def stream_csv(rows):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(HEADERS)
+    for chunk in _chunks(rows):
+        yield ''.join(writer.writerow(row) for row in chunk)
+
+
+def stream_xlsx(rows):
+    try:
+        from openpyxl import Workbook
+    except ImportError:
+        raise ExportUnavailable("XLSX export needs openpyxl (pip install openpyxl)")
+
+    def generate():
+        workbook = Workbook(write_only=True)
+        sheet = workbook.create_sheet('Invoice items')
+        sheet.append(HEADERS)
+        for row in rows:
+            # openpyxl writes Decimal as a number; dates stay dates
+            sheet.append(row)
+        with tempfile.TemporaryFile() as spool:
+            workbook.save(spool)
+            yield from _stream_file(spool)
+
+    return generate()
+
+
+def stream_parquet(rows):
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ExportUnavailable("Parquet export needs pyarrow (pip install pyarrow)")
+
+    money = pa.decimal128(20, 4)
+    types = {
+        'invoice_date': pa.date32(),
+        'subtotal': money, 'cgst_total': money, 'sgst_total': money, 'igst_total': money,
+        'round_off': money, 'grand_total': money,
+        'quantity': money, 'rate': money, 'gst_rate': money, 'amount': money,
+    }
+    schema = pa.schema([(header, types.get(header, pa.string())) for header in HEADERS])
+
+    def generate():
+        with tempfile.TemporaryFile() as spool:
+            with pq.ParquetWriter(spool, schema, compression='snappy') as writer:
+                for chunk in _chunks(rows):
+                    columns = list(zip(*chunk))
+                    writer.write_batch(pa.record_batch(
+                        [pa.array(column, type=field.type) for column, field in zip(columns, schema)],
+                        schema=schema,
+                    ))
+            yield from _stream_file(spool)
+
+    return generate()
+
+
+# format name -> (stream function, content type)
+EXPORT_FORMATS = {
+    'csv': (stream_csv, 'text/csv'),
+    'xlsx': (stream_xlsx, 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'),
+    'parquet': (stream_parquet, 'application/vnd.apache.parquet'),
+}
@@ -0,0 +1,79 @@
+"""
+Read-replica routing.
+
+Reads go to the ``replica`` database alias only inside ``replica_reads()``
+(or a view wrapped in ``read_from_replica``), and only when that alias is
+configured (DATABASE_REPLICA_URL). The flag lives in a context variable, so
+it follows the request through sync and async code without leaking into
+other requests or threads.
+
+Users and sessions are always read from the primary, so logging in never
+races replication lag, and so is anything read inside a transaction on the
+primary, so a request reads back its own writes. Writes and migrations
+always go to the primary.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+from inspect import iscoroutinefunction
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+REPLICA_DB_ALIAS = 'replica'
+
+_replica_reads = ContextVar('replica_reads', default=False)
+
+
+def replica_configured():
+    return REPLICA_DB_ALIAS in settings.DATABASES
+
+
+@contextmanager
+def replica_reads():
+    token = _replica_reads.set(True)
+    try:
+        yield
+    finally:
+        _replica_reads.reset(token)
+
+
+def read_from_replica(view):
+    """Serve a read-only view's queries from the replica when there is one."""
+    if iscoroutinefunction(view):
+        @wraps(view)
+        async def async_wrapped(*args, **kwargs):
+            with replica_reads():
+                return await view(*args, **kwargs)
+        return async_wrapped
+
+    @wraps(view)
+    def wrapped(*args, **kwargs):
+        with replica_reads():
+            return view(*args, **kwargs)
+    return wrapped
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if (
+            _replica_reads.get()
+            and replica_configured()
+            and model._meta.app_label == 'core'
+            and model._meta.model_name != 'user'
+            and not connections[DEFAULT_DB_ALIAS].in_atomic_block
+        ):
+            return REPLICA_DB_ALIAS
+        return None
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # The replica holds the same rows as the primary
+        if {obj1._state.db, obj2._state.db} <= {DEFAULT_DB_ALIAS, REPLICA_DB_ALIAS}:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return False if db == REPLICA_DB_ALIAS else None
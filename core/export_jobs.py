@@ -0,0 +1,113 @@
+"""
+Bulk PDF exports, built outside the web workers.
+
+Exporting a date range from the invoice list only records a PdfExportJob;
+``manage.py run_export_worker`` claims it, renders the invoices with
+core.bulk_export's process pool and writes the ZIP or merged PDF into
+PDF_EXPORT_DIR, from where the download view serves it. Claiming works like
+core.pdf_jobs. Finished exports are deleted after PDF_EXPORT_KEEP_HOURS.
+"""
+import os
+import tempfile
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils.timezone import now
+
+from . import bulk_export
+from .models import Invoice, PdfExportJob
+
+# Save the progress count every this many rendered invoices
+PROGRESS_EVERY = 100
+
+
+def output_path(job):
+    return os.path.join(settings.PDF_EXPORT_DIR, f"{job.pk}.{job.format}")
+
+
+def enqueue(export_format, from_date='', to_date='', user=None):
+    return PdfExportJob.objects.create(
+        format=export_format, from_date=from_date, to_date=to_date, requested_by=user,
+    )
+
+
+def claim_next():
+    """Mark the oldest queued export as running and return it, or None."""
+    with transaction.atomic():
+        job = (
+            PdfExportJob.objects.select_for_update(skip_locked=True)
+            .filter(status=PdfExportJob.STATUS_QUEUED)
+            .order_by('created_on', 'id').first()
+        )
+        if job is None:
+            return None
+        claimed = PdfExportJob.objects.filter(pk=job.pk, status=PdfExportJob.STATUS_QUEUED).update(
+            status=PdfExportJob.STATUS_RUNNING, started_on=now(), attempts=job.attempts + 1, rendered=0,
+        )
+    if not claimed:
+        return None
+    job.refresh_from_db()
+    return job
+
+
+def run_job(job, workers=None, max_attempts=3):
+    """Build one claimed export into PDF_EXPORT_DIR and record the outcome."""
+    write, _ = bulk_export.EXPORT_FORMATS[job.format]
+    invoice_ids = list(
+        Invoice.objects.in_date_range(job.from_date, job.to_date)
+        .order_by('invoice_date', 'id').values_list('id', flat=True)
+    )
+    PdfExportJob.objects.filter(pk=job.pk).update(invoice_count=len(invoice_ids))
+    job.invoice_count = len(invoice_ids)
+
+    def progress(rendered):
+        if rendered % PROGRESS_EVERY == 0:
+            PdfExportJob.objects.filter(pk=job.pk).update(rendered=rendered)
+
+    path = output_path(job)
+    os.makedirs(settings.PDF_EXPORT_DIR, exist_ok=True)
+    try:
+        # Written under a temporary name so a download never sees half a file
+        with tempfile.NamedTemporaryFile(dir=settings.PDF_EXPORT_DIR, suffix='.part', delete=False) as f:
+            try:
+                write(invoice_ids, f, workers=workers, progress=progress)
+            except BaseException:
+                os.unlink(f.name)
+                raise
+        os.replace(f.name, path)
+    except Exception:
+        traceback.print_exc()
+        job.error = traceback.format_exc()
+        job.status = PdfExportJob.STATUS_QUEUED if job.attempts < max_attempts else PdfExportJob.STATUS_FAILED
+    else:
+        job.error = ''
+        job.rendered = len(invoice_ids)
+        job.status = PdfExportJob.STATUS_DONE
+    job.finished_on = now()
+    job.save(update_fields=['status', 'error', 'rendered', 'finished_on'])
+    return job
+
+
+def requeue_stale(timeout):
+    """Put back exports whose worker died while building them."""
+    return PdfExportJob.objects.filter(
+        status=PdfExportJob.STATUS_RUNNING, started_on__lt=now() - timeout,
+    ).update(status=PdfExportJob.STATUS_QUEUED)
+
+
+def purge_finished(older_than=None):
+    """Delete finished exports, and their files, once they are older than PDF_EXPORT_KEEP_HOURS."""
+    if older_than is None:
+        older_than = timedelta(hours=settings.PDF_EXPORT_KEEP_HOURS)
+    expired = PdfExportJob.objects.filter(
+        status__in=(PdfExportJob.STATUS_DONE, PdfExportJob.STATUS_FAILED),
+        finished_on__lt=now() - older_than,
+    )
+    for job in expired:
+        try:
+            os.remove(output_path(job))
+        except FileNotFoundError:
+            pass
+    return expired.delete()
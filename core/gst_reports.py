@@ -0,0 +1,240 @@
+"""
+GSTR-1 HSN-wise summary (table 12), split into B2B and B2C supplies.
+
+A month's summary is one GROUP BY over InvoiceItem joined to Invoice:
+taxable value and quantity per (supply type, HSN, GST rate), with tax worked
+out per group the same way the invoice PDF's HSN table does it - IGST for
+inter-state invoices (igst_total > 0), CGST and SGST halves otherwise.
+Supplies are B2B when the invoice has a buyer GSTIN.
+
+Months before the current one are closed: the first report that needs them
+computes them all in a single query and stores the rows in GstrHsnSummary,
+and later reports read them back instead. Only the current month is
+computed live. Saving, editing or deleting an invoice calls ``invalidate``
+for its date, so a late or backdated invoice sends its month back to be
+recomputed on the next report.
+
+Invalidating bumps the month's GstrClosedMonth.version rather than deleting
+the marker, and ``_store`` only records the version it read before computing,
+so a write that lands while a month is being computed leaves it stale instead
+of having its invalidation overwritten.
+"""
+from collections import defaultdict
+from datetime import date, datetime
+from decimal import ROUND_HALF_UP, Decimal
+
+from django.db import DEFAULT_DB_ALIAS, connection, transaction
+from django.db.models import BooleanField, Case, CharField, Count, F, Sum, Value, When
+from django.db.models.functions import TruncMonth
+from django.utils.timezone import now
+
+from .models import GstrClosedMonth, GstrHsnSummary, InvoiceItem
+
+CENT = Decimal('0.01')
+AMOUNT_FIELDS = ('quantity', 'taxable_value', 'igst', 'cgst', 'sgst')
+SUPPLY_TYPES = (GstrHsnSummary.SUPPLY_B2B, GstrHsnSummary.SUPPLY_B2C)
+
+
+def month_start(day):
+    return day.replace(day=1)
+
+
+def next_month(month):
+    return date(month.year + 1, 1, 1) if month.month == 12 else date(month.year, month.month + 1, 1)
+
+
+def months_between(first, last):
+    month = month_start(first)
+    while month <= last:
+        yield month
+        month = next_month(month)
+
+
+def compute(first_month, last_month, using=None):
+    """Summary rows for every month in the range, straight from the invoice tables."""
+    grouped = (
+        InvoiceItem.objects.using(using).filter(
+            invoice__invoice_date__gte=first_month, invoice__invoice_date__lt=next_month(last_month),
+        )
+        .annotate(
+            month=TruncMonth('invoice__invoice_date'),
+            supply_type=Case(
+                When(invoice__buyer_gstin__gt='', then=Value(GstrHsnSummary.SUPPLY_B2B)),
+                default=Value(GstrHsnSummary.SUPPLY_B2C), output_field=CharField(),
+            ),
+            inter_state=Case(
+                When(invoice__igst_total__gt=0, then=Value(True)),
+                default=Value(False), output_field=BooleanField(),
+            ),
+        )
+        .values('month', 'supply_type', 'hsn_code', 'gst_rate', 'inter_state')
+        .annotate(lines=Count('id'), total_quantity=Sum('quantity'), taxable=Sum('amount'))
+        .order_by()
+    )
+
+    # Fold the inter- and intra-state groups of each HSN/rate into one row
+    rows = {}
+    for group in grouped:
+        key = (group['month'], group['supply_type'], group['hsn_code'] or '', group['gst_rate'])
+        row = rows.setdefault(key, {
+            'month': key[0], 'supply_type': key[1], 'hsn_code': key[2], 'gst_rate': key[3], 'line_count': 0,
+            **{f: Decimal('0.00') for f in AMOUNT_FIELDS},
+        })
+        taxable = Decimal(group['taxable'] or 0).quantize(CENT, ROUND_HALF_UP)
+        row['line_count'] += group['lines']
+        row['quantity'] += Decimal(group['total_quantity'] or 0)
+        row['taxable_value'] += taxable
+        if group['inter_state']:
+            row['igst'] += (taxable * group['gst_rate'] / 100).quantize(CENT, ROUND_HALF_UP)
+        else:
+            half = (taxable * (group['gst_rate'] / 2) / 100).quantize(CENT, ROUND_HALF_UP)
+            row['cgst'] += half
+            row['sgst'] += half
+    for row in rows.values():
+        row['quantity'] = row['quantity'].quantize(CENT, ROUND_HALF_UP)
+    return list(rows.values())
+
+
+def _store(months):
+    """
+    Compute closed ``months`` in one query and keep the result for each month
+    that was not invalidated while the query ran.
+    """
+    GstrClosedMonth.objects.bulk_create([GstrClosedMonth(month=m) for m in months], ignore_conflicts=True)
+    # Both read from the primary, even in a view that reads from the replica:
+    # a lagging replica has not seen the markers just created, and rows
+    # computed there could miss writes the versions already account for
+    versions = dict(
+        GstrClosedMonth.objects.using(DEFAULT_DB_ALIAS).filter(month__in=months).values_list('month', 'version')
+    )
+
+    wanted = set(months)
+    rows = [row for row in compute(min(months), max(months), using=DEFAULT_DB_ALIAS) if row['month'] in wanted]
+    with transaction.atomic():
+        # Waits for any writer still holding the marker row, then only
+        # matches if that writer did not bump the version
+        kept = [
+            m for m in months
+            if GstrClosedMonth.objects.filter(month=m, version=versions[m]).update(
+                stored_version=versions[m], computed_on=now(),
+            )
+        ]
+        GstrHsnSummary.objects.filter(month__in=kept).delete()
+        GstrHsnSummary.objects.bulk_create(
+            [GstrHsnSummary(**row) for row in rows if row['month'] in kept], ignore_conflicts=True,
+        )
+    return rows
+
+
+def invalidate(*days):
+    """
+    Mark the stored summary for the months these invoice dates fall in as
+    stale. Call it inside the transaction that changes the invoice: the
+    upsert holds the marker row until that transaction commits.
+    """
+    months = sorted({month_start(d) for d in days if d})
+    if not months:
+        return
+
+    qn = connection.ops.quote_name
+    opts = GstrClosedMonth._meta
+    table = qn(opts.db_table)
+    month, version, computed_on = (qn(opts.get_field(f).column) for f in ('month', 'version', 'computed_on'))
+    # Inserted rather than skipped when the month has no marker yet, so a
+    # report that starts computing it meanwhile still sees the bump
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {table} ({month}, {version}, {computed_on}) "
+            f"VALUES {', '.join(['(%s, 1, %s)'] * len(months))} "
+            f"ON CONFLICT ({month}) DO UPDATE SET {version} = {table}.{version} + 1",
+            [p for m in months for p in (m, now())],
+        )
+
+
+def hsn_summary(first_month, last_month, today=None):
+    """
+    The HSN summary for every month from first_month to last_month, plus the
+    totals across them. Closed months come from storage (computing any that
+    are missing); the current month and any later one are computed live.
+    """
+    current = month_start(today or date.today())
+    months = list(months_between(first_month, last_month))
+    closed = [m for m in months if m < current]
+    open_months = [m for m in months if m >= current]
+
+    rows = []
+    if closed:
+        marked = set(
+            GstrClosedMonth.objects.filter(month__in=closed, stored_version=F('version'))
+            .values_list('month', flat=True)
+        )
+        stored = [m for m in closed if m in marked]
+        if stored:
+            rows += GstrHsnSummary.objects.filter(month__in=stored).values(
+                'month', 'supply_type', 'hsn_code', 'gst_rate', 'line_count', *AMOUNT_FIELDS,
+            )
+        missing = [m for m in closed if m not in stored]
+        if missing:
+            # Use what was just computed rather than reading it back: on a
+            # read replica the new rows may not have arrived yet
+            rows += _store(missing)
+    if open_months:
+        rows += compute(open_months[0], open_months[-1])
+
+    by_month = {m: {'month': m, 'closed': m < current, **{s: [] for s in SUPPLY_TYPES}} for m in months}
+    totals = defaultdict(lambda: {'line_count': 0, **{f: Decimal(0) for f in AMOUNT_FIELDS}})
+    for row in sorted(rows, key=lambda r: (r['month'], r['supply_type'], r['hsn_code'], r['gst_rate'])):
+        row['total_tax'] = row['igst'] + row['cgst'] + row['sgst']
+        by_month[row['month']][row['supply_type']].append(row)
+        total = totals[(row['supply_type'], row['hsn_code'], row['gst_rate'])]
+        total['line_count'] += row['line_count']
+        for f in AMOUNT_FIELDS:
+            total[f] += row[f]
+
+    summary_totals = {s: [] for s in SUPPLY_TYPES}
+    for (supply_type, hsn_code, gst_rate), total in sorted(totals.items()):
+        summary_totals[supply_type].append({
+            'hsn_code': hsn_code, 'gst_rate': gst_rate, **total,
+            'total_tax': total['igst'] + total['cgst'] + total['sgst'],
+        })
+    return {'months': list(by_month.values()), 'totals': summary_totals}
+
+
+def parse_period(fy='', from_month='', to_month='', today=None):
+    """
+    (first month, last month) from a financial year ("2025" for 2025-26) or
+    YYYY-MM bounds; defaults to the current financial year so far.
+    Raises ValueError on malformed input.
+    """
+    today = today or date.today()
+    if fy:
+        start = int(fy)
+        first, last = date(start, 4, 1), date(start + 1, 3, 1)
+    else:
+        start = today.year if today.month >= 4 else today.year - 1
+        first, last = date(start, 4, 1), month_start(today)
+    if from_month:
+        first = datetime.strptime(from_month, '%Y-%m').date()
+    if to_month:
+        last = datetime.strptime(to_month, '%Y-%m').date()
+    if first > last:
+        raise ValueError("from_month must not be after to_month")
+    return first, last
+
+
+CSV_HEADERS = (
+    'month', 'supply_type', 'hsn_code', 'gst_rate', 'line_count', 'quantity',
+    'taxable_value', 'igst', 'cgst', 'sgst', 'total_tax',
+)
+
+
+def csv_rows(summary):
+    """Flatten hsn_summary() into CSV_HEADERS rows: every month, then the period totals."""
+    yield CSV_HEADERS
+    for month in summary['months']:
+        for supply_type in SUPPLY_TYPES:
+            for row in month[supply_type]:
+                yield [f"{month['month']:%Y-%m}", supply_type] + [row[h] for h in CSV_HEADERS[2:]]
+    for supply_type in SUPPLY_TYPES:
+        for row in summary['totals'][supply_type]:
+            yield ['TOTAL', supply_type] + [row[h] for h in CSV_HEADERS[2:]]
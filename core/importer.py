@@ -0,0 +1,337 @@
+"""
+Bulk import of invoices from CSV or JSON Lines.
+
+JSON Lines carries one invoice per line in the same shape invoice_view
+accepts (invoice fields plus an ``items`` list). CSV carries one item per row
+with the invoice columns repeated; consecutive rows with the same
+invoice_number make up one invoice.
+
+Records are validated a chunk at a time (field checks in Python, one query for
+invoice numbers already in the database) and every valid invoice in the chunk
+is written with two bulk_create calls and one rollup upsert, in a transaction
+of its own. A bad row is reported with its line number and skipped; it never
+holds back the rest of its chunk. Numbers in the app's own format advance
+their sequence (numbering.advance_past). Imported invoices are not queued for
+PDF rendering - they are rendered on first view.
+"""
+import csv
+import io
+import json
+from datetime import datetime
+from decimal import ROUND_HALF_UP, Decimal, InvalidOperation
+from itertools import islice
+
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, transaction
+from num2words import num2words
+
+from . import autocomplete, buyers, caching, closing, gst_reports, numbering
+from .models import Invoice, InvoiceItem
+from .numbering import financial_year
+from .rollups import SUMMARY_FIELDS, apply_contributions
+
+FORMATS = ('csv', 'jsonl')
+DEFAULT_CHUNK_SIZE = 1000
+
+INVOICE_FIELDS = (
+    'invoice_number', 'invoice_date', 'e_way_bill_no',
+    'seller_name', 'seller_address', 'seller_gstin', 'seller_state', 'seller_state_code',
+    'buyer_name', 'buyer_address', 'buyer_gstin', 'place_of_supply', 'payment_mode',
+    'transport_name', 'transport_address', 'transport_gstin', 'total_bundles',
+    'subtotal', 'cgst_total', 'sgst_total', 'igst_total', 'grand_total', 'total_in_words',
+)
+ITEM_FIELDS = ('description', 'hsn_code', 'quantity', 'rate', 'gst_rate')
+DATE_FORMATS = ('%d-%m-%Y', '%Y-%m-%d')
+CENT = Decimal('0.01')
+
+
+class ImportResult:
+    def __init__(self):
+        self.created = 0
+        self.errors = []   # [{'line', 'invoice_number', 'errors'}]
+
+    def add_error(self, line, invoice_number, messages):
+        self.errors.append({'line': line, 'invoice_number': invoice_number, 'errors': list(messages)})
+
+    def as_dict(self, max_errors=None):
+        errors = self.errors if max_errors is None else self.errors[:max_errors]
+        return {
+            'created': self.created,
+            'failed': len(self.errors),
+            'errors': errors,
+            'errors_truncated': len(errors) < len(self.errors),
+        }
+
+
+# ------------------------- Readers -------------------------
+
+def read_jsonl(stream):
+    """Yield (line number, invoice dict) for every non-blank line."""
+    for line_no, line in enumerate(stream, start=1):
+        if not line.strip():
+            continue
+        try:
+            data = json.loads(line)
+        except json.JSONDecodeError as e:
+            yield line_no, ValueError(f"Invalid JSON: {e.msg}")
+            continue
+        yield line_no, data if isinstance(data, dict) else ValueError("Each line must be a JSON object")
+
+
+def read_csv(stream):
+    """Yield (line number of first row, invoice dict) grouping consecutive rows by invoice_number."""
+    reader = csv.DictReader(stream)
+    current, start_line = None, None
+    for row in reader:
+        row = {k.strip(): (v or '').strip() for k, v in row.items() if k}
+        if current is None or row.get('invoice_number') != current.get('invoice_number'):
+            if current is not None:
+                yield start_line, current
+            current = {f: row.get(f, '') for f in INVOICE_FIELDS}
+            current['items'] = []
+            start_line = reader.line_num
+        item = {f: row.get(f, '') for f in ITEM_FIELDS}
+        if any(item.values()):
+            current['items'].append(item)
+    if current is not None:
+        yield start_line, current
+
+
+READERS = {'csv': read_csv, 'jsonl': read_jsonl}
+
+
+def open_text(binary_file):
+    """Wrap an uploaded or opened binary file for the readers (handles a UTF-8 BOM)."""
+    return io.TextIOWrapper(binary_file, encoding='utf-8-sig', newline='')
+
+
+def format_for_filename(filename):
+    name = (filename or '').lower()
+    if name.endswith('.csv'):
+        return 'csv'
+    if name.endswith(('.jsonl', '.ndjson', '.json')):
+        return 'jsonl'
+    return None
+
+
+# ------------------------- Validation -------------------------
+
+def _decimal(value, name, errors, default=None):
+    if value in (None, ''):
+        if default is None:
+            errors.append(f"{name} is required")
+        return default
+    try:
+        return Decimal(str(value))
+    except (InvalidOperation, ValueError):
+        errors.append(f"{name} must be a number")
+        return default
+
+
+def _date(value, errors):
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.strptime(str(value or '').strip(), fmt).date()
+        except ValueError:
+            continue
+    errors.append("invoice_date must be DD-MM-YYYY or YYYY-MM-DD")
+    return None
+
+
+def amount_in_words(amount):
+    return f"{num2words(int(amount), lang='en_IN').replace(',', '').replace('-', ' ').title()} Rupees Only"
+
+
+def _field_errors(instance, exclude):
+    try:
+        instance.clean_fields(exclude=exclude)
+    except ValidationError as e:
+        return [f"{field}: {' '.join(messages)}" for field, messages in e.message_dict.items()]
+    return []
+
+
+def build_invoice(data, user=None):
+    """
+    Turn one record into an unsaved Invoice, its unsaved items and its rollup
+    contribution. Raises ValueError with every problem found in the record.
+    Totals left blank are computed from the items, the same way the invoice
+    form does; grand_total is rounded to the rupee with the difference kept in
+    round_off.
+    """
+    errors = []
+    invoice_date = _date(data.get('invoice_date'), errors)
+
+    items = []
+    for n, item_data in enumerate(data.get('items') or [], start=1):
+        item_errors = []
+        item = InvoiceItem(
+            description=str(item_data.get('description') or '').strip(),
+            hsn_code=str(item_data.get('hsn_code') or '').strip() or None,
+            quantity=_decimal(item_data.get('quantity'), 'quantity', item_errors),
+            rate=_decimal(item_data.get('rate'), 'rate', item_errors),
+            gst_rate=_decimal(item_data.get('gst_rate'), 'gst_rate', item_errors, default=Decimal(0)),
+        )
+        if not item_errors:
+            item_errors = _field_errors(item, exclude=['invoice'])
+        errors.extend(f"item {n}: {message}" for message in item_errors)
+        items.append(item)
+    if not items:
+        errors.append("at least one item is required")
+    if errors:
+        raise ValueError(errors)
+
+    taxable = sum((i.quantity * i.rate for i in items), Decimal(0))
+    tax = sum((i.quantity * i.rate * i.gst_rate / 100 for i in items), Decimal(0))
+    intra_state = str(data.get('place_of_supply') or '') == str(data.get('seller_state_code') or '33')
+    half_tax = (tax / 2).quantize(CENT, ROUND_HALF_UP)
+
+    subtotal = _decimal(data.get('subtotal'), 'subtotal', errors, default=taxable.quantize(CENT, ROUND_HALF_UP))
+    cgst = _decimal(data.get('cgst_total'), 'cgst_total', errors, default=half_tax if intra_state else Decimal(0))
+    sgst = _decimal(data.get('sgst_total'), 'sgst_total', errors, default=half_tax if intra_state else Decimal(0))
+    igst = _decimal(
+        data.get('igst_total'), 'igst_total', errors,
+        default=Decimal(0) if intra_state else tax.quantize(CENT, ROUND_HALF_UP),
+    )
+    raw_grand_total = _decimal(data.get('grand_total'), 'grand_total', errors, default=subtotal + cgst + sgst + igst)
+    if errors:
+        raise ValueError(errors)
+    grand_total = raw_grand_total.quantize(Decimal(1), ROUND_HALF_UP)
+
+    try:
+        total_bundles = int(data.get('total_bundles') or 0)
+    except (TypeError, ValueError):
+        raise ValueError(["total_bundles must be a whole number"])
+
+    values = {
+        f: str(data[f]).strip() for f in INVOICE_FIELDS
+        if data.get(f) not in (None, '') and f not in ('invoice_date', 'total_bundles') + SUMMARY_FIELDS
+    }
+    # Same normalisation as invoice_view
+    values['buyer_name'] = values.get('buyer_name', '').upper()
+    values['buyer_address'] = values.get('buyer_address', '').upper()
+    values.setdefault('total_in_words', amount_in_words(grand_total))
+
+    invoice = Invoice(
+        **values,
+        invoice_date=invoice_date,
+        total_bundles=total_bundles,
+        subtotal=subtotal, cgst_total=cgst, sgst_total=sgst, igst_total=igst,
+        grand_total=grand_total,
+        round_off=grand_total - raw_grand_total.quantize(CENT, ROUND_HALF_UP),
+        created_by=user,
+    )
+    errors = _field_errors(invoice, exclude=['created_by'])
+    if errors:
+        raise ValueError(errors)
+
+    lines = {}
+    for item in items:
+        count, revenue = lines.get(item.description, (0, Decimal(0)))
+        lines[item.description] = (count + 1, revenue + item.quantity * item.rate)
+    contribution = {
+        'invoice_date': invoice.invoice_date,
+        'buyer_name': invoice.buyer_name,
+        **{f: getattr(invoice, f) for f in SUMMARY_FIELDS},
+        'items': lines,
+    }
+    return invoice, items, contribution
+
+
+# ------------------------- Import -------------------------
+
+def _chunks(iterable, size):
+    iterator = iter(iterable)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+def import_invoices(records, user=None, chunk_size=DEFAULT_CHUNK_SIZE, dry_run=False, progress=None):
+    """
+    Import (line number, record) pairs as produced by the READERS. Each chunk
+    of ``chunk_size`` records commits on its own, so an import that dies
+    halfway keeps every chunk before the failure. ``progress`` is called with
+    the running ImportResult after each chunk.
+    """
+    result = ImportResult()
+    seen_numbers = set()
+
+    for chunk in _chunks(records, chunk_size):
+        valid = []
+        for line, data in chunk:
+            if isinstance(data, Exception):
+                result.add_error(line, '', [str(data)])
+                continue
+            number = str(data.get('invoice_number') or '').strip()
+            if not number:
+                result.add_error(line, '', ["invoice_number is required"])
+                continue
+            if number in seen_numbers:
+                result.add_error(line, number, ["invoice_number appears more than once in the file"])
+                continue
+            seen_numbers.add(number)
+            try:
+                valid.append((line, *build_invoice(data, user=user)))
+            except ValueError as e:
+                result.add_error(line, number, e.args[0])
+
+        existing = set(
+            Invoice.objects.filter(invoice_number__in=[v[1].invoice_number for v in valid])
+            .values_list('invoice_number', flat=True)
+        )
+        for line, invoice, _, _ in valid:
+            if invoice.invoice_number in existing:
+                result.add_error(line, invoice.invoice_number, ["invoice_number already exists"])
+        valid = [v for v in valid if v[1].invoice_number not in existing]
+
+        closed = []
+        if dry_run:
+            valid, closed = _split_closed(valid, closing.closed_years())
+        elif valid:
+            try:
+                valid, closed = _save_chunk(valid, chunk_size)
+            except IntegrityError as e:
+                # Lost a race with another writer; nothing in this chunk was saved
+                for line, invoice, _, _ in valid:
+                    result.add_error(line, invoice.invoice_number, [f"chunk rolled back: {e}"])
+                valid = []
+        for line, invoice, _, _ in closed:
+            fy = financial_year(invoice.invoice_date)
+            result.add_error(line, invoice.invoice_number, [f"financial year {closing.label(fy)} is closed"])
+        result.created += len(valid)
+
+        if progress:
+            progress(result)
+    return result
+
+
+def _split_closed(valid, closed_years):
+    """(records in open years, records dated in one of ``closed_years``)"""
+    kept, closed = [], []
+    for v in valid:
+        (closed if financial_year(v[1].invoice_date) in closed_years else kept).append(v)
+    return kept, closed
+
+
+@transaction.atomic
+def _save_chunk(valid, batch_size):
+    """Save a chunk's invoices, leaving out those dated in a closed year. Returns (saved, closed)."""
+    # Checked under the shared year locks, held until this chunk commits
+    valid, closed = _split_closed(valid, closing.hold_open(financial_year(v[1].invoice_date) for v in valid))
+    if not valid:
+        return valid, closed
+
+    buyers.link(v[1] for v in valid)
+    invoices = Invoice.objects.bulk_create([v[1] for v in valid], batch_size=batch_size)
+    items = []
+    for invoice, (_, _, invoice_items, _) in zip(invoices, valid):
+        for item in invoice_items:
+            item.invoice = invoice
+            items.append(item)
+    InvoiceItem.objects.bulk_create(items, batch_size=batch_size)
+    # Keep the form from handing out numbers this chunk has just taken
+    numbering.advance_past(v[1].invoice_number for v in valid)
+    apply_contributions(added=[v[3] for v in valid])
+    gst_reports.invalidate(*{v[1].invoice_date for v in valid})
+    caching.bump_on_commit()   # bulk_create sends no post_save
+    autocomplete.refresh_on_commit()
+    return valid, closed
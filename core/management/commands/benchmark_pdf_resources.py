@@ -0,0 +1,44 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core import pdf_resources
+from core.models import Invoice
+from core.views import generate_invoice_pdf
+
+
+class Command(BaseCommand):
+    help = "Compare per-render PDF resource setup: rebuilt every call vs the shared registry."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=200)
+        parser.add_argument('--invoice-id', type=int, help="Also time full renders of this invoice.")
+
+    def handle(self, *args, **options):
+        iterations = options['iterations']
+
+        def per_call_ms(fn):
+            start = time.perf_counter()
+            for _ in range(iterations):
+                fn()
+            return (time.perf_counter() - start) * 1000 / iterations
+
+        def rebuilt():
+            # What generate_invoice_pdf used to do on every render
+            pdf_resources.build_styles()
+            pdf_resources.register_fonts()
+
+        pdf_resources.warm_up()
+        cold = per_call_ms(rebuilt)
+        warm = per_call_ms(pdf_resources.warm_up)
+
+        self.stdout.write(f"Resource setup, rebuilt per render : {cold:8.3f} ms")
+        self.stdout.write(f"Resource setup, shared registry    : {warm:8.3f} ms")
+        self.stdout.write(self.style.SUCCESS(f"Saved per render                   : {cold - warm:8.3f} ms"))
+
+        if options['invoice_id']:
+            invoice = Invoice.objects.get(pk=options['invoice_id'])
+            render = per_call_ms(lambda: generate_invoice_pdf(invoice))
+            label = f"Full render of invoice {invoice.pk}"
+            self.stdout.write(f"{label:<35}: {render:8.3f} ms "
+                              f"({(cold - warm) / (render + cold - warm) * 100:.0f}% saved)")
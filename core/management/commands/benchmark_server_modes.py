@@ -0,0 +1,147 @@
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY, get_user_model
+from django.contrib.sessions.backends.db import SessionStore
+from django.core.management.base import BaseCommand, CommandError
+
+from core.models import Invoice, InvoiceItem
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def fetch(url, cookie=None, timeout=60):
+    request = urllib.request.Request(url, headers={'Cookie': cookie} if cookie else {})
+    started = time.perf_counter()
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            response.read()
+            ok = response.status == 200
+    except (urllib.error.URLError, OSError):
+        ok = False
+    return ok, time.perf_counter() - started
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare the WSGI and ASGI serving modes: start gunicorn in each mode, keep some PDF renders "
+        "running, and measure HSN lookup latency and throughput under concurrent load."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--modes', nargs='+', choices=['wsgi', 'asgi'], default=['wsgi', 'asgi'])
+        parser.add_argument('--workers', type=int, default=1, help="gunicorn workers per mode.")
+        parser.add_argument('--requests', type=int, default=2000, help="Lookups per mode.")
+        parser.add_argument('--concurrency', type=int, default=200, help="Lookups in flight at once.")
+        parser.add_argument('--blockers', type=int, default=2, help="PDF renders kept in flight during the run.")
+        parser.add_argument('--user', help="Username whose session the PDF requests use (required for --blockers).")
+        parser.add_argument('--output', help="Also write the results here as JSON.")
+
+    def handle(self, *args, **options):
+        hsn = InvoiceItem.objects.exclude(hsn_code=None).values_list('hsn_code', flat=True).first() or '0000'
+        invoice_id = Invoice.objects.values_list('id', flat=True).first()
+
+        cookie, session = None, None
+        if options['blockers']:
+            if not options['user'] or invoice_id is None:
+                raise CommandError("--blockers needs --user and at least one invoice (or pass --blockers 0).")
+            try:
+                user = get_user_model().objects.get(username=options['user'])
+            except get_user_model().DoesNotExist:
+                raise CommandError(f"No user named {options['user']!r}.")
+            session = SessionStore()
+            session[SESSION_KEY] = str(user.pk)
+            session[BACKEND_SESSION_KEY] = 'django.contrib.auth.backends.ModelBackend'
+            session[HASH_SESSION_KEY] = user.get_session_auth_hash()
+            session.create()
+            cookie = f"{settings.SESSION_COOKIE_NAME}={session.session_key}"
+
+        results = []
+        try:
+            for mode in options['modes']:
+                results.append(self.run_mode(mode, options, hsn, invoice_id, cookie))
+        finally:
+            if session is not None:
+                session.delete()
+
+        self.stdout.write(f"\n{'mode':<6} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'max ms':>8} {'errors':>7} {'PDFs':>5}")
+        for r in results:
+            self.stdout.write(
+                f"{r['mode']:<6} {r['requests_per_second']:>8.0f} {r['p50_ms']:>8.1f} {r['p95_ms']:>8.1f} "
+                f"{r['p99_ms']:>8.1f} {r['max_ms']:>8.1f} {r['errors']:>7} {r['pdf_renders']:>5}"
+            )
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump({'options': {k: options[k] for k in ('workers', 'requests', 'concurrency', 'blockers')},
+                           'results': results}, f, indent=2)
+
+    def run_mode(self, mode, options, hsn, invoice_id, cookie):
+        port = free_port()
+        base = f"http://127.0.0.1:{port}"
+        env = {**os.environ, 'SERVER_MODE': mode, 'PDF_RENDER_ASYNC': 'False', 'PDF_CACHE_MAX_BYTES': '0'}
+        server = subprocess.Popen(
+            [sys.executable, '-m', 'gunicorn', '--bind', f'127.0.0.1:{port}', '--workers', str(options['workers'])],
+            cwd=settings.BASE_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+        lookup_url = f"{base}/api/hsn-descriptions/?hsn={hsn}"
+        try:
+            deadline = time.monotonic() + 30
+            while not fetch(lookup_url, timeout=2)[0]:
+                if server.poll() is not None or time.monotonic() > deadline:
+                    raise CommandError(f"gunicorn did not start in {mode} mode.")
+                time.sleep(0.2)
+            self.stdout.write(f"{mode}: server up on port {port}, running {options['requests']} lookups...")
+
+            # Keep PDF renders in flight for the whole run
+            stop, renders = threading.Event(), []
+
+            def render_loop():
+                while not stop.is_set():
+                    if fetch(f"{base}/invoice/{invoice_id}/pdf/", cookie)[0]:
+                        renders.append(1)
+
+            blockers = [threading.Thread(target=render_loop, daemon=True) for _ in range(options['blockers'])]
+            for blocker in blockers:
+                blocker.start()
+            time.sleep(0.5)
+
+            started = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=options['concurrency']) as pool:
+                outcomes = list(pool.map(lambda _: fetch(lookup_url), range(options['requests'])))
+            elapsed = time.perf_counter() - started
+
+            stop.set()
+            for blocker in blockers:
+                blocker.join()
+        finally:
+            server.terminate()
+            server.wait()
+
+        latencies = sorted(seconds * 1000 for ok, seconds in outcomes if ok)
+        quantiles = statistics.quantiles(latencies, n=100) if len(latencies) > 1 else latencies * 99 or [0] * 99
+        return {
+            'mode': mode,
+            'requests': len(outcomes),
+            'errors': sum(1 for ok, _ in outcomes if not ok),
+            'seconds': round(elapsed, 3),
+            'requests_per_second': len(latencies) / elapsed if elapsed else 0,
+            'p50_ms': quantiles[49],
+            'p95_ms': quantiles[94],
+            'p99_ms': quantiles[98],
+            'max_ms': latencies[-1] if latencies else 0,
+            'pdf_renders': len(renders),
+        }
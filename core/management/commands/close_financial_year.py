@@ -0,0 +1,43 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from core import closing
+
+PROGRESS_EVERY = 1000
+
+
+class Command(BaseCommand):
+    help = (
+        "Close a financial year: freeze its invoices, store its final figures and archive its PDFs. "
+        "Re-running resumes an interrupted close."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fy', type=int, required=True, help="Year the financial year starts in (2024 for 2024-25).")
+        parser.add_argument('--user', help="Username recorded as closed_by.")
+        parser.add_argument('--workers', type=int, default=None, help="Render processes (default: PDF_EXPORT_WORKERS).")
+
+    def handle(self, *args, **options):
+        user = None
+        if options['user']:
+            try:
+                user = get_user_model().objects.get(username=options['user'])
+            except get_user_model().DoesNotExist:
+                raise CommandError(f"No user named {options['user']!r}.")
+
+        def progress(archived):
+            if options['verbosity'] >= 1 and archived % PROGRESS_EVERY == 0:
+                self.stdout.write(f"  {archived} PDFs archived")
+
+        try:
+            closed = closing.close_year(options['fy'], user=user, workers=options['workers'], progress=progress)
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        totals = closed.summary['totals']
+        self.stdout.write(
+            f"{closed.invoice_count} invoices, subtotal {totals['subtotal']}, total {totals['grand_total']}"
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"Closed financial year {closing.label(closed.financial_year)}; {closed.pdfs_archived} PDFs archived."
+        ))
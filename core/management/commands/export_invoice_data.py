@@ -0,0 +1,32 @@
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.data_export import EXPORT_FORMATS, ExportUnavailable, export_rows
+
+
+class Command(BaseCommand):
+    help = "Export every invoice item in a date range as CSV, XLSX or Parquet."
+
+    def add_arguments(self, parser):
+        parser.add_argument('output', help="File to write, e.g. items-2025-26.csv")
+        parser.add_argument('--from-date', default='', help="YYYY-MM-DD, inclusive.")
+        parser.add_argument('--to-date', default='', help="YYYY-MM-DD, inclusive.")
+        parser.add_argument('--format', choices=sorted(EXPORT_FORMATS), help="Defaults to the file extension.")
+
+    def handle(self, *args, **options):
+        export_format = options['format'] or os.path.splitext(options['output'])[1].lstrip('.').lower()
+        if export_format not in EXPORT_FORMATS:
+            raise CommandError("Cannot tell the format from the file name; pass --format.")
+
+        stream, _ = EXPORT_FORMATS[export_format]
+        try:
+            chunks = stream(export_rows(options['from_date'], options['to_date']))
+        except ExportUnavailable as e:
+            raise CommandError(str(e))
+
+        with open(options['output'], 'wb') as f:
+            for chunk in chunks:
+                f.write(chunk.encode() if isinstance(chunk, str) else chunk)
+
+        self.stdout.write(self.style.SUCCESS(f"Exported invoice items to {options['output']}."))
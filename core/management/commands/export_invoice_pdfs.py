@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core.bulk_export import EXPORT_FORMATS
+from core.models import Invoice
+
+
+class Command(BaseCommand):
+    help = "Render every invoice in a date range into a ZIP of PDFs or one merged PDF."
+
+    def add_arguments(self, parser):
+        parser.add_argument('output', help="File to write, e.g. invoices-2025-04.zip")
+        parser.add_argument('--from-date', default='', help="YYYY-MM-DD, inclusive.")
+        parser.add_argument('--to-date', default='', help="YYYY-MM-DD, inclusive.")
+        parser.add_argument('--format', choices=sorted(EXPORT_FORMATS), default='zip')
+        parser.add_argument('--workers', type=int, default=None, help="Render processes (default: PDF_EXPORT_WORKERS).")
+
+    def handle(self, *args, **options):
+        invoice_ids = list(
+            Invoice.objects.in_date_range(options['from_date'], options['to_date'])
+            .order_by('invoice_date', 'id').values_list('id', flat=True)
+        )
+        if not invoice_ids:
+            raise CommandError("No invoices found for the selected dates.")
+
+        write, _ = EXPORT_FORMATS[options['format']]
+        with open(options['output'], 'wb') as f:
+            write(invoice_ids, f, workers=options['workers'])
+
+        self.stdout.write(self.style.SUCCESS(f"Exported {len(invoice_ids)} invoices to {options['output']}."))
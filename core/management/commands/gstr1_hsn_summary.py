@@ -0,0 +1,34 @@
+import csv
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core import gst_reports
+
+
+class Command(BaseCommand):
+    help = "Print or save the GSTR-1 HSN-wise summary (B2B and B2C) for a financial year or range of months."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fy', default='', help="Financial year by its starting year, e.g. 2025 for 2025-26.")
+        parser.add_argument('--from-month', default='', help="YYYY-MM, inclusive.")
+        parser.add_argument('--to-month', default='', help="YYYY-MM, inclusive.")
+        parser.add_argument('--output', help="CSV file to write (default: stdout).")
+        parser.add_argument('--refresh', action='store_true', help="Recompute stored closed months first.")
+
+    def handle(self, *args, **options):
+        try:
+            first, last = gst_reports.parse_period(options['fy'], options['from_month'], options['to_month'])
+        except ValueError:
+            raise CommandError("Use --fy YYYY and/or --from-month/--to-month YYYY-MM.")
+
+        if options['refresh']:
+            gst_reports.invalidate(*gst_reports.months_between(first, last))
+
+        rows = gst_reports.csv_rows(gst_reports.hsn_summary(first, last))
+        if options['output']:
+            with open(options['output'], 'w', newline='') as f:
+                csv.writer(f).writerows(rows)
+            self.stdout.write(self.style.SUCCESS(f"Wrote HSN summary for {first:%Y-%m} to {last:%Y-%m} to {options['output']}."))
+        else:
+            csv.writer(sys.stdout).writerows(rows)
@@ -0,0 +1,55 @@
+import json
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from core.importer import DEFAULT_CHUNK_SIZE, FORMATS, READERS, format_for_filename, import_invoices, open_text
+
+
+class Command(BaseCommand):
+    help = "Import invoices from a CSV (one item per row) or JSON Lines (one invoice per line) file."
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="File to import.")
+        parser.add_argument('--format', choices=FORMATS, help="Defaults to the file extension.")
+        parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE, help="Invoices per transaction.")
+        parser.add_argument('--user', help="Username recorded as created_by.")
+        parser.add_argument('--dry-run', action='store_true', help="Validate only; write nothing.")
+        parser.add_argument('--errors', help="Write per-row errors to this file as JSON Lines.")
+
+    def handle(self, *args, **options):
+        fmt = options['format'] or format_for_filename(options['path'])
+        if fmt is None:
+            raise CommandError("Cannot tell the format from the file name; pass --format.")
+        if options['chunk_size'] < 1:
+            raise CommandError("--chunk-size must be at least 1.")
+
+        user = None
+        if options['user']:
+            try:
+                user = get_user_model().objects.get(username=options['user'])
+            except get_user_model().DoesNotExist:
+                raise CommandError(f"No user named {options['user']!r}.")
+
+        def progress(result):
+            if options['verbosity'] >= 1:
+                self.stdout.write(f"  {result.created} imported, {len(result.errors)} failed")
+
+        with open(options['path'], 'rb') as f:
+            result = import_invoices(
+                READERS[fmt](open_text(f)), user=user, chunk_size=options['chunk_size'],
+                dry_run=options['dry_run'], progress=progress,
+            )
+
+        if options['errors']:
+            with open(options['errors'], 'w') as f:
+                for error in result.errors:
+                    f.write(json.dumps(error) + '\n')
+        else:
+            for error in result.errors[:20]:
+                self.stderr.write(f"line {error['line']} {error['invoice_number']}: {'; '.join(error['errors'])}")
+            if len(result.errors) > 20:
+                self.stderr.write(f"... and {len(result.errors) - 20} more (use --errors to save them all)")
+
+        verb = "Validated" if options['dry_run'] else "Imported"
+        self.stdout.write(self.style.SUCCESS(f"{verb} {result.created} invoices; {len(result.errors)} rows failed."))
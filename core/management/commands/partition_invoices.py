@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from core import partitioning
+
+
+class Command(BaseCommand):
+    help = (
+        "Add the partitions for the current and next financial year to the partitioned invoice table on "
+        "Postgres. With --convert, first partition the table by financial year if it is not yet."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS, help="Database alias to partition.")
+        parser.add_argument('--convert', action='store_true',
+                            help="Partition a plain invoice table. Rewrites it under an exclusive lock.")
+        parser.add_argument('--dry-run', action='store_true', help="Print the SQL instead of running it.")
+
+    def handle(self, *args, **options):
+        using = options['database']
+        if connections[using].vendor != 'postgresql':
+            raise CommandError("Partitioning needs Postgres.")
+
+        with connections[using].cursor() as cursor:
+            partitioned = partitioning.is_partitioned(cursor)
+        if not partitioned and not options['convert']:
+            self.stdout.write("The invoice table is not partitioned; run with --convert to partition it.")
+            return
+
+        if options['dry_run']:
+            statements = partitioning.plan(using, convert=options['convert'])
+        else:
+            statements = partitioning.apply(using, convert=options['convert'])
+        for statement in statements:
+            self.stdout.write(f"{statement};")
+
+        if not statements:
+            self.stdout.write(self.style.SUCCESS("Invoice partitions are up to date."))
+        elif not options['dry_run']:
+            self.stdout.write(self.style.SUCCESS(f"Ran {len(statements)} statements."))
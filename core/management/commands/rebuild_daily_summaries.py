@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from core.models import DailyInvoiceSummary
+from core.rollups import rebuild_daily_summaries
+
+
+class Command(BaseCommand):
+    help = "Rebuild the per-day dashboard rollups from the Invoice and InvoiceItem tables."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help="Rows per bulk insert.")
+
+    def handle(self, *args, **options):
+        rebuild_daily_summaries(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Rebuilt daily summaries for {DailyInvoiceSummary.objects.count()} days."
+        ))
@@ -0,0 +1,65 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import setup_databases, setup_test_environment, teardown_databases, teardown_test_environment
+
+from core import benchmarks
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark PDF rendering, the dashboard, the invoice list and the invoice write paths in a "
+        "throwaway test database, reporting wall time, peak memory and query counts."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=list(benchmarks.DATASET_SIZES),
+                            help="Dataset sizes (invoices) for the dashboard, list and write cases.")
+        parser.add_argument('--repeat', type=int, default=5, help="Timed runs per case.")
+        parser.add_argument('--skip-pdf', action='store_true', help="Leave out the PDF rendering cases.")
+        parser.add_argument('--keepdb', action='store_true',
+                            help="Keep the test database, and the invoices seeded into it, for the next run.")
+        parser.add_argument('--output', help="Write the results here as JSON.")
+        parser.add_argument('--compare', help="A previous --output file to compare median times against.")
+        parser.add_argument('--threshold', type=float, default=0.2,
+                            help="Flag cases this much slower than --compare (default 0.2 = 20%%).")
+
+    def handle(self, *args, **options):
+        baseline = None
+        if options['compare']:
+            try:
+                with open(options['compare']) as f:
+                    baseline = json.load(f)
+            except (OSError, ValueError) as e:
+                raise CommandError(f"Could not read {options['compare']}: {e}")
+
+        setup_test_environment()
+        old_config = setup_databases(verbosity=0, interactive=False, keepdb=options['keepdb'])
+        try:
+            report = benchmarks.run(
+                sizes=options['sizes'], repeat=options['repeat'], include_pdf=not options['skip_pdf'],
+                log=self.stdout.write,
+            )
+        except benchmarks.BenchmarkError as e:
+            raise CommandError(str(e))
+        finally:
+            teardown_databases(old_config, verbosity=0, keepdb=options['keepdb'])
+            teardown_test_environment()
+
+        self.stdout.write(f"\n{'case':<28} {'invoices':>10} {'median ms':>10} {'min ms':>9} {'peak KB':>9} {'queries':>8}")
+        for r in report['results']:
+            self.stdout.write(
+                f"{r['case']:<28} {r['invoices'] or '':>10} {r['wall_ms_median']:>10.1f} {r['wall_ms_min']:>9.1f} "
+                f"{r['peak_memory_kb']:>9.0f} {r['queries']:>8}"
+            )
+
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(report, f, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"\nWrote {len(report['results'])} results to {options['output']}."))
+
+        if baseline:
+            self.stdout.write(f"\nAgainst {options['compare']} (commit {baseline['meta'].get('commit')}):")
+            for case, size, before, after, change in benchmarks.compare(baseline, report):
+                line = f"{case:<28} {size or '':>10} {before:>10.1f} -> {after:>8.1f} ms  {change:+.0%}"
+                self.stdout.write(self.style.ERROR(line) if change > options['threshold'] else line)
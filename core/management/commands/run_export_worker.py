@@ -0,0 +1,59 @@
+import signal
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from core import export_jobs, pdf_resources
+
+# Seconds between sweeps for expired exports
+PURGE_EVERY = 3600
+
+
+class Command(BaseCommand):
+    help = "Build queued bulk PDF exports (ZIP or merged PDF) into PDF_EXPORT_DIR. Runs until stopped."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sleep', type=float, default=2.0, help="Seconds to wait when the queue is empty.")
+        parser.add_argument('--once', action='store_true', help="Exit as soon as the queue is empty.")
+        parser.add_argument('--workers', type=int, default=None, help="Render processes (default: PDF_EXPORT_WORKERS).")
+        parser.add_argument('--max-attempts', type=int, default=3)
+        parser.add_argument('--stale-after', type=int, default=3600,
+                            help="Seconds after which a running export is assumed lost and requeued.")
+
+    def handle(self, *args, **options):
+        self.stopping = False
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+
+        # Loaded once here, so every forked render process starts with the fonts
+        pdf_resources.warm_up()
+        stale_after = timedelta(seconds=options['stale_after'])
+        next_purge = 0.0
+        self.stdout.write("Export worker started.")
+
+        while not self.stopping:
+            close_old_connections()
+            job = export_jobs.claim_next()
+            if job is None:
+                export_jobs.requeue_stale(stale_after)
+                if time.monotonic() >= next_purge:
+                    export_jobs.purge_finished()
+                    next_purge = time.monotonic() + PURGE_EVERY
+                if options['once']:
+                    break
+                time.sleep(options['sleep'])
+                continue
+
+            started = time.perf_counter()
+            job = export_jobs.run_job(job, workers=options['workers'], max_attempts=options['max_attempts'])
+            self.stdout.write(
+                f"Export {job.pk} ({job.format}, {job.invoice_count} invoices): {job.status} "
+                f"in {time.perf_counter() - started:.1f} s"
+            )
+
+        self.stdout.write("Export worker stopped.")
+
+    def stop(self, signum, frame):
+        self.stopping = True
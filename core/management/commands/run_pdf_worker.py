@@ -0,0 +1,60 @@
+import signal
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from core import pdf_cache, pdf_jobs, pdf_resources
+
+# Seconds between sweeps for old finished jobs
+PURGE_EVERY = 3600
+
+
+class Command(BaseCommand):
+    help = "Render queued invoice PDFs into the PDF cache. Runs until stopped."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sleep', type=float, default=1.0, help="Seconds to wait when the queue is empty.")
+        parser.add_argument('--once', action='store_true', help="Exit as soon as the queue is empty.")
+        parser.add_argument('--max-attempts', type=int, default=3)
+        parser.add_argument('--stale-after', type=int, default=300,
+                            help="Seconds after which a running job is assumed lost and requeued.")
+
+    def handle(self, *args, **options):
+        if not pdf_cache.is_enabled():
+            self.stderr.write(self.style.WARNING("PDF cache is disabled; rendered PDFs will not be kept."))
+
+        self.stopping = False
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+
+        pdf_resources.warm_up()
+        stale_after = timedelta(seconds=options['stale_after'])
+        next_purge = 0.0
+        self.stdout.write("PDF worker started.")
+
+        while not self.stopping:
+            close_old_connections()
+            job = pdf_jobs.claim_next()
+            if job is None:
+                pdf_jobs.requeue_stale(stale_after)
+                if time.monotonic() >= next_purge:
+                    pdf_jobs.purge_finished()
+                    next_purge = time.monotonic() + PURGE_EVERY
+                if options['once']:
+                    break
+                time.sleep(options['sleep'])
+                continue
+
+            started = time.perf_counter()
+            job = pdf_jobs.run_job(job, max_attempts=options['max_attempts'])
+            self.stdout.write(
+                f"Job {job.pk} (invoice {job.invoice_id}): {job.status} "
+                f"in {(time.perf_counter() - started) * 1000:.0f} ms"
+            )
+
+        self.stdout.write("PDF worker stopped.")
+
+    def stop(self, signum, frame):
+        self.stopping = True
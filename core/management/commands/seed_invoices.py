@@ -0,0 +1,57 @@
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+from core.seeding import DEFAULT_BATCH_SIZE, DEFAULT_SERIES, seed_invoices
+
+
+class Command(BaseCommand):
+    help = (
+        "Fill Invoice and InvoiceItem with deterministic synthetic invoices (consistent totals, buyers across "
+        "states, skewed HSN codes and item counts) for benchmarks and for reproducing issues at scale."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--invoices', type=int, required=True, help="Number of invoices to add.")
+        parser.add_argument('--seed', type=int, default=0, help="Same seed, same invoices.")
+        parser.add_argument('--years', type=int, default=3, help="Financial years to spread them over, ending with the current one.")
+        parser.add_argument('--until', help="Last invoice date, YYYY-MM-DD (default: today).")
+        parser.add_argument('--buyers', type=int, help="Distinct buyers (default: one per 200 invoices, at least 50).")
+        parser.add_argument('--series', default=DEFAULT_SERIES,
+                            help=f"Invoice number series (default {DEFAULT_SERIES}, kept apart from real numbers).")
+        parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE, help="Invoices per transaction.")
+        parser.add_argument('--user', help="Username recorded as created_by.")
+
+    def handle(self, *args, **options):
+        if options['invoices'] < 1 or options['batch_size'] < 1 or options['years'] < 1:
+            raise CommandError("--invoices, --batch-size and --years must be at least 1.")
+        until = None
+        if options['until']:
+            until = parse_date(options['until'])
+            if until is None:
+                raise CommandError("--until must be YYYY-MM-DD.")
+
+        user = None
+        if options['user']:
+            try:
+                user = get_user_model().objects.get(username=options['user'])
+            except get_user_model().DoesNotExist:
+                raise CommandError(f"No user named {options['user']!r}.")
+
+        started = time.monotonic()
+
+        def progress(invoices, items):
+            if options['verbosity'] >= 1:
+                rate = invoices / (time.monotonic() - started)
+                self.stdout.write(f"  {invoices:,} invoices, {items:,} items ({rate:,.0f} invoices/s)")
+
+        items = seed_invoices(
+            options['invoices'], seed=options['seed'], last_day=until, years=options['years'],
+            buyers=options['buyers'], series=options['series'], user=user, batch_size=options['batch_size'],
+            progress=progress,
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"Seeded {options['invoices']:,} invoices with {items:,} items in {time.monotonic() - started:.1f}s."
+        ))
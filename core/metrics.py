@@ -0,0 +1,282 @@
+"""
+Per-request performance metrics.
+
+RequestMetricsMiddleware opens a RequestMetrics for every request and, through
+a context variable, the pieces below add to it as the request runs:
+
+* SQL - a database execute wrapper counts queries, their time and the rows
+  the driver reports (SELECTs on Postgres; SQLite reports none);
+* templates - the TimedDjangoTemplates backend times each render;
+* PDFs - generate_invoice_pdf reports its build time and size.
+
+The totals go out as a Server-Timing header (shown in the browser's network
+panel) and into per-view histograms, served in Prometheus text format at
+/metrics to staff users (session login, or a DRF token for the scraper).
+
+Histograms live in each worker's memory. With METRICS_DIR set, every worker
+also writes a snapshot there at most every METRICS_FLUSH_SECONDS and /metrics
+adds up all snapshots, so one scrape covers every gunicorn worker. The cost
+per request is a handful of perf_counter calls per query and template plus a
+few dictionary updates under a lock.
+"""
+import bisect
+import glob
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.template.backends.django import DjangoTemplates, Template, reraise
+from django.template.exceptions import TemplateDoesNotExist
+
+PREFIX = 'billdash'
+
+SECONDS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+COUNTS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+ROWS = (1, 10, 100, 1000, 10000, 100000)
+BYTES = (10_000, 25_000, 50_000, 100_000, 250_000, 500_000, 1_000_000, 5_000_000)
+
+# name -> (help, buckets)
+HISTOGRAMS = {
+    'request_duration_seconds': ("Time spent in the view and middleware", SECONDS),
+    'sql_queries': ("SQL queries per request", COUNTS),
+    'sql_duration_seconds': ("SQL time per request", SECONDS),
+    'sql_rows': ("Rows reported by the database driver per request", ROWS),
+    'template_render_seconds': ("Template render time per request (requests that render one)", SECONDS),
+    'pdf_build_seconds': ("Invoice PDF build time (requests that build one)", SECONDS),
+    'pdf_bytes': ("Size of invoice PDFs built", BYTES),
+}
+
+
+class RequestMetrics:
+    __slots__ = ('sql_queries', 'sql_seconds', 'sql_rows', 'template_seconds', 'templates',
+                 'pdf_seconds', 'pdf_bytes', 'pdfs')
+
+    def __init__(self):
+        self.sql_queries = self.sql_rows = self.templates = self.pdfs = self.pdf_bytes = 0
+        self.sql_seconds = self.template_seconds = self.pdf_seconds = 0.0
+
+
+_current = ContextVar('request_metrics', default=None)
+
+
+# ------------------------- Collectors -------------------------
+
+def sql_wrapper(execute, sql, params, many, context):
+    metrics = _current.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.sql_seconds += time.perf_counter() - started
+        metrics.sql_queries += 1
+        rowcount = context['cursor'].rowcount
+        if rowcount and rowcount > 0:
+            metrics.sql_rows += rowcount
+
+
+def install_sql_wrapper(sender, connection, **kwargs):
+    """connection_created receiver: wrap every new connection once."""
+    if sql_wrapper not in connection.execute_wrappers:
+        connection.execute_wrappers.append(sql_wrapper)
+
+
+class TimedTemplate(Template):
+    def render(self, context=None, request=None):
+        metrics = _current.get()
+        if metrics is None:
+            return super().render(context, request)
+        started = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            metrics.template_seconds += time.perf_counter() - started
+            metrics.templates += 1
+
+
+class TimedDjangoTemplates(DjangoTemplates):
+    """The Django template backend, with render times added to the request's metrics."""
+
+    def from_string(self, template_code):
+        return TimedTemplate(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        try:
+            return TimedTemplate(self.engine.get_template(template_name), self)
+        except TemplateDoesNotExist as exc:
+            reraise(exc, self)
+
+
+@contextmanager
+def pdf_build():
+    """Time a PDF build; the caller sets ``size`` on the yielded dict."""
+    result = {'size': 0}
+    started = time.perf_counter()
+    yield result
+    metrics = _current.get()
+    if metrics is not None:
+        metrics.pdf_seconds += time.perf_counter() - started
+        metrics.pdf_bytes += result['size']
+        metrics.pdfs += 1
+
+
+# ------------------------- Histograms -------------------------
+
+class Registry:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.series = {}   # (name, view) -> [bucket counts..., sum, count]
+        self.flushed_at = 0.0
+
+    def observe(self, name, view, value):
+        buckets = HISTOGRAMS[name][1]
+        key = (name, view)
+        with self.lock:
+            series = self.series.get(key)
+            if series is None:
+                series = self.series[key] = [0] * len(buckets) + [0.0, 0]
+            i = bisect.bisect_left(buckets, value)
+            if i < len(buckets):
+                series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def snapshot(self):
+        with self.lock:
+            return {f"{name}|{view}": list(series) for (name, view), series in self.series.items()}
+
+    def flush(self, force=False):
+        directory = settings.METRICS_DIR
+        if not directory or (not force and time.monotonic() - self.flushed_at < settings.METRICS_FLUSH_SECONDS):
+            return
+        self.flushed_at = time.monotonic()
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"metrics-{os.getpid()}.json")
+        with open(f"{path}.tmp", 'w') as f:
+            json.dump(self.snapshot(), f)
+        os.replace(f"{path}.tmp", path)
+
+    def collect(self):
+        """Series for this worker, or summed across every worker's snapshot."""
+        if not settings.METRICS_DIR:
+            return self.snapshot()
+        self.flush(force=True)
+        merged = {}
+        for path in glob.glob(os.path.join(settings.METRICS_DIR, 'metrics-*.json')):
+            try:
+                with open(path) as f:
+                    snapshot = json.load(f)
+            except (OSError, ValueError):
+                continue
+            for key, series in snapshot.items():
+                total = merged.setdefault(key, [0] * len(series))
+                for i, value in enumerate(series):
+                    total[i] += value
+        return merged
+
+
+registry = Registry()
+
+
+def _label(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def exposition():
+    """All histograms in Prometheus text format."""
+    series = registry.collect()
+    lines = []
+    for name, (help_text, buckets) in HISTOGRAMS.items():
+        metric = f"{PREFIX}_{name}"
+        lines += [f"# HELP {metric} {help_text}", f"# TYPE {metric} histogram"]
+        for key in sorted(k for k in series if k.split('|', 1)[0] == name):
+            view = _label(key.split('|', 1)[1])
+            *counts, total, count = series[key]
+            cumulative = 0
+            for bound, n in zip(buckets, counts):
+                cumulative += n
+                lines.append(f'{metric}_bucket{{view="{view}",le="{bound}"}} {cumulative}')
+            lines.append(f'{metric}_bucket{{view="{view}",le="+Inf"}} {count}')
+            lines.append(f'{metric}_sum{{view="{view}"}} {total}')
+            lines.append(f'{metric}_count{{view="{view}"}} {count}')
+    return '\n'.join(lines) + '\n'
+
+
+# ------------------------- Middleware -------------------------
+
+def _view_name(request):
+    match = getattr(request, 'resolver_match', None)
+    return match.view_name if match else 'unmatched'
+
+
+def server_timing(metrics, total):
+    parts = [
+        f'db;dur={metrics.sql_seconds * 1000:.1f};desc="{metrics.sql_queries} queries, {metrics.sql_rows} rows"',
+    ]
+    if metrics.templates:
+        parts.append(f'tpl;dur={metrics.template_seconds * 1000:.1f}')
+    if metrics.pdfs:
+        parts.append(f'pdf;dur={metrics.pdf_seconds * 1000:.1f};desc="{metrics.pdf_bytes} bytes"')
+    parts.append(f'total;dur={total * 1000:.1f}')
+    return ', '.join(parts)
+
+
+def record(view, metrics, total):
+    registry.observe('request_duration_seconds', view, total)
+    registry.observe('sql_queries', view, metrics.sql_queries)
+    registry.observe('sql_duration_seconds', view, metrics.sql_seconds)
+    registry.observe('sql_rows', view, metrics.sql_rows)
+    if metrics.templates:
+        registry.observe('template_render_seconds', view, metrics.template_seconds)
+    if metrics.pdfs:
+        registry.observe('pdf_build_seconds', view, metrics.pdf_seconds)
+        registry.observe('pdf_bytes', view, metrics.pdf_bytes)
+    registry.flush()
+
+
+class RequestMetricsMiddleware:
+    """
+    Put first in MIDDLEWARE so the timing covers the rest of the stack. For
+    streamed responses the numbers cover the view only, not the streaming.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        metrics, started = RequestMetrics(), time.perf_counter()
+        token = _current.set(metrics)
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self._finish(request, response, metrics, started)
+
+    async def __acall__(self, request):
+        metrics, started = RequestMetrics(), time.perf_counter()
+        token = _current.set(metrics)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self._finish(request, response, metrics, started)
+
+    def _finish(self, request, response, metrics, started):
+        total = time.perf_counter() - started
+        record(_view_name(request), metrics, total)
+        if settings.SERVER_TIMING:
+            response['Server-Timing'] = server_timing(metrics, total)
+        return response
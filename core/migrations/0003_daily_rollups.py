@@ -0,0 +1,76 @@
+# Generated by Django 5.2.4 on 2026-10-17 18:40
+
+from django.db import migrations, models
+from django.db.models import Count, F, Sum
+
+
+def backfill_daily_rollups(apps, schema_editor):
+    Invoice = apps.get_model('core', 'Invoice')
+    InvoiceItem = apps.get_model('core', 'InvoiceItem')
+    DailyInvoiceSummary = apps.get_model('core', 'DailyInvoiceSummary')
+    DailyBuyerRevenue = apps.get_model('core', 'DailyBuyerRevenue')
+    DailyItemRevenue = apps.get_model('core', 'DailyItemRevenue')
+
+    totals = ('subtotal', 'cgst_total', 'sgst_total', 'igst_total', 'grand_total')
+    DailyInvoiceSummary.objects.bulk_create([
+        DailyInvoiceSummary(date=row['invoice_date'], invoice_count=row['n'], **{f: row[f"{f}_sum"] or 0 for f in totals})
+        for row in Invoice.objects.values('invoice_date').annotate(n=Count('id'), **{f"{f}_sum": Sum(f) for f in totals}).order_by()
+    ], batch_size=1000)
+    DailyBuyerRevenue.objects.bulk_create([
+        DailyBuyerRevenue(date=row['invoice_date'], buyer_name=row['buyer_name'], invoice_count=row['n'], revenue=row['revenue'] or 0)
+        for row in Invoice.objects.values('invoice_date', 'buyer_name').annotate(n=Count('id'), revenue=Sum('grand_total')).order_by()
+    ], batch_size=1000)
+    DailyItemRevenue.objects.bulk_create([
+        DailyItemRevenue(date=row['invoice__invoice_date'], description=row['description'], line_count=row['n'], revenue=row['revenue'] or 0)
+        for row in InvoiceItem.objects.values('invoice__invoice_date', 'description').annotate(n=Count('id'), revenue=Sum(F('quantity') * F('rate'))).order_by()
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0002_invoice_e_way_bill_no'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyInvoiceSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(unique=True)),
+                ('invoice_count', models.IntegerField(default=0)),
+                ('subtotal', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('cgst_total', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('sgst_total', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('igst_total', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('grand_total', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='DailyBuyerRevenue',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('buyer_name', models.CharField(max_length=255)),
+                ('invoice_count', models.IntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('date', 'buyer_name'), name='unique_daily_buyer')],
+            },
+        ),
+        migrations.CreateModel(
+            name='DailyItemRevenue',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('description', models.CharField(max_length=255)),
+                ('line_count', models.IntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=4, default=0, max_digits=16)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('date', 'description'), name='unique_daily_item')],
+            },
+        ),
+        migrations.RunPython(backfill_daily_rollups, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,65 @@
+# Generated by Django 5.2.4 on 2026-10-17 18:46
+
+from django.db import migrations, models
+
+# Indexes behind InvoiceQuerySet.search(). The Postgres expressions match the
+# SQL Django emits for icontains/istartswith (UPPER(col::text) LIKE ...), so
+# the planner can use trigram GIN indexes for substring search and
+# pattern_ops B-trees for prefix search. SQLite has no trigram support; there
+# we fall back to case-insensitive (NOCASE) indexes, which serve the prefix
+# filters and leave substring search to a scan of the local test database.
+POSTGRES_INDEXES = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE INDEX IF NOT EXISTS invoice_buyer_name_trgm ON core_invoice USING gin (UPPER(buyer_name::text) gin_trgm_ops)",
+    "CREATE INDEX IF NOT EXISTS invoice_gstin_prefix ON core_invoice (UPPER(buyer_gstin::text) text_pattern_ops)",
+    "CREATE INDEX IF NOT EXISTS invoice_number_prefix ON core_invoice (UPPER(invoice_number::text) text_pattern_ops)",
+    "CREATE INDEX IF NOT EXISTS invoiceitem_description_trgm ON core_invoiceitem USING gin (UPPER(description::text) gin_trgm_ops)",
+    "CREATE INDEX IF NOT EXISTS invoiceitem_hsn_prefix ON core_invoiceitem (hsn_code varchar_pattern_ops)",
+]
+SQLITE_INDEXES = [
+    "CREATE INDEX IF NOT EXISTS invoice_buyer_name_trgm ON core_invoice (buyer_name COLLATE NOCASE)",
+    "CREATE INDEX IF NOT EXISTS invoice_gstin_prefix ON core_invoice (buyer_gstin COLLATE NOCASE)",
+    "CREATE INDEX IF NOT EXISTS invoice_number_prefix ON core_invoice (invoice_number COLLATE NOCASE)",
+    "CREATE INDEX IF NOT EXISTS invoiceitem_description_trgm ON core_invoiceitem (description COLLATE NOCASE)",
+    "CREATE INDEX IF NOT EXISTS invoiceitem_hsn_prefix ON core_invoiceitem (hsn_code)",
+]
+INDEX_NAMES = [
+    'invoice_buyer_name_trgm', 'invoice_gstin_prefix', 'invoice_number_prefix',
+    'invoiceitem_description_trgm', 'invoiceitem_hsn_prefix',
+]
+
+
+def create_search_indexes(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    statements = POSTGRES_INDEXES if vendor == 'postgresql' else SQLITE_INDEXES if vendor == 'sqlite' else []
+    for sql in statements:
+        schema_editor.execute(sql)
+
+
+def drop_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor in ('postgresql', 'sqlite'):
+        for name in INDEX_NAMES:
+            schema_editor.execute(f"DROP INDEX IF EXISTS {name}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_pdf_render_jobs'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='invoice',
+            index=models.Index(fields=['buyer_name', 'id'], name='invoice_buyer_name_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='invoice',
+            index=models.Index(fields=['invoice_date', 'id'], name='invoice_date_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='invoice',
+            index=models.Index(fields=['grand_total', 'id'], name='invoice_grand_total_id_idx'),
+        ),
+        migrations.RunPython(create_search_indexes, drop_search_indexes),
+    ]
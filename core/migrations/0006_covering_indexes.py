@@ -0,0 +1,41 @@
+# Generated by Django 5.2.4 on 2026-10-17 18:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_invoice_search_indexes'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='invoice',
+            name='invoice_date_id_idx',
+        ),
+        migrations.AddIndex(
+            model_name='dailybuyerrevenue',
+            index=models.Index(fields=['date'], include=('buyer_name', 'revenue'), name='dailybuyer_date_covering_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='dailybuyerrevenue',
+            index=models.Index(fields=['buyer_name', 'date'], name='dailybuyer_buyer_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='dailyitemrevenue',
+            index=models.Index(fields=['date'], include=('description', 'revenue'), name='dailyitem_date_covering_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='invoice',
+            index=models.Index(fields=['invoice_date', 'id'], include=('invoice_number', 'buyer_name', 'grand_total'), name='invoice_date_covering_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='invoice',
+            index=models.Index(fields=['-created_on'], name='invoice_created_on_desc_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='invoiceitem',
+            index=models.Index(fields=['invoice', 'id'], include=('description', 'quantity', 'rate'), name='invoiceitem_covering_idx'),
+        ),
+    ]
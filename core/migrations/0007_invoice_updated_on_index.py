@@ -0,0 +1,17 @@
+# Generated by Django 5.2.4 on 2026-10-17 18:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_covering_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='invoice',
+            index=models.Index(fields=['updated_on'], name='invoice_updated_on_idx'),
+        ),
+    ]
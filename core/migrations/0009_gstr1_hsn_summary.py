@@ -0,0 +1,40 @@
+# Generated by Django 5.2.4 on 2026-10-17 18:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_invoice_sequence'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GstrClosedMonth',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField(unique=True)),
+                ('computed_on', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='GstrHsnSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField()),
+                ('supply_type', models.CharField(choices=[('B2B', 'B2B (registered buyer)'), ('B2C', 'B2C (unregistered buyer)')], max_length=3)),
+                ('hsn_code', models.CharField(blank=True, default='', max_length=20)),
+                ('gst_rate', models.DecimalField(decimal_places=2, max_digits=4)),
+                ('line_count', models.IntegerField(default=0)),
+                ('quantity', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('taxable_value', models.DecimalField(decimal_places=2, default=0, max_digits=16)),
+                ('igst', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('cgst', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('sgst', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('month', 'supply_type', 'hsn_code', 'gst_rate'), name='unique_gstr_hsn_summary')],
+            },
+        ),
+    ]
@@ -0,0 +1,62 @@
+# Generated by Django 5.2.4 on 2026-10-17 19:19
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Case, OuterRef, Subquery, Value, When
+from django.db.models.functions import Coalesce, Concat, Trim, Upper
+
+
+def backfill_buyers(apps, schema_editor):
+    Invoice = apps.get_model('core', 'Invoice')
+    Buyer = apps.get_model('core', 'Buyer')
+
+    # Same identity as core.buyers.buyer_key: the GSTIN, or NAME:<name> without one
+    name_key = Concat(Value('NAME:'), Upper(Trim('buyer_name')))
+    invoices = Invoice.objects.annotate(buyer_key=Case(
+        When(buyer_gstin__isnull=True, then=name_key),
+        When(buyer_gstin__regex=r'^\s*$', then=name_key),
+        default=Upper(Trim(Coalesce('buyer_gstin', Value('')))),
+    ))
+
+    # Details from each buyer's latest invoice, dates spanning all of them
+    buyers = {}
+    rows = invoices.order_by('invoice_date', 'id').values_list(
+        'buyer_key', 'buyer_name', 'buyer_address', 'place_of_supply', 'invoice_date',
+    )
+    for key, name, address, place_of_supply, day in rows.iterator(chunk_size=2000):
+        first = buyers[key].first_invoice_date if key in buyers else day
+        buyers[key] = Buyer(
+            key=key, gstin=None if key.startswith('NAME:') else key, name=name, address=address,
+            place_of_supply=place_of_supply, first_invoice_date=first, last_invoice_date=day,
+        )
+    Buyer.objects.bulk_create(buyers.values(), batch_size=1000)
+    invoices.update(buyer=Subquery(Buyer.objects.filter(key=OuterRef('buyer_key')).values('pk')[:1]))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_gstr1_hsn_summary'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Buyer',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=260, unique=True)),
+                ('gstin', models.CharField(blank=True, max_length=15, null=True)),
+                ('name', models.CharField(max_length=255)),
+                ('address', models.TextField(blank=True, null=True)),
+                ('place_of_supply', models.CharField(max_length=2)),
+                ('first_invoice_date', models.DateField(db_index=True)),
+                ('last_invoice_date', models.DateField()),
+            ],
+        ),
+        migrations.AddField(
+            model_name='invoice',
+            name='buyer',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='invoices', to='core.buyer'),
+        ),
+        migrations.RunPython(backfill_buyers, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.4 on 2026-10-17 19:21
+
+import django.db.models.expressions
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_buyer_master'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='invoiceitem',
+            name='invoiceitem_covering_idx',
+        ),
+        migrations.AddField(
+            model_name='invoiceitem',
+            name='amount',
+            field=models.GeneratedField(db_persist=True, expression=django.db.models.expressions.CombinedExpression(models.F('quantity'), '*', models.F('rate')), output_field=models.DecimalField(decimal_places=4, max_digits=20)),
+        ),
+        migrations.AddField(
+            model_name='invoiceitem',
+            name='tax_amount',
+            field=models.GeneratedField(db_persist=True, expression=django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(models.F('quantity'), '*', models.F('rate')), '*', models.F('gst_rate')), '/', models.Value(100)), output_field=models.DecimalField(decimal_places=8, max_digits=26)),
+        ),
+        migrations.AddIndex(
+            model_name='invoiceitem',
+            index=models.Index(fields=['invoice', 'id'], include=('description', 'amount'), name='invoiceitem_covering_idx'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.4 on 2026-10-17 19:28
+
+import django.core.serializers.json
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_invoiceitem_stored_amounts'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ClosedFinancialYear',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('financial_year', models.PositiveSmallIntegerField(unique=True)),
+                ('closed_on', models.DateTimeField(auto_now_add=True)),
+                ('invoice_count', models.IntegerField(default=0)),
+                ('summary', models.JSONField(default=dict, encoder=django.core.serializers.json.DjangoJSONEncoder)),
+                ('pdfs_archived', models.IntegerField(default=0)),
+                ('closed_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+    ]
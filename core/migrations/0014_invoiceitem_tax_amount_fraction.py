@@ -0,0 +1,31 @@
+# Generated by Django 5.2.4 on 2026-10-17 23:10
+
+from decimal import Decimal
+
+import django.db.models.expressions
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    """
+    tax_amount divided by 100, which SQLite evaluates as integer division
+    when quantity, rate and GST rate are whole numbers; it now multiplies by
+    0.01. Django cannot alter a generated column's expression in place, so it
+    is dropped and added again, which recomputes it for every row.
+    """
+
+    dependencies = [
+        ('core', '0013_pdf_export_jobs'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='invoiceitem',
+            name='tax_amount',
+        ),
+        migrations.AddField(
+            model_name='invoiceitem',
+            name='tax_amount',
+            field=models.GeneratedField(db_persist=True, expression=django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(models.F('quantity'), '*', models.F('rate')), '*', models.F('gst_rate')), '*', models.Value(Decimal('0.01'))), output_field=models.DecimalField(decimal_places=8, max_digits=26)),
+        ),
+    ]
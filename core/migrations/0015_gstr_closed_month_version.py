@@ -0,0 +1,30 @@
+# Generated by Django 5.2.4 on 2026-10-17 20:07
+
+from django.db import migrations, models
+
+
+def trust_existing_markers(apps, schema_editor):
+    # Every marker that exists today stands for stored rows that are current
+    GstrClosedMonth = apps.get_model('core', 'GstrClosedMonth')
+    GstrClosedMonth.objects.update(stored_version=0)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0014_invoiceitem_tax_amount_fraction'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='gstrclosedmonth',
+            name='stored_version',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='gstrclosedmonth',
+            name='version',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(trust_existing_markers, migrations.RunPython.noop),
+    ]
@@ -1,7 +1,12 @@
+from decimal import Decimal
+
 from django.db import models
+from django.db.models import Exists, F, OuterRef, Value
 from django.contrib.auth.models import AbstractUser
 from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
 from django.utils import timezone
+from django.utils.dateparse import parse_date
 
 class User(AbstractUser):
     created_on = models.DateTimeField(default=timezone.now)
@@ -34,13 +39,94 @@ class InvoiceItem(models.Model):
     quantity = models.DecimalField(max_digits=10, decimal_places=2)
     rate = models.DecimalField(max_digits=10, decimal_places=2)
     gst_rate = models.DecimalField(max_digits=4, decimal_places=2)
+    # Computed and stored by the database on every write, exact (no rounding):
+    # amount is the taxable value, tax_amount the GST on it. Whether that tax
+    # is CGST+SGST or IGST depends on the invoice's place of supply.
+    amount = models.GeneratedField(
+        expression=F('quantity') * F('rate'),
+        output_field=models.DecimalField(max_digits=20, decimal_places=4),
+        db_persist=True,
+    )
+    tax_amount = models.GeneratedField(
+        # Times 0.01 rather than / 100: SQLite keeps whole-number decimals as integers
+        # and would truncate the division (3 x 7 at 5% gave 1, not 1.05)
+        expression=F('quantity') * F('rate') * F('gst_rate') * Value(Decimal('0.01')),
+        output_field=models.DecimalField(max_digits=26, decimal_places=8),
+        db_persist=True,
+    )
+
+    class Meta:
+        indexes = [
+            # Per-invoice item reads (rollup deltas, PDF cache keys) without touching the heap
+            models.Index(
+                fields=['invoice', 'id'], include=['description', 'amount'],
+                name='invoiceitem_covering_idx',
+            ),
+        ]
 
     def __str__(self):
         return self.description
 
-    @property
-    def amount(self):
-        return self.quantity * self.rate
+class InvoiceQuerySet(models.QuerySet):
+    def in_date_range(self, from_date_str='', to_date_str=''):
+        """
+        Filter on invoice_date using the YYYY-MM-DD strings the invoice list sends.
+        Blank or unparseable bounds are ignored.
+        """
+        def parse(value):
+            try:
+                return parse_date(value) if value else None
+            except (ValueError, TypeError):
+                return None
+
+        queryset = self
+        from_date, to_date = parse(from_date_str), parse(to_date_str)
+        if from_date:
+            queryset = queryset.filter(invoice_date__gte=from_date)
+        if to_date:
+            queryset = queryset.filter(invoice_date__lte=to_date)
+        return queryset
+
+    def search(self, buyer='', gstin='', number='', item='', min_amount=None, max_amount=None):
+        """
+        Server-side filters for the invoice list. Blank arguments are ignored.
+        buyer matches anywhere in the name; gstin and number match as prefixes;
+        item matches an item description anywhere or an HSN code prefix.
+        The supporting indexes are created in migration 0005.
+        """
+        queryset = self
+        if buyer:
+            queryset = queryset.filter(buyer_name__icontains=buyer)
+        if gstin:
+            queryset = queryset.filter(buyer_gstin__istartswith=gstin)
+        if number:
+            queryset = queryset.filter(invoice_number__istartswith=number)
+        if min_amount is not None:
+            queryset = queryset.filter(grand_total__gte=min_amount)
+        if max_amount is not None:
+            queryset = queryset.filter(grand_total__lte=max_amount)
+        if item:
+            queryset = queryset.filter(Exists(
+                InvoiceItem.objects.filter(invoice=OuterRef('pk')).filter(
+                    models.Q(description__icontains=item) | models.Q(hsn_code__startswith=item)
+                )
+            ))
+        return queryset
+
+
+class Buyer(models.Model):
+    """One row per customer, kept in step with their invoices by core.buyers."""
+    key = models.CharField(max_length=260, unique=True)  # GSTIN, or NAME:<name> without one
+    gstin = models.CharField(max_length=15, blank=True, null=True)
+    name = models.CharField(max_length=255)
+    address = models.TextField(blank=True, null=True)
+    place_of_supply = models.CharField(max_length=2)
+    first_invoice_date = models.DateField(db_index=True)  # dashboard "new clients this month"
+    last_invoice_date = models.DateField()
+
+    def __str__(self):
+        return f"{self.name} ({self.gstin})" if self.gstin else self.name
+
 
 class Invoice(models.Model):
     invoice_number = models.CharField(max_length=100, unique=True)
@@ -51,6 +137,7 @@ class Invoice(models.Model):
     seller_gstin = models.CharField(max_length=15, default="33BUUPR3263F2Z9")
     seller_state = models.CharField(max_length=100, default="Tamil Nadu")
     seller_state_code = models.CharField(max_length=2, default="33")
+    buyer = models.ForeignKey(Buyer, on_delete=models.PROTECT, null=True, blank=True, related_name='invoices')
     buyer_name = models.CharField(max_length=255)
     buyer_address = models.TextField(blank=True, null=True)
     buyer_gstin = models.CharField(max_length=15, blank=True, null=True)
@@ -71,6 +158,230 @@ class Invoice(models.Model):
     created_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, related_name='invoices_created')
     updated_on = models.DateTimeField(auto_now=True)
 
-    
+    objects = InvoiceQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # Keyset pagination for each sortable column of the invoice list
+            models.Index(fields=['buyer_name', 'id'], name='invoice_buyer_name_id_idx'),
+            # Covers the dated invoice list (all five listed columns) and rollup rebuilds
+            models.Index(
+                fields=['invoice_date', 'id'], include=['invoice_number', 'buyer_name', 'grand_total'],
+                name='invoice_date_covering_idx',
+            ),
+            models.Index(fields=['grand_total', 'id'], name='invoice_grand_total_id_idx'),
+            # Dashboard "recent invoices"
+            models.Index(fields=['-created_on'], name='invoice_created_on_desc_idx'),
+            # Incremental refresh of the autocomplete index
+            models.Index(fields=['updated_on'], name='invoice_updated_on_idx'),
+        ]
+
     def __str__(self):
         return f"{self.invoice_number} - {self.buyer_name}"
+
+
+class InvoiceSequence(models.Model):
+    """Last invoice number handed out per series and financial year (see core.numbering)."""
+    series = models.CharField(max_length=20)
+    financial_year = models.PositiveSmallIntegerField()  # year the FY starts in: 2025 for 2025-26
+    last_number = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['series', 'financial_year'], name='unique_invoice_sequence'),
+        ]
+
+    def __str__(self):
+        return f"{self.series} {self.financial_year} - {self.last_number}"
+
+
+# ------------------------- Dashboard Rollups -------------------------
+# Per-day summaries kept in step with Invoice/InvoiceItem by core.rollups.
+# The dashboard reads these instead of scanning the invoice tables.
+
+class DailyInvoiceSummary(models.Model):
+    date = models.DateField(unique=True)
+    invoice_count = models.IntegerField(default=0)
+    subtotal = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    cgst_total = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    sgst_total = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    igst_total = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    grand_total = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    def __str__(self):
+        return f"{self.date} - {self.invoice_count} invoices"
+
+
+class DailyBuyerRevenue(models.Model):
+    date = models.DateField()
+    buyer_name = models.CharField(max_length=255)
+    invoice_count = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['date', 'buyer_name'], name='unique_daily_buyer'),
+        ]
+        indexes = [
+            # Top clients for a date range, answered from the index alone
+            models.Index(fields=['date'], include=['buyer_name', 'revenue'], name='dailybuyer_date_covering_idx'),
+            # Client counts and "seen before this month" lookups
+            models.Index(fields=['buyer_name', 'date'], name='dailybuyer_buyer_date_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.date} - {self.buyer_name}"
+
+
+class DailyItemRevenue(models.Model):
+    date = models.DateField()
+    description = models.CharField(max_length=255)
+    line_count = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=16, decimal_places=4, default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['date', 'description'], name='unique_daily_item'),
+        ]
+        indexes = [
+            # Top items for a date range, answered from the index alone
+            models.Index(fields=['date'], include=['description', 'revenue'], name='dailyitem_date_covering_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.date} - {self.description}"
+
+
+# ------------------------- Background PDF Rendering -------------------------
+
+class PdfRenderJob(models.Model):
+    STATUS_QUEUED = 'queued'
+    STATUS_RUNNING = 'running'
+    STATUS_DONE = 'done'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_QUEUED, 'Queued'),
+        (STATUS_RUNNING, 'Running'),
+        (STATUS_DONE, 'Done'),
+        (STATUS_FAILED, 'Failed'),
+    ]
+
+    invoice = models.ForeignKey(Invoice, on_delete=models.CASCADE, related_name='pdf_jobs')
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=STATUS_QUEUED)
+    attempts = models.PositiveIntegerField(default=0)
+    error = models.TextField(blank=True, default='')
+    created_on = models.DateTimeField(auto_now_add=True)
+    started_on = models.DateTimeField(null=True, blank=True)
+    finished_on = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'created_on'], name='pdfjob_status_created_idx'),
+        ]
+
+    def __str__(self):
+        return f"PDF job {self.pk} for invoice {self.invoice_id} ({self.status})"
+
+
+class PdfExportJob(models.Model):
+    """A ZIP of PDFs or one merged PDF of a date range, built by run_export_worker (see core.export_jobs)."""
+
+    STATUS_QUEUED = PdfRenderJob.STATUS_QUEUED
+    STATUS_RUNNING = PdfRenderJob.STATUS_RUNNING
+    STATUS_DONE = PdfRenderJob.STATUS_DONE
+    STATUS_FAILED = PdfRenderJob.STATUS_FAILED
+    FORMAT_CHOICES = [
+        ('zip', 'ZIP of PDFs'),
+        ('pdf', 'Single merged PDF'),
+    ]
+
+    format = models.CharField(max_length=3, choices=FORMAT_CHOICES)
+    # The date filters as given to InvoiceQuerySet.in_date_range; blank is open-ended
+    from_date = models.CharField(max_length=10, blank=True, default='')
+    to_date = models.CharField(max_length=10, blank=True, default='')
+    requested_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True, related_name='pdf_exports',
+    )
+    status = models.CharField(max_length=10, choices=PdfRenderJob.STATUS_CHOICES, default=STATUS_QUEUED)
+    invoice_count = models.PositiveIntegerField(default=0)
+    rendered = models.PositiveIntegerField(default=0)
+    attempts = models.PositiveIntegerField(default=0)
+    error = models.TextField(blank=True, default='')
+    created_on = models.DateTimeField(auto_now_add=True)
+    started_on = models.DateTimeField(null=True, blank=True)
+    finished_on = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'created_on'], name='pdfexport_status_created_idx'),
+        ]
+
+    @property
+    def filename(self):
+        return f"invoices_{self.from_date or 'start'}_to_{self.to_date or 'end'}.{self.format}"
+
+    def __str__(self):
+        return f"PDF export {self.pk} ({self.format}, {self.status})"
+
+
+# ------------------------- GST Returns -------------------------
+# HSN-wise summaries for GSTR-1, stored per month once the month is over
+# (see core.gst_reports). A month's rows are only trusted while its
+# GstrClosedMonth marker's stored_version matches its version; saving an
+# invoice dated in that month bumps the version.
+
+class GstrClosedMonth(models.Model):
+    month = models.DateField(unique=True)  # first day of the month
+    computed_on = models.DateTimeField(auto_now=True)
+    version = models.PositiveIntegerField(default=0)
+    stored_version = models.PositiveIntegerField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.month:%Y-%m} (stored {self.computed_on:%Y-%m-%d %H:%M})"
+
+
+class GstrHsnSummary(models.Model):
+    SUPPLY_B2B = 'B2B'
+    SUPPLY_B2C = 'B2C'
+    SUPPLY_CHOICES = [
+        (SUPPLY_B2B, 'B2B (registered buyer)'),
+        (SUPPLY_B2C, 'B2C (unregistered buyer)'),
+    ]
+
+    month = models.DateField()
+    supply_type = models.CharField(max_length=3, choices=SUPPLY_CHOICES)
+    hsn_code = models.CharField(max_length=20, blank=True, default='')
+    gst_rate = models.DecimalField(max_digits=4, decimal_places=2)
+    line_count = models.IntegerField(default=0)
+    quantity = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    taxable_value = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+    igst = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    cgst = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    sgst = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['month', 'supply_type', 'hsn_code', 'gst_rate'], name='unique_gstr_hsn_summary',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.month:%Y-%m} {self.supply_type} {self.hsn_code} @ {self.gst_rate}%"
+
+
+# ------------------------- Closed Financial Years -------------------------
+# A year closed after filing (see core.closing): its invoices can no longer be
+# created, edited or deleted, its final figures are kept here and its PDFs
+# are served from the archive (core.pdf_archive).
+
+class ClosedFinancialYear(models.Model):
+    financial_year = models.PositiveSmallIntegerField(unique=True)  # 2024 for 2024-25
+    closed_on = models.DateTimeField(auto_now_add=True)
+    closed_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True)
+    invoice_count = models.IntegerField(default=0)
+    summary = models.JSONField(default=dict, encoder=DjangoJSONEncoder)
+    pdfs_archived = models.IntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.financial_year}-{(self.financial_year + 1) % 100:02d} (closed {self.closed_on:%Y-%m-%d})"
@@ -0,0 +1,105 @@
+"""
+Invoice numbers, allocated per series and April-March financial year.
+
+Each (series, financial year) pair has one InvoiceSequence row. ``allocate``
+bumps it with a single UPDATE ... SET last_number = last_number + 1 and reads
+the result back inside the caller's transaction: the row lock taken by the
+UPDATE makes concurrent savers queue behind each other instead of reading the
+same value, and if the invoice's transaction rolls back the number goes back
+with it, so numbers stay gapless. The invoice form only shows a preview from
+``peek``; the real number is assigned when the invoice is saved.
+
+Imported invoices bring their own numbers; ``advance_past`` moves each
+sequence beyond the highest one imported so the form never hands it out again.
+"""
+import re
+from datetime import date
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F, Value
+from django.db.models.functions import Greatest
+
+from .models import InvoiceSequence
+
+
+def financial_year(on_date):
+    """Year the financial year containing ``on_date`` starts in (2025 for 2025-26)."""
+    return on_date.year if on_date.month >= 4 else on_date.year - 1
+
+
+def financial_year_bounds(on_date):
+    start = financial_year(on_date)
+    return date(start, 4, 1), date(start + 1, 3, 31)
+
+
+def format_number(series, fy, number):
+    return f"{series}/{fy}-{(fy + 1) % 100:02d}/{number:03d}"
+
+
+NUMBER_RE = re.compile(r'^(?P<series>.+)/(?P<fy>\d{4})-(?P<next_yy>\d{2})/(?P<number>\d+)$')
+
+
+def parse_number(invoice_number):
+    """(series, financial year, number) of a number in format_number's shape, or None."""
+    match = NUMBER_RE.match(invoice_number)
+    if not match:
+        return None
+    fy = int(match['fy'])
+    if int(match['next_yy']) != (fy + 1) % 100:
+        return None
+    return match['series'], fy, int(match['number'])
+
+
+def allocate(on_date, series=None):
+    """Reserve the next number for the invoice being saved. Call inside its transaction."""
+    series = series or settings.INVOICE_NUMBER_SERIES
+    fy = financial_year(on_date)
+    sequence = InvoiceSequence.objects.filter(series=series, financial_year=fy)
+
+    with transaction.atomic():
+        if not sequence.update(last_number=F('last_number') + 1):
+            try:
+                with transaction.atomic():
+                    InvoiceSequence.objects.create(series=series, financial_year=fy, last_number=1)
+            except IntegrityError:
+                # Another saver started this year's sequence first
+                sequence.update(last_number=F('last_number') + 1)
+        number = sequence.values_list('last_number', flat=True).get()
+    return format_number(series, fy, number)
+
+
+def peek(on_date, series=None):
+    """The number the next invoice would get, without reserving it."""
+    series = series or settings.INVOICE_NUMBER_SERIES
+    fy = financial_year(on_date)
+    last = (
+        InvoiceSequence.objects.filter(series=series, financial_year=fy)
+        .values_list('last_number', flat=True).first()
+    )
+    return format_number(series, fy, (last or 0) + 1)
+
+
+def advance_past(invoice_numbers):
+    """
+    Raise every sequence to at least the highest of ``invoice_numbers`` in it,
+    so they are never allocated again. Numbers in another shape are ignored.
+    Call inside the transaction that saves the invoices.
+    """
+    highest = {}
+    for invoice_number in invoice_numbers:
+        parsed = parse_number(invoice_number)
+        if parsed is None or len(parsed[0]) > InvoiceSequence._meta.get_field('series').max_length:
+            continue
+        series, fy, number = parsed
+        highest[series, fy] = max(number, highest.get((series, fy), 0))
+
+    for (series, fy), number in sorted(highest.items()):
+        sequence = InvoiceSequence.objects.filter(series=series, financial_year=fy)
+        with transaction.atomic():
+            if not sequence.update(last_number=Greatest('last_number', Value(number))):
+                try:
+                    with transaction.atomic():
+                        InvoiceSequence.objects.create(series=series, financial_year=fy, last_number=number)
+                except IntegrityError:
+                    sequence.update(last_number=Greatest('last_number', Value(number)))
@@ -0,0 +1,212 @@
+"""
+Optional Postgres range partitioning of the invoice table by financial year.
+
+``manage.py partition_invoices --convert`` turns core_invoice into a table
+partitioned on invoice_date, one partition per April-March year
+(core_invoice_fy2025 holds 2025-04-01 to 2026-03-31) plus a default
+partition for anything outside them. A date-bounded query - the invoice list
+for a date range, a year's GST report - then only reads the partitions for
+its years, however many old years pile up. After that, every run of
+``manage.py partition_invoices`` (the Docker entrypoint runs it on start)
+creates the partitions for the current and next financial year ahead of
+time, moving in any rows that had landed in the default partition. Nothing
+converts the table implicitly: ``migrate`` never touches it.
+
+The conversion copies the table once, in one transaction, under an
+exclusive lock. Postgres has some rules for partitioned tables, and they
+change a few guarantees:
+
+* The primary key becomes (id, invoice_date), and invoice numbers are only
+  unique within a financial year. The app's numbers carry the year
+  (INV/2025-26/001), the importer checks for existing numbers first and the
+  edit view refuses to save an invoice whose number another one has.
+* Foreign keys can no longer point at the invoice table. The constraints
+  from invoice items and PDF jobs are dropped. Django still cascades
+  deletes itself, as it always has.
+
+Django's migration state does not know any of this: it still has the unique
+constraint on invoice_number, the single-column primary key and the foreign
+keys into core_invoice. makemigrations stays quiet because the models are
+unchanged, but a later migration that alters Invoice.id or
+Invoice.invoice_number, or the invoice foreign key of InvoiceItem or
+PdfRenderJob, would try to drop constraints that no longer exist. Such a
+migration has to check ``is_partitioned`` and skip or adapt its SQL (e.g.
+with SeparateDatabaseAndState).
+
+Invoice items are not partitioned: they carry no date, and they are always
+reached through their invoice's id.
+"""
+from datetime import date
+
+from django.db import connections, transaction
+
+from .models import Invoice
+from .numbering import financial_year
+
+YEARS_AHEAD = 1
+
+
+def partition_name(fy, table=None):
+    return f"{table or Invoice._meta.db_table}_fy{fy}"
+
+
+def default_partition_name(table=None):
+    return f"{table or Invoice._meta.db_table}_default"
+
+
+def is_partitioned(cursor):
+    cursor.execute("SELECT relkind FROM pg_class WHERE oid = to_regclass(%s)", [Invoice._meta.db_table])
+    row = cursor.fetchone()
+    return bool(row) and row[0] == 'p'
+
+
+def attached_years(cursor):
+    cursor.execute(
+        "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+        "WHERE i.inhparent = to_regclass(%s)",
+        [Invoice._meta.db_table],
+    )
+    prefix = f"{Invoice._meta.db_table}_fy"
+    return {int(name[len(prefix):]) for (name,) in cursor.fetchall() if name.startswith(prefix)}
+
+
+def _bounds(fy):
+    """SQL literals for the year's partition range (the upper bound is exclusive)."""
+    return f"'{date(fy, 4, 1).isoformat()}'", f"'{date(fy + 1, 4, 1).isoformat()}'"
+
+
+def _year_unique_index(qn, fy, table=None):
+    # Invoice numbers can only be unique per partition
+    name = partition_name(fy, table)
+    return f"CREATE UNIQUE INDEX {qn(f'{name}_number_uniq')} ON {qn(name)} (invoice_number)"
+
+
+def _conversion(cursor, qn, table, years):
+    """Statements that rebuild the plain invoice table as a partitioned one."""
+    old = f"{table}_unpartitioned"
+    sequence = f"{table}_id_seq"
+
+    cursor.execute(
+        "SELECT t.relname, c.conname FROM pg_constraint c JOIN pg_class t ON t.oid = c.conrelid "
+        "WHERE c.contype = 'f' AND c.confrelid = to_regclass(%s)",
+        [table],
+    )
+    incoming = cursor.fetchall()
+    cursor.execute(
+        "SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint "
+        "WHERE contype = 'f' AND conrelid = to_regclass(%s)",
+        [table],
+    )
+    outgoing = cursor.fetchall()
+    # Plain indexes only; the primary key and unique constraints are replaced below
+    cursor.execute(
+        "SELECT pg_get_indexdef(i.indexrelid) FROM pg_index i "
+        "WHERE i.indrelid = to_regclass(%s) "
+        "AND NOT EXISTS (SELECT 1 FROM pg_constraint c WHERE c.conindid = i.indexrelid)",
+        [table],
+    )
+    indexes = [row[0] for row in cursor.fetchall()]
+    cursor.execute(
+        "SELECT attidentity, pg_get_serial_sequence(%s, 'id') FROM pg_attribute "
+        "WHERE attrelid = to_regclass(%s) AND attname = 'id'",
+        [table, table],
+    )
+    identity, old_sequence = cursor.fetchone()
+    cursor.execute(f"SELECT COALESCE(MAX(id), 0) + 1 FROM {qn(table)}")
+    next_id = cursor.fetchone()[0]
+
+    statements = [f"ALTER TABLE {qn(t)} DROP CONSTRAINT {qn(name)}" for t, name in incoming]
+    statements.append(f"ALTER TABLE {qn(table)} RENAME TO {qn(old)}")
+    # Free the id sequence's name for the new table
+    if identity:
+        statements.append(f"ALTER TABLE {qn(old)} ALTER COLUMN id DROP IDENTITY")
+    else:   # a serial column, from before Django 4.1
+        statements.append(f"ALTER TABLE {qn(old)} ALTER COLUMN id DROP DEFAULT")
+        if old_sequence:
+            statements.append(f"DROP SEQUENCE {old_sequence}")
+    statements += [
+        f"CREATE TABLE {qn(table)} (LIKE {qn(old)} INCLUDING DEFAULTS INCLUDING CONSTRAINTS INCLUDING STORAGE) "
+        f"PARTITION BY RANGE (invoice_date)",
+        f"CREATE SEQUENCE {qn(sequence)} START WITH {next_id} OWNED BY {qn(table)}.id",
+        f"ALTER TABLE {qn(table)} ALTER COLUMN id SET DEFAULT nextval('{sequence}')",
+    ]
+    for fy in years:
+        start, end = _bounds(fy)
+        statements.append(
+            f"CREATE TABLE {qn(partition_name(fy))} PARTITION OF {qn(table)} FOR VALUES FROM ({start}) TO ({end})"
+        )
+    statements += [
+        f"CREATE TABLE {qn(default_partition_name())} PARTITION OF {qn(table)} DEFAULT",
+        f"INSERT INTO {qn(table)} SELECT * FROM {qn(old)}",
+        f"DROP TABLE {qn(old)}",
+        # Indexes are built after the copy, which is much faster than maintaining them during it
+        f"ALTER TABLE {qn(table)} ADD CONSTRAINT {qn(f'{table}_pkey')} PRIMARY KEY (id, invoice_date)",
+        *(f"ALTER TABLE {qn(table)} ADD CONSTRAINT {qn(name)} {definition}" for name, definition in outgoing),
+        *indexes,
+        *(_year_unique_index(qn, fy) for fy in years),
+        f"CREATE UNIQUE INDEX {qn(f'{default_partition_name()}_number_uniq')} "
+        f"ON {qn(default_partition_name())} (invoice_number)",
+        f"ANALYZE {qn(table)}",
+    ]
+    return statements
+
+
+def _new_year(qn, table, fy):
+    """Statements that add one year's partition, taking over its rows from the default partition."""
+    name, default = partition_name(fy, table), default_partition_name(table)
+    start, end = _bounds(fy)
+    in_range = f"invoice_date >= {start} AND invoice_date < {end}"
+    return [
+        # The parent's SHARE UPDATE EXCLUSIVE lock lets writes through; this
+        # keeps them out of the default partition until the year is attached,
+        # so none can land there between the move and the ATTACH
+        f"LOCK TABLE {qn(default)} IN EXCLUSIVE MODE",
+        f"CREATE TABLE {qn(name)} (LIKE {qn(table)} INCLUDING DEFAULTS INCLUDING CONSTRAINTS INCLUDING STORAGE)",
+        f"WITH moved AS (DELETE FROM {qn(default)} WHERE {in_range} RETURNING *) "
+        f"INSERT INTO {qn(name)} SELECT * FROM moved",
+        _year_unique_index(qn, fy, table),
+        f"ALTER TABLE {qn(table)} ATTACH PARTITION {qn(name)} FOR VALUES FROM ({start}) TO ({end})",
+    ]
+
+
+def plan(using='default', today=None, convert=False):
+    """The SQL ``apply`` would run now, in order (empty when there is nothing to do)."""
+    connection = connections[using]
+    qn, table = connection.ops.quote_name, Invoice._meta.db_table
+    wanted_through = financial_year(today or date.today()) + YEARS_AHEAD
+
+    with connection.cursor() as cursor:
+        if not is_partitioned(cursor):
+            if not convert:
+                return []
+            cursor.execute(f"SELECT MIN(invoice_date), MAX(invoice_date) FROM {qn(table)}")
+            first, last = cursor.fetchone()
+            start = financial_year(first) if first else wanted_through - YEARS_AHEAD
+            through = max(wanted_through, financial_year(last) if last else 0)
+            return _conversion(cursor, qn, table, range(start, through + 1))
+
+        attached = attached_years(cursor)
+        cursor.execute(f"SELECT DISTINCT invoice_date FROM {qn(default_partition_name())}")
+        stray = {financial_year(row[0]) for row in cursor.fetchall()}
+    wanted = stray | set(range(wanted_through - YEARS_AHEAD, wanted_through + 1))
+    return [statement for fy in sorted(wanted - attached) for statement in _new_year(qn, table, fy)]
+
+
+def apply(using='default', today=None, convert=False):
+    """
+    Add any missing years to the partitioned invoice table, or with
+    ``convert`` partition a plain one first. Returns the SQL run.
+    """
+    connection = connections[using]
+    with transaction.atomic(using=using):
+        with connection.cursor() as cursor:
+            partitioned = is_partitioned(cursor)
+            if not partitioned and not convert:
+                return []
+            # Converting rewrites the table; adding years only needs to keep other runs out
+            mode = 'SHARE UPDATE EXCLUSIVE' if partitioned else 'ACCESS EXCLUSIVE'
+            cursor.execute(f"LOCK TABLE {connection.ops.quote_name(Invoice._meta.db_table)} IN {mode} MODE")
+            statements = plan(using, today, convert)
+            for statement in statements:
+                cursor.execute(statement)
+    return statements
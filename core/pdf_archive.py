@@ -0,0 +1,59 @@
+"""
+Compressed store for the final PDFs of closed financial years.
+
+Closing a year (core.closing) renders each of its invoices once and keeps the
+PDF gzipped at PDF_ARCHIVE_DIR/fy<year>/<shard>/<invoice id>.pdf.gz. A closed
+invoice never changes, so unlike the PDF cache nothing here depends on the
+invoice's contents and nothing is ever evicted. Serving an archived PDF is
+one file read, however many invoices the year had.
+"""
+import gzip
+import os
+import tempfile
+
+from django.conf import settings
+
+from .numbering import financial_year
+
+
+def _year_dir(fy):
+    return os.path.join(settings.PDF_ARCHIVE_DIR, f"fy{fy}")
+
+
+def _path(invoice_id, fy):
+    return os.path.join(_year_dir(fy), f"{invoice_id % 256:02x}", f"{invoice_id}.pdf.gz")
+
+
+def get(invoice):
+    """The archived PDF of ``invoice``, or None if its year has not been archived."""
+    try:
+        with open(_path(invoice.pk, financial_year(invoice.invoice_date)), 'rb') as f:
+            return gzip.decompress(f.read())
+    except FileNotFoundError:
+        return None
+
+
+def put(invoice_id, fy, data):
+    path = _path(invoice_id, fy)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(gzip.compress(data))
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def archived_ids(fy):
+    """Ids of the invoices archived for the year, so an interrupted close can resume."""
+    ids = set()
+    if not os.path.isdir(_year_dir(fy)):
+        return ids
+    for shard in os.scandir(_year_dir(fy)):
+        if shard.is_dir():
+            ids.update(int(entry.name[:-len('.pdf.gz')]) for entry in os.scandir(shard.path)
+                       if entry.name.endswith('.pdf.gz'))
+    return ids
@@ -0,0 +1,152 @@
+"""
+On-disk cache for rendered invoice PDFs.
+
+Files are content-addressed: the name is a hash of the invoice id, its
+``updated_on`` timestamp and its item rows, so any change to an invoice
+produces a new key and stale files are simply never read again. The cache
+directory (settings.PDF_CACHE_DIR) can be a shared volume; every write is an
+atomic rename, so gunicorn workers and containers can share it safely.
+
+Least-recently-used files are evicted once the directory grows past
+settings.PDF_CACHE_MAX_BYTES. A hit refreshes the file's mtime, which is what
+eviction orders by. Eviction scans the whole directory, so a process only
+sweeps after it has written EVICT_AFTER_SHARE of the cap since its last
+sweep; between sweeps each process can take the cache that far over its cap.
+"""
+import glob
+import hashlib
+import os
+import tempfile
+import threading
+
+from django.conf import settings
+
+# Bump when the PDF layout changes so old renders stop matching
+CACHE_VERSION = 1
+
+ITEM_FIELDS = ('id', 'description', 'hsn_code', 'quantity', 'rate', 'gst_rate')
+
+# Share of PDF_CACHE_MAX_BYTES a process writes between two eviction sweeps
+EVICT_AFTER_SHARE = 0.05
+
+_written_since_evict = 0
+_written_lock = threading.Lock()
+
+
+def is_enabled():
+    return bool(settings.PDF_CACHE_DIR) and settings.PDF_CACHE_MAX_BYTES > 0
+
+
+def cache_key(invoice):
+    """Hash of everything the rendered PDF depends on."""
+    digest = hashlib.sha256()
+    digest.update(f"v{CACHE_VERSION}|{invoice.pk}|{invoice.updated_on.isoformat()}".encode())
+    for row in invoice.items.order_by('id').values_list(*ITEM_FIELDS):
+        digest.update(b"|" + repr(row).encode())
+    return digest.hexdigest()
+
+
+def _shard_dir(invoice_id):
+    return os.path.join(settings.PDF_CACHE_DIR, f"{invoice_id % 256:02x}")
+
+
+def _path(invoice_id, key):
+    return os.path.join(_shard_dir(invoice_id), f"{invoice_id}-{key}.pdf")
+
+
+def get(invoice_id, key):
+    """Return cached bytes for ``key`` or None on a miss."""
+    path = _path(invoice_id, key)
+    try:
+        with open(path, 'rb') as f:
+            data = f.read()
+    except FileNotFoundError:
+        return None
+    try:
+        os.utime(path)  # mark as recently used
+    except OSError:
+        pass
+    return data
+
+
+def put(invoice_id, key, data):
+    """Store ``data`` atomically, evicting old files if a sweep is due."""
+    shard = _shard_dir(invoice_id)
+    os.makedirs(shard, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=shard, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, _path(invoice_id, key))
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    if _sweep_due(len(data)):
+        evict()
+
+
+def _sweep_due(written):
+    """Count ``written`` bytes towards the next sweep; True (and reset) when it is due."""
+    global _written_since_evict
+    with _written_lock:
+        _written_since_evict += written
+        if _written_since_evict < settings.PDF_CACHE_MAX_BYTES * EVICT_AFTER_SHARE:
+            return False
+        _written_since_evict = 0
+        return True
+
+
+def get_or_render(invoice, render):
+    """Serve ``invoice`` from the cache, calling ``render(invoice)`` on a miss."""
+    if not is_enabled():
+        return render(invoice)
+
+    key = cache_key(invoice)
+    data = get(invoice.pk, key)
+    if data is None:
+        data = render(invoice)
+        put(invoice.pk, key, data)
+    return data
+
+
+def invalidate(invoice_id):
+    """Remove every cached render of one invoice."""
+    if not settings.PDF_CACHE_DIR:
+        return
+    for path in glob.glob(os.path.join(_shard_dir(invoice_id), f"{invoice_id}-*.pdf")):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+def evict():
+    """Delete least-recently-used files until the cache fits its size cap."""
+    entries = []
+    total = 0
+    for shard in os.scandir(settings.PDF_CACHE_DIR):
+        if not shard.is_dir():
+            continue
+        for entry in os.scandir(shard.path):
+            if not entry.name.endswith('.pdf'):
+                continue
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+            total += stat.st_size
+
+    if total <= settings.PDF_CACHE_MAX_BYTES:
+        return
+
+    entries.sort()
+    for _, size, path in entries:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        total -= size
+        if total <= settings.PDF_CACHE_MAX_BYTES:
+            break
@@ -0,0 +1,535 @@
+"""
+Direct-canvas invoice renderer, used when PDF_RENDERER is 'canvas'.
+
+The platypus renderer (views.generate_invoice_pdf_platypus) builds a story of
+Tables and Paragraphs and lets platypus measure, wrap and place every cell on
+each render. But the invoice layout is fixed: 18pt rows, known column widths,
+a page frame at fixed coordinates. ``render`` draws the same page straight
+onto the canvas at the positions platypus would pick, measuring text through a
+cached stringWidth. Only the two amount-in-words lines, whose length varies,
+are still wrapped as Paragraphs.
+
+The output looks the same as the platypus renderer's; core.tests compares the
+two page by page. Invoices this layout cannot place exactly (a cell that would
+wrap onto a second line, or a last page that would overflow) make ``render``
+return None, and the caller falls back to platypus.
+
+The page frame (header, buyer box, footer), the item rows and the HSN summary
+are shared with the platypus renderer and live here too.
+"""
+from decimal import Decimal
+from functools import lru_cache
+from io import BytesIO
+
+from num2words import num2words
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.units import cm
+from reportlab.pdfbase.pdfmetrics import stringWidth
+from reportlab.pdfgen.canvas import Canvas
+from reportlab.platypus import Paragraph
+
+from . import metrics, pdf_resources
+
+ITEMS_PER_PAGE = 8
+MARGIN = 1 * cm
+ITEMS_TOP = 8.7 * cm   # space above the item table, under the page frame's header boxes
+GAP = 0.5 * cm
+ITEM_COL_WIDTHS = [1.5*cm, 6.8*cm, 2*cm, 2.3*cm, 2.1*cm, 1.3*cm, 3*cm]
+INTRA_STATE_COL_WIDTHS = [3*cm, 3*cm, 2*cm, 2.5*cm, 2*cm, 2.5*cm, 4*cm]
+INTER_STATE_COL_WIDTHS = [4*cm, 4*cm, 3*cm, 4*cm, 4*cm]
+
+# Platypus metrics the canvas renderer reproduces: SimpleDocTemplate's frame
+# padding, the Normal style and Table's default cell padding
+FRAME_PADDING = 6
+FRAME_LEFT = MARGIN + FRAME_PADDING
+FRAME_WIDTH = A4[0] - 2 * MARGIN - 2 * FRAME_PADDING
+FRAME_TOP = A4[1] - MARGIN - FRAME_PADDING
+FRAME_HEIGHT = A4[1] - 2 * MARGIN - 2 * FRAME_PADDING
+FONT, BOLD_FONT, FONT_SIZE, LEADING = 'Helvetica', 'Helvetica-Bold', 10, 12
+CELL_PADDING_X, CELL_PADDING_Y = 6, 3
+ROW_HEIGHT = LEADING + 2 * CELL_PADDING_Y
+
+
+def invoice_lines(invoice):
+    """The invoice's item rows and its per-HSN taxable value, tax and rate."""
+    D = Decimal
+    invoice_items = []
+    for item in invoice.items.all():
+        invoice_items.append({
+            "desc": item.description.upper() if item.description else "", "hsn": item.hsn_code,
+            "qty": item.quantity, "rate": D(item.rate),
+            "amount": item.amount, "tax": item.tax_amount, "gst_rate": D(item.gst_rate)
+        })
+
+    # Line amounts and their (unrounded) tax are stored on InvoiceItem
+    hsn_summary = {}
+    for item in invoice_items:
+        hsn = item['hsn']
+        if hsn not in hsn_summary:
+            hsn_summary[hsn] = {'taxable_value': D(0), 'tax': D(0), 'gst_rate': item['gst_rate']}
+        hsn_summary[hsn]['taxable_value'] += item['amount']
+        hsn_summary[hsn]['tax'] += item['tax']
+    return invoice_items, hsn_summary
+
+
+def tax_in_words(total_tax):
+    total_tax_integer = int(total_tax)
+    total_tax_paisa = int((total_tax - total_tax_integer) * 100)
+    tax_words = num2words(total_tax_integer, lang='en_IN').title()
+    if total_tax_paisa > 0:
+        tax_words += " and " + num2words(total_tax_paisa, lang='en_IN').title() + " Paisa"
+    return tax_words + " Only"
+
+
+# ------------------------- Page Frame (both renderers) -------------------------
+
+def draw_page_frame(canvas, invoice):
+    """Header, seller/invoice/buyer boxes and footer, drawn on every page."""
+    canvas.saveState()
+    page_num_str = f" (Page {canvas.getPageNumber()})" if canvas.getPageNumber() > 1 else ""
+
+    # Outer Frame
+    canvas.setLineWidth(1)
+    canvas.rect(1 * cm, 1.5 * cm, A4[0] - 2 * cm, A4[1] - 3.5 * cm)
+
+    # Page Title
+    canvas.setFont('Helvetica-Bold', 16)
+    canvas.drawCentredString(10.5 * cm, 28 * cm, f"Tax Invoice{page_num_str}")
+
+    # Seller Details
+    canvas.setFont('Helvetica-Bold', 10)
+    canvas.drawString(1.2 * cm, 27 * cm, invoice.seller_name)
+    canvas.setFont('Helvetica', 9)
+    y = 26.45 * cm
+    for line in invoice.seller_address.split(','):
+        canvas.drawString(1.2 * cm, y, line.strip())
+        y -= 0.4 * cm
+    canvas.drawString(1.2 * cm, y, f"GSTIN/UIN: {invoice.seller_gstin}")
+    y -= 0.4 * cm
+    canvas.drawString(1.2 * cm, y, f"State Name: {invoice.seller_state}, Code: {invoice.seller_state_code}")
+
+    # Invoice Details Box
+    box_left, box_top, box_width, box_height = 10*cm, 27.7*cm, 10*cm, 4.8*cm
+    canvas.rect(box_left, box_top - box_height, box_width, box_height)
+    col_split = box_left + (box_width / 2)
+    row_height = 0.8 * cm
+    for i in range(1, 7):
+        canvas.line(box_left, box_top - i * row_height, box_left + box_width, box_top - i * row_height)
+
+    # Vertical dividers (skip row 2)
+    canvas.line(col_split, box_top, col_split, box_top - row_height)
+    canvas.line(col_split, box_top - 2 * row_height, col_split, box_top - box_height)
+
+    labels = [
+        ("Invoice No.", invoice.invoice_number, "Dated", invoice.invoice_date.strftime('%d-%b-%Y')),
+        ("E-way bill no", invoice.e_way_bill_no or "", None, None),
+        ("Mode/Terms of Payment", invoice.payment_mode or "", "Other References", ""),
+        ("Buyer's Order No.", "", "Dated", ""),
+        ("Dispatch Doc No.", "", "Delivery Note Date", ""),
+        ("Dispatched through", "", "Destination", "")
+    ]
+    canvas.setFont('Helvetica', 8)
+    text_padding_x = 4
+    text_padding_y = 7.5
+    for i, row_data in enumerate(labels):
+        y_text = box_top - i * row_height - text_padding_y
+        l1, v1, l2, v2 = row_data
+
+        canvas.drawString(box_left + text_padding_x, y_text, l1)
+        canvas.setFont('Helvetica-Bold', 9)
+        canvas.drawString(box_left + text_padding_x, y_text - 11.5, str(v1))
+        canvas.setFont('Helvetica', 8)
+
+        if l2 is not None:
+            canvas.drawString(col_split + text_padding_x, y_text, l2)
+            canvas.setFont('Helvetica-Bold', 9)
+            canvas.drawString(col_split + text_padding_x, y_text - 11.5, str(v2))
+            canvas.setFont('Helvetica', 8)
+    canvas.drawString(box_left + text_padding_x, (box_top - box_height - 0.4 * cm), "Terms of Delivery")
+
+    # --- Buyer & Transport Details ---
+    # Main container box for the sections
+    box_left, box_bottom, box_width, box_height = 1 * cm, 19.8 * cm, 9 * cm, 4.5 * cm
+    canvas.rect(box_left, box_bottom, box_width, box_height, stroke=1, fill=0)
+
+    text_x = 1.2 * cm
+    line_spacing = 0.35 * cm
+    top_padding = 0.35 * cm
+
+    has_transport = bool(getattr(invoice, 'transport_name', '') or getattr(invoice, 'transport_gstin', '') or getattr(invoice, 'transport_address', ''))
+
+    if has_transport:
+        section_height = box_height / 2
+        divider_y = box_bottom + section_height
+        canvas.line(box_left, divider_y, box_left + box_width, divider_y)
+
+        # Buyer section (Top half)
+        y = box_bottom + box_height - top_padding
+        canvas.setFont('Helvetica', 9)
+        canvas.drawString(text_x, y, "Buyer (Bill to)")
+        y -= (line_spacing + 0.15 * cm)
+        canvas.setFont('Helvetica-Bold', 10)
+        canvas.drawString(text_x, y, getattr(invoice, 'buyer_name', '').upper())
+        y -= (line_spacing + 0.15 * cm)
+        canvas.setFont('Helvetica', 9)
+        if getattr(invoice, 'buyer_address', ''):
+            canvas.drawString(text_x, y, getattr(invoice, 'buyer_address', '').upper())
+            y -= line_spacing
+        if getattr(invoice, 'buyer_gstin', ''):
+            canvas.drawString(text_x, y, f"GSTIN/UIN: {getattr(invoice, 'buyer_gstin', '').upper()}")
+            y -= line_spacing
+        canvas.drawString(text_x, y, f"Place of Supply: {getattr(invoice, 'place_of_supply', '').upper()}")
+
+        # Transport section (Bottom half)
+        y = box_bottom + section_height - top_padding
+        canvas.setFont('Helvetica', 9)
+        canvas.drawString(text_x, y, "Transport Details")
+        y -= (line_spacing + 0.15 * cm)
+        canvas.setFont('Helvetica-Bold', 10)
+        canvas.drawString(text_x, y, getattr(invoice, 'transport_name', '').upper())
+        y -= (line_spacing + 0.15 * cm)
+        canvas.setFont('Helvetica', 9)
+        if getattr(invoice, 'transport_gstin', ''):
+            canvas.drawString(text_x, y, f"GSTIN/UIN: {getattr(invoice, 'transport_gstin', '').upper()}")
+            y -= line_spacing
+        if getattr(invoice, 'transport_address', ''):
+            canvas.drawString(text_x, y, f"Address: {getattr(invoice, 'transport_address', '').upper()}")
+    else:
+        # Buyer section (Full box)
+        y = box_bottom + box_height - top_padding
+        canvas.setFont('Helvetica', 9)
+        canvas.drawString(text_x, y, "Buyer (Bill to)")
+        y -= (line_spacing + 0.15 * cm)
+        canvas.setFont('Helvetica-Bold', 10)
+        canvas.drawString(text_x, y, getattr(invoice, 'buyer_name', '').upper())
+        y -= (line_spacing + 0.15 * cm)
+        canvas.setFont('Helvetica', 9)
+
+        if getattr(invoice, 'buyer_address', ''):
+            for line in getattr(invoice, 'buyer_address', '').split(','):
+                if line.strip():
+                    canvas.drawString(text_x, y, line.strip().upper())
+                    y -= line_spacing
+
+        if getattr(invoice, 'buyer_gstin', ''):
+            canvas.drawString(text_x, y, f"GSTIN/UIN: {getattr(invoice, 'buyer_gstin', '').upper()}")
+            y -= line_spacing
+        canvas.drawString(text_x, y, f"Place of Supply: {getattr(invoice, 'place_of_supply', '').upper()}")
+
+    # Declaration and Signature Box
+
+    page_width = A4[0]
+    footer_y = 1.5 * cm
+    left_x = 1.2 * cm
+
+    canvas.setFont('Helvetica-Bold', 10)
+    declaration_title = "Declaration"
+    canvas.drawString(left_x, footer_y + 3 * cm, declaration_title)
+    text_width = canvas.stringWidth(declaration_title, 'Helvetica-Bold', 10)
+    canvas.line(left_x, footer_y + 2.9 * cm, left_x + text_width, footer_y + 2.9 * cm)
+    declaration_text = ["We declare that this invoice shows the actual price of the goods described and that all particulars are true and correct."]
+    text_obj = canvas.beginText(left_x, footer_y + 2.5 * cm)
+    text_obj.setFont("Helvetica", 9)
+    text_obj.setLeading(12)
+    for line in declaration_text:
+        text_obj.textLine(line)
+    canvas.drawText(text_obj)
+
+    # --- Bank Details Box on the left bottom ---
+    bank_box_width = 9.7 * cm
+    bank_box_height = 2.2 * cm
+    bank_x = 1 * cm
+    bank_y = footer_y  # same baseline as declaration box
+
+    # Draw rectangle for bank details box
+    canvas.rect(bank_x, bank_y, bank_box_width, bank_box_height)
+
+    # Bank details title
+    canvas.setFont('Helvetica-Bold', 10)
+    canvas.drawString(bank_x + 0.3 * cm, bank_y + bank_box_height - 0.4 * cm, "Bank Details")
+
+    # Bank details content (adjust these to your invoice attributes or static text)
+    canvas.setFont('Helvetica', 9)
+    line_height = 0.4 * cm
+    start_y = bank_y + bank_box_height - 0.8 * cm
+
+    canvas.drawString(bank_x + 0.3 * cm, start_y, "Beneficiary Name    : KAVIN TEX")
+    canvas.drawString(bank_x + 0.3 * cm, start_y - line_height, "Bank A/c. No.          : 292700050900034")
+    canvas.drawString(bank_x + 0.3 * cm, start_y - 2 * line_height, "Name of the Bank   : TMBL")
+    canvas.drawString(bank_x + 0.3 * cm, start_y - 3 * line_height, "IFSC Code              : TMBL0000292")
+
+    right_box_width = 9.3 * cm
+    right_box_height = 2.2 * cm
+    right_x = page_width - right_box_width - 1 * cm
+    canvas.rect(right_x, footer_y, right_box_width, right_box_height)
+    canvas.setFont('Helvetica-Bold', 10)
+    canvas.drawRightString(right_x + right_box_width - 0.3 * cm, footer_y + 1.7 * cm, f"for {invoice.seller_name}")
+    canvas.setFont('Helvetica', 9)
+    canvas.drawRightString(right_x + right_box_width - 0.3 * cm, footer_y + 0.4 * cm, "Authorised Signatory")
+
+    canvas.setFont('Helvetica', 9)
+    canvas.drawCentredString(10.5 * cm, 1 * cm, "This is a Computer Generated Invoice")
+
+    canvas.restoreState()
+
+
+# ------------------------- Direct-Canvas Renderer -------------------------
+
+class DoesNotFit(Exception):
+    """The invoice needs platypus to lay it out (a cell wraps or the last page overflows)."""
+
+
+@lru_cache(maxsize=4096)
+def text_width(text, font=FONT):
+    return stringWidth(text, font, FONT_SIZE)
+
+
+# A cell is (align, runs, wraps): align is 'L', 'C' or 'R', runs are (text, font)
+# pairs drawn one after another, and ``wraps`` marks what platypus holds in a
+# Paragraph and would break onto a second line if it were too wide.
+def _text(text, align):
+    return align, ((str(text), FONT),), False
+
+
+def _para(text, align='R', font=FONT):
+    return align, ((str(text), font),), True
+
+
+def _bold(text, align='R'):
+    return _para(text, align, BOLD_FONT)
+
+
+def _header(titles):
+    return [_bold(title, 'L') if title else None for title in titles]
+
+
+class _Table:
+    """A grid of 18pt rows, drawn as platypus draws a GRID-styled Table of single-line cells."""
+
+    def __init__(self, col_widths, rows, spans=()):
+        self.col_widths = col_widths
+        self.rows = rows
+        self.height = len(rows) * ROW_HEIGHT
+        # Spans as (first col, first row, last col, last row), negative rows counted from the end
+        self.spans = [(c0, r0 % len(rows), c1, r1 % len(rows)) for c0, r0, c1, r1 in spans]
+        self.lefts = [sum(col_widths[:c]) for c in range(len(col_widths) + 1)]
+        self.cells = []
+        for r, row in enumerate(rows):
+            for c, cell in enumerate(row):
+                if cell is None or self._hidden(c, r):
+                    continue
+                c1, r1 = self._span_end(c, r)
+                width = self.lefts[c1 + 1] - self.lefts[c]
+                if cell[2] and sum(text_width(text, font) for text, font in cell[1]) > width - 2 * CELL_PADDING_X:
+                    raise DoesNotFit
+                self.cells.append((c, r, r1, width, cell))
+
+    def _span_end(self, c, r):
+        for c0, r0, c1, r1 in self.spans:
+            if (c0, r0) == (c, r):
+                return c1, r1
+        return c, r
+
+    def _hidden(self, c, r):
+        return any(c0 <= c <= c1 and r0 <= r <= r1 and (c, r) != (c0, r0) for c0, r0, c1, r1 in self.spans)
+
+    def draw(self, canvas, top):
+        left = FRAME_LEFT + (FRAME_WIDTH - self.lefts[-1]) / 2   # centred, as platypus places a table
+        # One text object for the whole table; drawString would start a new one per cell
+        text_object, current_font = canvas.beginText(), None
+        for c, r, r1, width, (align, runs, _) in self.cells:
+            bottom = top - (r1 + 1) * ROW_HEIGHT
+            y = bottom + ((r1 - r + 1) * ROW_HEIGHT + LEADING) / 2 - FONT_SIZE
+            text_length = sum(text_width(text, font) for text, font in runs)
+            if align == 'L':
+                x = left + self.lefts[c] + CELL_PADDING_X
+            elif align == 'C':
+                x = left + self.lefts[c] + (width - text_length) / 2
+            else:
+                x = left + self.lefts[c] + width - CELL_PADDING_X - text_length
+            text_object.setTextOrigin(x, y)
+            for text, font in runs:
+                if font != current_font:
+                    text_object.setFont(font, FONT_SIZE, LEADING)
+                    current_font = font
+                text_object.textOut(text)
+        canvas.drawText(text_object)
+        self._draw_grid(canvas, left, top)
+
+    def _draw_grid(self, canvas, left, top):
+        n_rows, n_cols = len(self.rows), len(self.col_widths)
+
+        def inside_span(c, r, across_rows):
+            # Is the edge after row r (or after column c) inside a spanned cell?
+            for c0, r0, c1, r1 in self.spans:
+                if across_rows and c0 <= c <= c1 and r0 <= r < r1:
+                    return True
+                if not across_rows and r0 <= r <= r1 and c0 <= c < c1:
+                    return True
+            return False
+
+        canvas.saveState()
+        canvas.setLineWidth(1)
+        canvas.setLineCap(1)
+        canvas.setLineJoin(1)
+        for i in range(n_rows + 1):
+            y = top - i * ROW_HEIGHT
+            skipped = [0 < i < n_rows and inside_span(c, i - 1, True) for c in range(n_cols)]
+            for start, end in _runs(skipped):
+                canvas.line(left + self.lefts[start], y, left + self.lefts[end], y)
+        for j in range(n_cols + 1):
+            x = left + self.lefts[j]
+            skipped = [0 < j < n_cols and inside_span(j - 1, r, False) for r in range(n_rows)]
+            for start, end in _runs(skipped):
+                canvas.line(x, top - start * ROW_HEIGHT, x, top - end * ROW_HEIGHT)
+        canvas.restoreState()
+
+
+def _runs(skipped):
+    """(start, end) index ranges of the consecutive False entries."""
+    start = None
+    for i, skip in enumerate(skipped + [True]):
+        if not skip and start is None:
+            start = i
+        elif skip and start is not None:
+            yield start, i
+            start = None
+
+
+def _item_tables(invoice, invoice_items):
+    chunks = [invoice_items[i:i + ITEMS_PER_PAGE] for i in range(0, len(invoice_items), ITEMS_PER_PAGE)]
+    header = _header(["SI No.", "Description", "HSN", "Quantity", "Rate", "per", "Amount"])
+    tables = []
+    for i, chunk in enumerate(chunks):
+        rows = [header]
+        for idx, item in enumerate(chunk):
+            rows.append([
+                _text(i * ITEMS_PER_PAGE + idx + 1, 'C'), _text(item['desc'], 'L'), _text(item['hsn'], 'C'),
+                _para(item['qty']), _para(f"{item['rate']:.2f}"), _text("Nos", 'C'), _para(f"{item['amount']:.2f}"),
+            ])
+
+        if i == len(chunks) - 1:
+            gst_rate = invoice_items[0]['gst_rate']
+            rows.append([None, _bold("Sub Total"), None, None, None, None, _bold(f"{invoice.subtotal:.2f}")])
+            if invoice.igst_total > 0:
+                taxes = [("IGST", gst_rate, invoice.igst_total)]
+            else:
+                taxes = [("CGST", gst_rate / 2, invoice.cgst_total), ("SGST", gst_rate / 2, invoice.sgst_total)]
+            for name, rate, amount in taxes:
+                rows.append([
+                    None, _para(f"Output Tax {name} @ {rate:.2f}%"), None, None,
+                    _para(f"{rate:.2f}%"), _text('%', 'C'), _para(f"{amount:.2f}"),
+                ])
+            if invoice.round_off != 0:
+                rows.append([None, _para("Round Off"), None, None, None, None, _para(f"{invoice.round_off:.2f}")])
+
+            total_qty = sum(item['qty'] for item in invoice_items)
+            grand_total = ('R', (('₹', pdf_resources.RUPEE_FONT), (f" {invoice.grand_total:.2f}", BOLD_FONT)), True)
+            rows.append([None, _bold("TOTAL"), None, _bold(f"{total_qty} Nos"), None, None, grand_total])
+        tables.append(_Table(ITEM_COL_WIDTHS, rows))
+    return tables
+
+
+def _tax_table(invoice, hsn_summary):
+    """The HSN summary table and the total tax."""
+    D = Decimal
+    if invoice.igst_total == 0:
+        rows = [
+            _header(["HSN", "Taxable Value", "Central Tax (CGST)", "", "State Tax (SGST)", "", "Total Tax"]),
+            [None, None, _bold("Rate", 'L'), _bold("Amount", 'L'), _bold("Rate", 'L'), _bold("Amount", 'L'), None],
+        ]
+        spans = [(0, 0, 0, 1), (1, 0, 1, 1), (2, 0, 3, 0), (4, 0, 5, 0), (6, 0, 6, 1), (0, -1, 1, -1)]
+        col_widths = INTRA_STATE_COL_WIDTHS
+    else:
+        rows = [
+            _header(["HSN", "Taxable Value", "Integrated Tax (IGST)", "", "Total Tax"]),
+            [None, None, _bold("Rate", 'L'), _bold("Amount", 'L'), None],
+        ]
+        spans = [(0, 0, 0, 1), (1, 0, 1, 1), (2, 0, 3, 0), (4, 0, 4, 1), (0, -1, 1, -1)]
+        col_widths = INTER_STATE_COL_WIDTHS
+
+    total_cgst = total_igst = D(0)
+    for hsn, data in hsn_summary.items():
+        gst_rate = data['gst_rate']
+        row = [_text(hsn, 'C'), _para(f"{data['taxable_value']:.2f}")]
+        if invoice.igst_total == 0:
+            cgst_amount = (data['tax'] / 2).quantize(D("0.01"))
+            total_cgst += cgst_amount
+            row += [
+                _text(f"{gst_rate/2:.2f}%", 'C'), _para(f"{cgst_amount:.2f}"),
+                _text(f"{gst_rate/2:.2f}%", 'C'), _para(f"{cgst_amount:.2f}"), _para(f"{cgst_amount * 2:.2f}"),
+            ]
+        else:
+            igst_amount = data['tax'].quantize(D("0.01"))
+            total_igst += igst_amount
+            row += [_text(f"{gst_rate:.2f}%", 'C'), _para(f"{igst_amount:.2f}"), _para(f"{igst_amount:.2f}")]
+        rows.append(row)
+
+    # The total taxable value sits under the "Total" span, so platypus never draws it
+    if invoice.igst_total == 0:
+        total_tax = total_cgst * 2
+        rows.append([_bold("Total", 'L'), None, None, _bold(f"{total_cgst:.2f}"), None, _bold(f"{total_cgst:.2f}"),
+                     _bold(f"{total_tax:.2f}")])
+    else:
+        total_tax = total_igst
+        rows.append([_bold("Total", 'L'), None, None, _bold(f"{total_igst:.2f}"), _bold(f"{total_tax:.2f}")])
+    return _Table(col_widths, rows, spans), total_tax
+
+
+def _paragraph(text):
+    paragraph = Paragraph(text, pdf_resources.get_styles()['normal'])
+    return paragraph, paragraph.wrap(FRAME_WIDTH, FRAME_HEIGHT)[1]
+
+
+def render(invoice):
+    """The invoice PDF drawn straight onto the canvas, or None if it needs the platypus renderer."""
+    invoice_items, hsn_summary = invoice_lines(invoice)
+    if not invoice_items or any('\n' in f"{item['desc']}{item['hsn']}" for item in invoice_items):
+        return None
+    pdf_resources.ensure_fonts()
+    try:
+        item_tables = _item_tables(invoice, invoice_items)
+        tax_table, total_tax = _tax_table(invoice, hsn_summary)
+    except DoesNotFit:
+        return None
+    words, words_height = _paragraph(f"<b>Amount Chargeable (in words)</b><br/><b>{invoice.total_in_words}</b>")
+    tax_words, tax_words_height = _paragraph(f"Tax Amount (in words): <b>INR {tax_in_words(total_tax)}</b>")
+
+    # Everything after the last item table has to fit on its page, as platypus would not split it there
+    last_page = (
+        ITEMS_TOP + item_tables[-1].height + LEADING + GAP + words_height + GAP
+        + tax_table.height + GAP + tax_words_height
+    )
+    if last_page > FRAME_HEIGHT - 1:
+        return None
+
+    buffer = BytesIO()
+    with metrics.pdf_build() as build:
+        canvas = Canvas(buffer, pagesize=A4)
+        right = FRAME_LEFT + FRAME_WIDTH
+        for table in item_tables[:-1]:
+            draw_page_frame(canvas, invoice)
+            y = FRAME_TOP - ITEMS_TOP - table.height
+            table.draw(canvas, y + table.height)
+            canvas.setFont(FONT, FONT_SIZE)
+            canvas.drawString(right - text_width("continued ..."), y - GAP - FONT_SIZE, "continued ...")
+            canvas.showPage()
+
+        draw_page_frame(canvas, invoice)
+        y = FRAME_TOP - ITEMS_TOP
+        item_tables[-1].draw(canvas, y)
+        y -= item_tables[-1].height
+        canvas.setFont(FONT, FONT_SIZE)
+        canvas.drawString(right - text_width("E. & O.E"), y - FONT_SIZE, "E. & O.E")
+        y -= LEADING + GAP + words_height
+        words.drawOn(canvas, FRAME_LEFT, y)
+        y -= GAP
+        tax_table.draw(canvas, y)
+        y -= tax_table.height + GAP + tax_words_height
+        tax_words.drawOn(canvas, FRAME_LEFT, y)
+        canvas.showPage()
+        canvas.save()
+
+        pdf_bytes = buffer.getvalue()
+        build['size'] = len(pdf_bytes)
+    return pdf_bytes
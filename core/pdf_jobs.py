@@ -0,0 +1,94 @@
+"""
+Database-backed queue for rendering invoice PDFs outside the web workers.
+
+Saving an invoice enqueues a PdfRenderJob after commit; ``manage.py
+run_pdf_worker`` claims jobs one at a time and renders them into the PDF
+cache, which is where generate_invoice_pdf_view serves them from. No broker
+is needed: jobs are claimed with SELECT ... FOR UPDATE SKIP LOCKED on
+Postgres, plus a guarded status update so two workers can never both run
+the same job.
+"""
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils.timezone import now
+
+from . import pdf_cache
+from .models import Invoice, PdfRenderJob
+
+ACTIVE_STATUSES = (PdfRenderJob.STATUS_QUEUED, PdfRenderJob.STATUS_RUNNING)
+
+
+def enqueue(invoice_id):
+    """
+    Queue a render unless one is already waiting for this invoice, or running
+    since before the invoice last changed (it may have read the old version).
+    """
+    job = (
+        PdfRenderJob.objects.filter(invoice_id=invoice_id, status__in=ACTIVE_STATUSES)
+        .order_by('-id').first()
+    )
+    if job is not None and job.status == PdfRenderJob.STATUS_RUNNING:
+        if Invoice.objects.filter(pk=invoice_id, updated_on__gt=job.started_on).exists():
+            job = None
+    return job or PdfRenderJob.objects.create(invoice_id=invoice_id)
+
+
+def enqueue_on_commit(invoice_id):
+    """Pre-render a saved invoice once its transaction commits."""
+    if settings.PDF_RENDER_ASYNC:
+        transaction.on_commit(lambda: enqueue(invoice_id))
+
+
+def claim_next():
+    """Mark the oldest queued job as running and return it, or None."""
+    with transaction.atomic():
+        job = (
+            PdfRenderJob.objects.select_for_update(skip_locked=True)
+            .filter(status=PdfRenderJob.STATUS_QUEUED)
+            .order_by('created_on', 'id').first()
+        )
+        if job is None:
+            return None
+        claimed = PdfRenderJob.objects.filter(pk=job.pk, status=PdfRenderJob.STATUS_QUEUED).update(
+            status=PdfRenderJob.STATUS_RUNNING, started_on=now(), attempts=job.attempts + 1,
+        )
+    if not claimed:
+        return None
+    job.refresh_from_db()
+    return job
+
+
+def run_job(job, max_attempts=3):
+    """Render one claimed job into the PDF cache and record the outcome."""
+    from .views import generate_invoice_pdf
+
+    try:
+        invoice = Invoice.objects.get(pk=job.invoice_id)
+        pdf_cache.get_or_render(invoice, generate_invoice_pdf)
+    except Exception:
+        traceback.print_exc()
+        job.error = traceback.format_exc()
+        job.status = PdfRenderJob.STATUS_QUEUED if job.attempts < max_attempts else PdfRenderJob.STATUS_FAILED
+    else:
+        job.error = ''
+        job.status = PdfRenderJob.STATUS_DONE
+    job.finished_on = now()
+    job.save(update_fields=['status', 'error', 'finished_on'])
+    return job
+
+
+def requeue_stale(timeout):
+    """Put back jobs whose worker died mid-render."""
+    return PdfRenderJob.objects.filter(
+        status=PdfRenderJob.STATUS_RUNNING, started_on__lt=now() - timeout,
+    ).update(status=PdfRenderJob.STATUS_QUEUED)
+
+
+def purge_finished(older_than=timedelta(days=7)):
+    return PdfRenderJob.objects.filter(
+        status__in=(PdfRenderJob.STATUS_DONE, PdfRenderJob.STATUS_FAILED),
+        finished_on__lt=now() - older_than,
+    ).delete()
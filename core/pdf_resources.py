@@ -0,0 +1,69 @@
+"""
+Process-wide resources for the invoice PDF renderer.
+
+Paragraph styles and the DejaVuSans TTF (used for the rupee sign) used to be
+rebuilt and re-parsed on every render. They never change while a worker is
+alive, so they are built once per process here, behind a lock so threaded
+workers don't race on the first render. ``warm_up`` is called from the
+gunicorn ``post_worker_init`` hook so the first request doesn't pay for it.
+"""
+import os
+import threading
+
+from django.conf import settings
+from reportlab.lib.enums import TA_RIGHT
+from reportlab.lib.styles import ParagraphStyle, getSampleStyleSheet
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+
+RUPEE_FONT = 'DejaVuSans'
+
+_lock = threading.Lock()
+_styles = None
+_fonts_registered = False
+
+
+def font_path():
+    return os.path.join(settings.BASE_DIR, 'core', 'static', 'assets', 'fonts', 'DejaVuSans', 'DejaVuSans.ttf')
+
+
+def build_styles():
+    """Paragraph styles used by generate_invoice_pdf, keyed by name."""
+    style_normal = getSampleStyleSheet()['Normal']
+    return {
+        'normal': style_normal,
+        'right': ParagraphStyle(name='right', parent=style_normal, alignment=TA_RIGHT),
+        'bold_right': ParagraphStyle(name='bold_right', parent=style_normal, alignment=TA_RIGHT, fontName='Helvetica-Bold'),
+        'left_bold': ParagraphStyle(name='left_bold', parent=style_normal, fontName='Helvetica-Bold'),
+    }
+
+
+def register_fonts():
+    path = font_path()
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"Font file not found at: {path}")
+    pdfmetrics.registerFont(TTFont(RUPEE_FONT, path))
+
+
+def get_styles():
+    global _styles
+    if _styles is None:
+        with _lock:
+            if _styles is None:
+                _styles = build_styles()
+    return _styles
+
+
+def ensure_fonts():
+    global _fonts_registered
+    if not _fonts_registered:
+        with _lock:
+            if not _fonts_registered:
+                register_fonts()
+                _fonts_registered = True
+
+
+def warm_up():
+    """Load every shared PDF resource now instead of on the first render."""
+    get_styles()
+    ensure_fonts()
@@ -0,0 +1,185 @@
+"""
+Daily rollups behind the dashboard.
+
+Every invoice contributes to one DailyInvoiceSummary row (its invoice_date),
+one DailyBuyerRevenue row and one DailyItemRevenue row per item description.
+The write paths read an invoice's contribution before and after they change
+it and hand both to ``apply_invoice_delta`` inside the same transaction, so
+the rollups move together with the invoice tables.
+"""
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import connection, transaction
+from django.db.models import Count, Sum
+
+from .models import (
+    DailyBuyerRevenue, DailyInvoiceSummary, DailyItemRevenue, Invoice, InvoiceItem,
+)
+
+SUMMARY_FIELDS = ('subtotal', 'cgst_total', 'sgst_total', 'igst_total', 'grand_total')
+UPSERT_BATCH_SIZE = 500
+
+
+def invoice_contribution(invoice_id):
+    """
+    Read what one invoice currently adds to the rollups.
+    Returns None if the invoice does not exist (e.g. not saved yet).
+    """
+    row = Invoice.objects.filter(pk=invoice_id).values('invoice_date', 'buyer_name', *SUMMARY_FIELDS).first()
+    if row is None:
+        return None
+
+    items = (
+        InvoiceItem.objects.filter(invoice_id=invoice_id)
+        .values('description')
+        .annotate(line_count=Count('id'), revenue=Sum('amount'))
+    )
+    row['items'] = {i['description']: (i['line_count'], i['revenue'] or Decimal(0)) for i in items}
+    return row
+
+
+def apply_invoice_delta(old=None, new=None):
+    """
+    Move the rollups from an invoice's old contribution to its new one.
+    Create passes only ``new``, delete passes only ``old``, edit passes both.
+    Must run inside the transaction that changes the invoice.
+    """
+    apply_contributions(
+        removed=[old] if old is not None else [],
+        added=[new] if new is not None else [],
+    )
+
+
+def apply_contributions(removed=(), added=()):
+    """
+    Subtract every contribution in ``removed`` and add every one in ``added``,
+    folded into one upsert per rollup table however many invoices are involved.
+    """
+    summary = defaultdict(lambda: [0] + [Decimal(0)] * len(SUMMARY_FIELDS))
+    buyers = defaultdict(lambda: [0, Decimal(0)])
+    items = defaultdict(lambda: [0, Decimal(0)])
+
+    signed = [(c, -1) for c in removed] + [(c, 1) for c in added]
+    for contribution, sign in signed:
+        if contribution is None:
+            continue
+        day = contribution['invoice_date']
+
+        totals = summary[(day,)]
+        totals[0] += sign
+        for i, field in enumerate(SUMMARY_FIELDS, start=1):
+            totals[i] += sign * Decimal(contribution[field] or 0)
+
+        buyer = buyers[(day, contribution['buyer_name'])]
+        buyer[0] += sign
+        buyer[1] += sign * Decimal(contribution['grand_total'] or 0)
+
+        for description, (line_count, revenue) in contribution['items'].items():
+            item = items[(day, description)]
+            item[0] += sign * line_count
+            item[1] += sign * Decimal(revenue)
+
+    _increment(DailyInvoiceSummary, ('date',), ('invoice_count',) + SUMMARY_FIELDS, summary)
+    _increment(DailyBuyerRevenue, ('date', 'buyer_name'), ('invoice_count', 'revenue'), buyers)
+    _increment(DailyItemRevenue, ('date', 'description'), ('line_count', 'revenue'), items)
+
+    if removed:
+        # Drop rows that no longer have any invoice behind them
+        days = {key[0] for key in summary}
+        DailyInvoiceSummary.objects.filter(date__in=days, invoice_count__lte=0).delete()
+        DailyBuyerRevenue.objects.filter(date__in=days, invoice_count__lte=0).delete()
+        DailyItemRevenue.objects.filter(date__in=days, line_count__lte=0).delete()
+
+
+def _increment(model, key_fields, counter_fields, rows):
+    """
+    Add ``rows`` ({key tuple: [counter deltas]}) onto ``model`` with a single
+    INSERT ... ON CONFLICT DO UPDATE, so concurrent writers on the same day
+    add up instead of overwriting each other.
+    """
+    rows = {key: deltas for key, deltas in rows.items() if any(deltas)}
+    if not rows:
+        return
+
+    qn = connection.ops.quote_name
+    opts = model._meta
+    table = qn(opts.db_table)
+    keys = [qn(opts.get_field(f).column) for f in key_fields]
+    counters = [qn(opts.get_field(f).column) for f in counter_fields]
+
+    placeholders = '(' + ', '.join(['%s'] * (len(keys) + len(counters))) + ')'
+    updates = ', '.join(f"{c} = {table}.{c} + EXCLUDED.{c}" for c in counters)
+    rows = list(rows.items())
+
+    # Batched so bulk imports stay under the database's bind-parameter limit
+    with connection.cursor() as cursor:
+        for start in range(0, len(rows), UPSERT_BATCH_SIZE):
+            batch = rows[start:start + UPSERT_BATCH_SIZE]
+            sql = (
+                f"INSERT INTO {table} ({', '.join(keys + counters)}) "
+                f"VALUES {', '.join([placeholders] * len(batch))} "
+                f"ON CONFLICT ({', '.join(keys)}) DO UPDATE SET {updates}"
+            )
+            params = []
+            for key, deltas in batch:
+                params.extend(key)
+                params.extend(deltas)
+            cursor.execute(sql, params)
+
+
+@transaction.atomic
+def rebuild_daily_summaries(batch_size=1000):
+    """Recompute every rollup row from scratch with set-based GROUP BY queries."""
+    DailyInvoiceSummary.objects.all().delete()
+    DailyBuyerRevenue.objects.all().delete()
+    DailyItemRevenue.objects.all().delete()
+
+    summaries = (
+        Invoice.objects.values('invoice_date')
+        .annotate(invoice_count=Count('id'), **{f"{f}_sum": Sum(f) for f in SUMMARY_FIELDS})
+        .order_by()
+    )
+    DailyInvoiceSummary.objects.bulk_create(
+        (
+            DailyInvoiceSummary(
+                date=row['invoice_date'],
+                invoice_count=row['invoice_count'],
+                **{f: row[f"{f}_sum"] or 0 for f in SUMMARY_FIELDS},
+            )
+            for row in summaries.iterator()
+        ),
+        batch_size=batch_size,
+    )
+
+    buyers = (
+        Invoice.objects.values('invoice_date', 'buyer_name')
+        .annotate(invoice_count=Count('id'), revenue=Sum('grand_total'))
+        .order_by()
+    )
+    DailyBuyerRevenue.objects.bulk_create(
+        (
+            DailyBuyerRevenue(
+                date=row['invoice_date'], buyer_name=row['buyer_name'],
+                invoice_count=row['invoice_count'], revenue=row['revenue'] or 0,
+            )
+            for row in buyers.iterator()
+        ),
+        batch_size=batch_size,
+    )
+
+    items = (
+        InvoiceItem.objects.values('invoice__invoice_date', 'description')
+        .annotate(line_count=Count('id'), revenue=Sum('amount'))
+        .order_by()
+    )
+    DailyItemRevenue.objects.bulk_create(
+        (
+            DailyItemRevenue(
+                date=row['invoice__invoice_date'], description=row['description'],
+                line_count=row['line_count'], revenue=row['revenue'] or 0,
+            )
+            for row in items.iterator()
+        ),
+        batch_size=batch_size,
+    )
@@ -0,0 +1,299 @@
+"""
+Deterministic synthetic invoices for benchmarks and for reproducing
+production issues at scale.
+
+The same seed always produces the same invoices: buyers spread over the
+states with GSTINs that pass the checksum (most in the seller's own state,
+so most invoices are intra-state CGST+SGST and the rest IGST), a handful of
+HSN codes carrying most of the lines, mostly short invoices with a long tail
+past one PDF page, and dates spread evenly over several financial years.
+Totals follow the invoice form's rules - tax per line at the line's GST
+rate, CGST and SGST as halves of the tax, the grand total rounded to the
+rupee with the difference in round_off - and are worked out in whole paise,
+so they are exact.
+
+Rows are written in batches, each in its own transaction: with COPY on
+Postgres, with a plain executemany INSERT elsewhere (no model instances
+either way). Each batch reserves its primary keys first, so items can point
+at their invoice without reading ids back. Numbers continue
+each financial year's InvoiceSequence for the series, and the sequences are
+moved past the seeded numbers so invoices saved afterwards carry on from
+there. At the end the new invoices are linked to their buyers, dashboard
+rollups are rebuilt, stored GST report months invalidated and the cache
+generation bumped.
+"""
+import csv
+import io
+import itertools
+import random
+from datetime import date, datetime, time, timedelta
+from functools import lru_cache
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from . import caching, gst_reports
+from .buyers import link_unlinked
+from .importer import amount_in_words
+from .models import Invoice, InvoiceItem, InvoiceSequence
+from .numbering import financial_year, format_number
+from .rollups import rebuild_daily_summaries
+
+DEFAULT_SERIES = 'SEED'
+DEFAULT_BATCH_SIZE = 10_000
+HOME_STATE = '33'
+
+# (state code, weight); the seller's own state gets most buyers
+STATES = (
+    ('33', 60), ('32', 6), ('29', 6), ('27', 5), ('36', 4), ('37', 3), ('24', 3), ('07', 3),
+    ('09', 2), ('19', 2), ('08', 2), ('06', 1), ('23', 1), ('21', 1), ('03', 1),
+)
+
+# (HSN, GST %, base rate in paise, descriptions); earlier entries are used far more
+HSN_CATALOGUE = (
+    ('5208', 5, 9500, ('COTTON SAREE', 'COTTON DHOTI', 'COTTON FABRIC')),
+    ('5407', 5, 12000, ('POLYESTER SAREE', 'SYNTHETIC FABRIC')),
+    ('5007', 5, 185000, ('SILK SAREE', 'SILK FABRIC')),
+    ('6302', 5, 25000, ('BED SHEET', 'PILLOW COVER', 'BATH TOWEL')),
+    ('5209', 5, 11000, ('COTTON TWILL', 'DENIM FABRIC')),
+    ('6205', 5, 45000, ('MENS SHIRT',)),
+    ('6206', 5, 52000, ('WOMENS TOP', 'KURTI')),
+    ('5513', 5, 8000, ('POLY COTTON FABRIC',)),
+    ('6304', 12, 60000, ('CURTAIN', 'CUSHION COVER')),
+    ('5801', 12, 30000, ('VELVET FABRIC',)),
+    ('6103', 12, 95000, ('MENS SUIT',)),
+    ('6104', 12, 88000, ('WOMENS SUIT',)),
+    ('5607', 12, 4000, ('NYLON ROPE',)),
+    ('3923', 18, 1500, ('PACKING COVER',)),
+    ('4819', 18, 2500, ('CARTON BOX',)),
+)
+HSN_WEIGHTS = tuple(itertools.accumulate(1 / rank ** 1.2 for rank in range(1, len(HSN_CATALOGUE) + 1)))
+
+# Lines per invoice: mostly one page (ITEMS_PER_PAGE is 8), with a long tail
+ITEM_COUNTS = tuple(range(1, 31))
+ITEM_COUNT_WEIGHTS = tuple(itertools.accumulate(
+    30 if n == 1 else 25 if n == 2 else 15 if n <= 4 else 8 if n <= 8 else 0.5 for n in ITEM_COUNTS
+))
+
+NAME_PARTS = ('SRI', 'LAKSHMI', 'MURUGAN', 'GANESH', 'KAVERI', 'ANNAI', 'SELVAM', 'RAJA', 'VEL', 'SARAVANA',
+              'BALAJI', 'AMMAN', 'KRISHNA', 'SHREE', 'MAHA', 'JAYA', 'VIJAY', 'SAKTHI', 'ARUN', 'DEVI')
+NAME_SUFFIXES = ('TEXTILES', 'TEX', 'FABRICS', 'GARMENTS', 'SILKS', 'TRADERS', 'HANDLOOMS', 'EXPORTS')
+TOWNS = ('SALEM', 'ERODE', 'TIRUPUR', 'COIMBATORE', 'MADURAI', 'KARUR', 'CHENNAI', 'BENGALURU', 'KOCHI',
+         'HYDERABAD', 'MUMBAI', 'SURAT', 'DELHI', 'KOLKATA', 'JAIPUR')
+PAYMENT_MODES = ('CREDIT', 'CASH', 'UPI', 'BANK TRANSFER')
+TRANSPORTS = (('KPN PARCEL SERVICE', 'SALEM'), ('ARC LOGISTICS', 'ERODE'), ('VRL LOGISTICS', 'COIMBATORE'))
+
+GSTIN_CHARS = '0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ'
+SELLER_FIELDS = ('seller_name', 'seller_address', 'seller_gstin', 'seller_state', 'seller_state_code')
+INVOICE_FIELDS = (
+    'id', 'invoice_number', 'invoice_date', 'buyer_name', 'buyer_address', 'buyer_gstin', 'place_of_supply',
+    'payment_mode', 'transport_name', 'transport_address', 'total_bundles', 'subtotal', 'cgst_total',
+    'sgst_total', 'igst_total', 'round_off', 'grand_total', 'total_in_words', 'created_on', 'updated_on',
+    'created_by',
+) + SELLER_FIELDS
+ITEM_FIELDS = ('invoice', 'description', 'hsn_code', 'quantity', 'rate', 'gst_rate')
+
+
+def gstin_check_digit(first14):
+    total = 0
+    for i, char in enumerate(first14):
+        product = GSTIN_CHARS.index(char) * (2 if i % 2 else 1)
+        total += product // 36 + product % 36
+    return GSTIN_CHARS[(36 - total % 36) % 36]
+
+
+def make_buyers(rng, count):
+    """[(name, address, gstin, state code)] - names are unique."""
+    buyers, seen = [], set()
+    state_codes = [code for code, _ in STATES]
+    state_weights = list(itertools.accumulate(weight for _, weight in STATES))
+    while len(buyers) < count:
+        name = f"{rng.choice(NAME_PARTS)} {rng.choice(NAME_PARTS)} {rng.choice(NAME_SUFFIXES)}"
+        if name in seen:
+            name = f"{name} {len(buyers)}"
+        seen.add(name)
+        state = rng.choices(state_codes, cum_weights=state_weights)[0]
+        pan = ''.join(rng.choice('ABCDEFGHIJKLMNOPQRSTUVWXYZ') for _ in range(5))
+        pan += f"{rng.randrange(10000):04d}{rng.choice('ABCDEFGHIJKLMNOPQRSTUVWXYZ')}"
+        first14 = f"{state}{pan}{rng.choice('123456789')}Z"
+        address = f"{rng.randrange(1, 400)}, {rng.choice(('MAIN ROAD', 'BAZAAR STREET', 'MILL ROAD'))}, {rng.choice(TOWNS)}"
+        buyers.append((name, address, first14 + gstin_check_digit(first14), state))
+    return buyers
+
+
+def _money(paise):
+    sign = '-' if paise < 0 else ''
+    paise = abs(paise)
+    return f"{sign}{paise // 100}.{paise % 100:02d}"
+
+
+@lru_cache(maxsize=None)
+def _words(rupees):
+    return amount_in_words(rupees)
+
+
+class Generator:
+    """Yields invoice rows and their item rows, in date order, from one random stream."""
+
+    def __init__(self, seed, count, first_day, last_day, buyers=None):
+        self.rng = random.Random(seed)
+        self.count = count
+        self.first_day = first_day
+        self.span = (last_day - first_day).days + 1
+        self.buyers = make_buyers(self.rng, buyers or max(50, count // 200))
+        self.buyer_weights = tuple(itertools.accumulate(1 / rank for rank in range(1, len(self.buyers) + 1)))
+
+    def line(self):
+        rng = self.rng
+        hsn, gst_rate, base_rate, descriptions = rng.choices(HSN_CATALOGUE, cum_weights=HSN_WEIGHTS)[0]
+        rate = base_rate * rng.randrange(80, 121) // 100
+        quantity = rng.choice((1, 2, 5, 10, 10, 20, 25, 50, 100)) if base_rate < 50000 else rng.randrange(1, 11)
+        return rng.choice(descriptions), hsn, quantity, rate, gst_rate
+
+    def invoices(self):
+        """Yield an Invoice field dict (without id and number) and its item lines for each invoice."""
+        rng = self.rng
+        for n in range(self.count):
+            invoice_date = self.first_day + timedelta(days=n * self.span // self.count)
+            name, address, gstin, state = rng.choices(self.buyers, cum_weights=self.buyer_weights)[0]
+            lines = [self.line() for _ in range(rng.choices(ITEM_COUNTS, cum_weights=ITEM_COUNT_WEIGHTS)[0])]
+
+            subtotal = sum(quantity * rate for _, _, quantity, rate, _ in lines)
+            tax_x100 = sum(quantity * rate * gst_rate for _, _, quantity, rate, gst_rate in lines)
+            if state == HOME_STATE:
+                cgst = sgst = (tax_x100 + 100) // 200
+                igst = 0
+            else:
+                cgst = sgst = 0
+                igst = (tax_x100 + 50) // 100
+            raw_total = subtotal + cgst + sgst + igst
+            grand_rupees = (raw_total + 50) // 100
+
+            transport_name, transport_address = rng.choice(TRANSPORTS) if rng.random() < 0.6 else (None, None)
+            created_on = datetime.combine(invoice_date, time(9)) + timedelta(seconds=rng.randrange(9 * 3600))
+            yield {
+                'invoice_date': invoice_date,
+                'buyer_name': name, 'buyer_address': address, 'buyer_gstin': gstin, 'place_of_supply': state,
+                'payment_mode': rng.choice(PAYMENT_MODES),
+                'transport_name': transport_name, 'transport_address': transport_address,
+                'total_bundles': len(lines) // 3 + 1,
+                'subtotal': _money(subtotal), 'cgst_total': _money(cgst), 'sgst_total': _money(sgst),
+                'igst_total': _money(igst), 'round_off': _money(grand_rupees * 100 - raw_total),
+                'grand_total': f"{grand_rupees}.00", 'total_in_words': _words(grand_rupees),
+                'created_on': timezone.make_aware(created_on) if settings.USE_TZ else created_on,
+            }, lines
+
+
+# ------------------------- Writing -------------------------
+
+def _columns(model, fields):
+    return [model._meta.get_field(f).column for f in fields]
+
+
+def _copy(model, fields, rows):
+    """COPY rows (tuples in ``fields`` order) into the model's table."""
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(rows)
+    buffer.seek(0)
+    sql = f"COPY {model._meta.db_table} ({', '.join(_columns(model, fields))}) FROM STDIN WITH (FORMAT csv)"
+    with connection.cursor() as cursor:
+        raw = cursor.cursor
+        if hasattr(raw, 'copy_expert'):   # psycopg2
+            raw.copy_expert(sql, buffer)
+        else:                              # psycopg 3
+            with raw.copy(sql) as copy:
+                copy.write(buffer.getvalue())
+
+
+def _insert_many(model, fields, rows):
+    """Plain multi-row INSERT for databases without COPY."""
+    adapt = {
+        i: getattr(connection.ops, f"adapt_{model._meta.get_field(f).get_internal_type().lower()}_value")
+        for i, f in enumerate(fields)
+        if model._meta.get_field(f).get_internal_type() in ('DateField', 'DateTimeField')
+    }
+    if adapt:
+        rows = [tuple(adapt[i](v) if i in adapt else v for i, v in enumerate(row)) for row in rows]
+    columns = ', '.join(connection.ops.quote_name(c) for c in _columns(model, fields))
+    sql = (
+        f"INSERT INTO {connection.ops.quote_name(model._meta.db_table)} ({columns}) "
+        f"VALUES ({', '.join(['%s'] * len(fields))})"
+    )
+    with connection.cursor() as cursor:
+        cursor.executemany(sql, rows)
+
+
+def _reserve_ids(model, count):
+    """First of ``count`` consecutive primary keys no other insert will be given."""
+    table = model._meta.db_table
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute("SELECT nextval(pg_get_serial_sequence(%s, 'id'))", [table])
+            first = cursor.fetchone()[0]
+            cursor.execute("SELECT setval(pg_get_serial_sequence(%s, 'id'), %s)", [table, first + count - 1])
+            return first
+        cursor.execute(f"SELECT COALESCE(MAX(id), 0) FROM {table}")
+        return cursor.fetchone()[0] + 1
+
+
+def seed_invoices(count, seed=0, first_day=None, last_day=None, years=3, buyers=None, series=DEFAULT_SERIES,
+                  user=None, batch_size=DEFAULT_BATCH_SIZE, progress=None):
+    """
+    Insert ``count`` invoices dated evenly from ``first_day`` (default: the
+    start of the financial year ``years - 1`` before ``last_day``) to
+    ``last_day`` (default: today). ``progress`` is called with the invoices
+    and items written so far after each batch. Returns the number of items.
+    """
+    last_day = last_day or timezone.localdate()
+    first_day = first_day or date(financial_year(last_day) - (years - 1), 4, 1)
+    if count <= 0:
+        return 0
+
+    generator = Generator(seed, count, first_day, last_day, buyers=buyers)
+    write = _copy if connection.vendor == 'postgresql' else _insert_many
+    fixed = {
+        **{f: getattr(Invoice(), f) for f in SELLER_FIELDS},
+        'updated_on': timezone.now(),
+        'created_by': user.pk if user else None,
+    }
+    numbers = dict(InvoiceSequence.objects.filter(series=series).values_list('financial_year', 'last_number'))
+    months = set()
+    written = items_written = 0
+
+    stream = generator.invoices()
+    while written < count:
+        batch = list(itertools.islice(stream, batch_size))
+        invoice_id = _reserve_ids(Invoice, len(batch))
+        item_id = _reserve_ids(InvoiceItem, sum(len(lines) for _, lines in batch))
+
+        invoice_rows, item_rows = [], []
+        for values, lines in batch:
+            fy = financial_year(values['invoice_date'])
+            numbers[fy] = numbers.get(fy, 0) + 1
+            months.add(values['invoice_date'].replace(day=1))
+            values = {**values, **fixed, 'id': invoice_id, 'invoice_number': format_number(series, fy, numbers[fy])}
+            invoice_rows.append(tuple(values[f] for f in INVOICE_FIELDS))
+            for description, hsn, quantity, rate, gst_rate in lines:
+                item_rows.append((item_id, invoice_id, description, hsn, f"{quantity}.00", _money(rate), f"{gst_rate}.00"))
+                item_id += 1
+            invoice_id += 1
+
+        with transaction.atomic():
+            write(Invoice, INVOICE_FIELDS, invoice_rows)
+            write(InvoiceItem, ('id',) + ITEM_FIELDS, item_rows)
+        written += len(batch)
+        items_written += len(item_rows)
+        if progress:
+            progress(written, items_written)
+
+    with transaction.atomic():
+        for fy, last_number in numbers.items():
+            InvoiceSequence.objects.update_or_create(
+                series=series, financial_year=fy, defaults={'last_number': last_number},
+            )
+    link_unlinked()
+    rebuild_daily_summaries()
+    gst_reports.invalidate(*months)
+    caching.bump()
+    return items_written
@@ -1,3 +1,1691 @@
-from django.test import TestCase
+import csv
+import importlib.util
+import io
+import json
+import os
+import tempfile
+import threading
+import time
+import zipfile
+from datetime import date, timedelta
+from decimal import ROUND_HALF_UP, Decimal
+from io import BytesIO
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from asgiref.sync import async_to_sync, sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, connection, connections, transaction
+from django.db.backends.sqlite3.base import DatabaseWrapper as SQLiteDatabaseWrapper
+from django.db.models import F, Max, Min, Sum
+from django.test import Client, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils.timezone import now
+from pypdf import PdfReader
+from pypdf.generic import ContentStream
+from reportlab.pdfbase.pdfmetrics import stringWidth
+from rest_framework.authtoken.models import Token
+
+from . import (
+    autocomplete, benchmarks, buyers, caching, closing, data_export, db_routers, export_jobs, gst_reports, importer,
+    numbering, partitioning, pdf_archive, pdf_cache, pdf_canvas, pdf_jobs, seeding, views,
+)
+from .db_routers import REPLICA_DB_ALIAS, ReplicaRouter, replica_reads
+from .models import (
+    Buyer, ClosedFinancialYear, DailyBuyerRevenue, DailyInvoiceSummary, DailyItemRevenue, GstrClosedMonth,
+    GstrHsnSummary, Invoice, InvoiceItem, InvoiceSequence, PdfExportJob, PdfRenderJob, User,
+)
+from .rollups import rebuild_daily_summaries
+from .views import generate_invoice_pdf, generate_invoice_pdf_platypus
+
+
+def plan_nodes(plan):
+    yield plan
+    for child in plan.get('Plans', []):
+        yield from plan_nodes(child)
+
+
+def _matrix_multiply(a, b):
+    return [
+        a[0] * b[0] + a[1] * b[2], a[0] * b[1] + a[1] * b[3],
+        a[2] * b[0] + a[3] * b[2], a[2] * b[1] + a[3] * b[3],
+        a[4] * b[0] + a[5] * b[2] + b[4], a[4] * b[1] + a[5] * b[3] + b[5],
+    ]
+
+
+def _transform(m, x, y):
+    return round(x * m[0] + y * m[2] + m[4], 2), round(y * m[3] + x * m[1] + m[5], 2)
+
+
+def pdf_display_list(pdf_bytes):
+    """
+    What each page of a ReportLab PDF paints, independent of how the content
+    stream draws it: every word at its position in its font and size, and the
+    stroked lines merged into maximal horizontal and vertical segments.
+    """
+    pages = []
+    for page in PdfReader(BytesIO(pdf_bytes)).pages:
+        fonts = {}
+        for name, ref in page['/Resources'].get('/Font', {}).items():
+            font = ref.get_object()
+            widths = font.get('/Widths')
+            fonts[name] = (
+                str(font['/BaseFont']).lstrip('/').split('+')[-1],
+                None if widths is None else (int(font['/FirstChar']), [float(w) for w in widths]),
+            )
+
+        def width(font, data, size):
+            base, widths = fonts[font]
+            if widths is None:
+                return stringWidth(data.decode('latin-1'), base, size)
+            return sum(widths[1][b - widths[0]] for b in data) * size / 1000
+
+        ctm, stroke, font, size, leading = [1, 0, 0, 1, 0, 0], (1.0, 0, 0), None, 0, 0
+        stack, path, words, segments = [], [], [], []
+        tm = lm = [1, 0, 0, 1, 0, 0]
+        for operands, op in ContentStream(page.get_contents(), page.pdf).operations:
+            op = op.decode()
+            if op == 'q':
+                stack.append((ctm, stroke, font, size, leading))
+            elif op == 'Q':
+                ctm, stroke, font, size, leading = stack.pop()
+            elif op == 'cm':
+                ctm = _matrix_multiply([float(v) for v in operands], ctm)
+            elif op in ('w', 'J', 'j'):
+                index = ('w', 'J', 'j').index(op)
+                stroke = stroke[:index] + (float(operands[0]),) + stroke[index + 1:]
+            elif op == 'm':
+                path.append([_transform(ctm, *map(float, operands))])
+            elif op == 'l':
+                path[-1].append(_transform(ctm, *map(float, operands)))
+            elif op == 're':
+                x, y, w, h = map(float, operands)
+                path.append([_transform(ctm, *p) for p in ((x, y), (x + w, y), (x + w, y + h), (x, y + h), (x, y))])
+            elif op in ('S', 's', 'B', 'b', 'n', 'f', 'F', 'f*'):
+                if op in ('S', 's', 'B', 'b'):
+                    segments += [(stroke, a, b) for subpath in path for a, b in zip(subpath, subpath[1:])]
+                path = []
+            elif op == 'BT':
+                tm = lm = [1, 0, 0, 1, 0, 0]
+            elif op == 'Tf':
+                font, size = operands[0], float(operands[1])
+            elif op == 'TL':
+                leading = float(operands[0])
+            elif op == 'Td':
+                tm = lm = _matrix_multiply([1, 0, 0, 1, float(operands[0]), float(operands[1])], lm)
+            elif op == 'Tm':
+                tm = lm = [float(v) for v in operands]
+            elif op == 'T*':
+                tm = lm = _matrix_multiply([1, 0, 0, 1, 0, -leading], lm)
+            elif op == 'Tj':
+                data, offset = bytes(operands[0].original_bytes), 0
+                for word in data.split(b' '):
+                    if word:
+                        words.append((*_transform(_matrix_multiply(tm, ctm), offset, 0), fonts[font][0], size, word))
+                    offset += width(font, word + b' ', size)
+                tm = _matrix_multiply([1, 0, 0, 1, width(font, data, size), 0], tm)
+            elif op not in ('ET', 'rg', 'RG', 'g', 'G'):
+                raise AssertionError(f"pdf_display_list does not handle {op!r}")
+
+        spans = {}
+        for stroke, (x1, y1), (x2, y2) in segments:
+            key = ('-', stroke, y1) if y1 == y2 else ('|', stroke, x1) if x1 == x2 else ('/', stroke, x1, y1, x2, y2)
+            spans.setdefault(key, []).append(sorted((x1, x2) if y1 == y2 else (y1, y2)))
+        lines = []
+        for key, ranges in sorted(spans.items()):
+            ranges.sort()
+            merged = [list(ranges[0])]
+            for start, end in ranges[1:]:
+                if start <= merged[-1][1] + 0.01:
+                    merged[-1][1] = max(merged[-1][1], end)
+                else:
+                    merged.append([start, end])
+            lines += [(*key, start, end) for start, end in merged]
+        pages.append({'words': sorted(words), 'lines': lines})
+    return pages
+
+
+@skipUnless(connection.vendor == 'postgresql', "Query plans are checked against Postgres")
+class HotQueryPlanTests(TestCase):
+    """
+    EXPLAIN the dashboard and invoice list queries and fail if any of them
+    falls back to a sequential scan. Sequential scans are disabled for the
+    test, so the planner only picks one when no index can serve the query.
+    A full scan of another index (the primary key, say) also avoids a
+    sequential scan, so filters are checked for the index meant to serve them.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        start = date(2024, 4, 1)
+        invoices = Invoice.objects.bulk_create([
+            Invoice(
+                invoice_number=f"INV/TEST-{n:05d}",
+                invoice_date=start + timedelta(days=n % 730),
+                buyer_name=f"BUYER {n % 150}",
+                buyer_gstin=f"33ABCDE{n % 150:04d}F1Z5",
+                place_of_supply='33',
+                subtotal=Decimal('1000.00'),
+                cgst_total=Decimal('25.00'),
+                sgst_total=Decimal('25.00'),
+                grand_total=Decimal('1050.00'),
+                total_in_words='One Thousand Fifty Only',
+            )
+            for n in range(3000)
+        ])
+        InvoiceItem.objects.bulk_create([
+            InvoiceItem(
+                invoice=invoice, description=f"FABRIC {(invoice.pk + line) % 40}", hsn_code=f"52{line:02d}",
+                quantity=Decimal('10'), rate=Decimal('50.00'), gst_rate=Decimal('5.00'),
+            )
+            for invoice in invoices for line in range(2)
+        ])
+        buyers.link_unlinked()
+        rebuild_daily_summaries()
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE")
+
+    def setUp(self):
+        with connection.cursor() as cursor:
+            cursor.execute("SET LOCAL enable_seqscan = off")
+
+    def assertNoSeqScan(self, queryset):
+        plan = json.loads(queryset.explain(format='json'))[0]['Plan']
+        seq_scans = [n['Relation Name'] for n in plan_nodes(plan) if n['Node Type'] == 'Seq Scan']
+        self.assertEqual(seq_scans, [], f"Sequential scan in plan:\n{json.dumps(plan, indent=2)}")
+
+    def assertUsesIndex(self, queryset, index_name):
+        plan = json.loads(queryset.explain(format='json'))[0]['Plan']
+        indexes = [n['Index Name'] for n in plan_nodes(plan) if 'Index Name' in n]
+        self.assertIn(index_name, indexes, f"{index_name} not in plan:\n{json.dumps(plan, indent=2)}")
+
+    fy_start, fy_end = date(2025, 4, 1), date(2026, 3, 31)
+
+    def test_invoice_list_date_range(self):
+        invoices = Invoice.objects.in_date_range('2025-04-01', '2025-06-30')
+        fields = ('id', 'invoice_number', 'buyer_name', 'invoice_date', 'grand_total')
+        # Unordered: with order_by('-id') a backward primary key scan would pass too
+        self.assertUsesIndex(invoices.values(*fields), 'invoice_date_covering_idx')
+        self.assertUsesIndex(
+            invoices.order_by('-invoice_date', '-id').values(*fields)[:101], 'invoice_date_covering_idx',
+        )
+
+    def test_invoice_list_search(self):
+        self.assertUsesIndex(Invoice.objects.search(buyer='YER 1'), 'invoice_buyer_name_trgm')
+        self.assertUsesIndex(Invoice.objects.search(number='INV/TEST-001'), 'invoice_number_prefix')
+        self.assertUsesIndex(Invoice.objects.search(gstin='33ABCDE00'), 'invoice_gstin_prefix')
+
+    def test_recent_invoices(self):
+        self.assertNoSeqScan(Invoice.objects.order_by('-created_on')[:5])
+
+    def test_dashboard_daily_rows(self):
+        self.assertNoSeqScan(
+            DailyInvoiceSummary.objects.filter(date__gte=self.fy_start).values('date', 'invoice_count', 'grand_total')
+        )
+
+    def test_dashboard_top_clients(self):
+        self.assertNoSeqScan(
+            DailyBuyerRevenue.objects.filter(date__range=[self.fy_start, self.fy_end])
+            .values('buyer_name').annotate(total_revenue=Sum('revenue')).order_by('-total_revenue')[:5]
+        )
+
+    def test_dashboard_new_clients(self):
+        self.assertNoSeqScan(Buyer.objects.filter(first_invoice_date__gte=date(2025, 9, 1)))
+
+    def test_invoices_of_one_buyer(self):
+        buyer = Buyer.objects.order_by('id').first()
+        self.assertNoSeqScan(Invoice.objects.filter(buyer=buyer).order_by('invoice_date')[:1])
+
+    def test_dashboard_top_items(self):
+        self.assertNoSeqScan(
+            DailyItemRevenue.objects.filter(date__range=[self.fy_start, self.fy_end])
+            .values('description').annotate(total_revenue=Sum('revenue')).order_by('-total_revenue')[:5]
+        )
+
+    def test_items_of_one_invoice(self):
+        invoice_id = Invoice.objects.order_by('id').values_list('id', flat=True)[1500]
+        self.assertNoSeqScan(
+            InvoiceItem.objects.filter(invoice_id=invoice_id).values('description').annotate(revenue=Sum('rate'))
+        )
+
+
+def invoice_payload(number, items):
+    """The JSON the invoice form posts."""
+    return {
+        'invoice_number': number, 'invoice_date': '15-06-2025',
+        'seller_name': 'KAVIN TEX', 'seller_address': 'Tharamangalam', 'seller_gstin': '33BUUPR3263F2Z9',
+        'seller_state': 'Tamil Nadu', 'seller_state_code': '33',
+        'buyer_name': 'acme', 'buyer_gstin': '33ABCDE1234F1Z5', 'place_of_supply': '33',
+        'subtotal': '100.00', 'cgst_total': '2.50', 'sgst_total': '2.50', 'igst_total': '0.00',
+        'grand_total': '105.00', 'total_in_words': 'One Hundred Five Rupees Only',
+        'items': items,
+    }
+
+
+def invoice_items(count, offset=0):
+    return [
+        {'description': f"ITEM {(offset + n) % 10}", 'hsn_code': '5208', 'quantity': '2', 'rate': '50', 'gst_rate': '5'}
+        for n in range(count)
+    ]
+
+
+class InvoiceWriteQueryCountTests(TestCase):
+    """
+    Saving an invoice costs the same number of queries however many items it
+    has. The only allowed growth is the database splitting a bulk statement to
+    stay under its bind-parameter limit (SQLite; never on Postgres).
+    """
+
+    sizes = (1, 50, 500)
+    item_fields = ('description', 'hsn_code', 'quantity', 'rate', 'gst_rate')
+
+    def setUp(self):
+        self.client.force_login(User.objects.create_user(username='writer', password='x'))
+        # Start the year's number sequence up front; the very first allocation costs an extra insert
+        InvoiceSequence.objects.create(series=settings.INVOICE_NUMBER_SERIES, financial_year=2025)
+
+    def extra_batches(self, count, fields):
+        """Statements beyond the first that the backend needs for a bulk write of ``count`` rows."""
+        if not count:
+            return 0
+        batch_size = connection.ops.bulk_batch_size(list(fields), [None] * count)
+        return -(-count // batch_size) - 1
+
+    def post(self, url, payload):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(url, payload, content_type='application/json')
+        self.assertIn(response.status_code, (200, 201), response.content)
+        return response.json()['invoice_id'], len(queries)
+
+    def test_create(self):
+        counts = {}
+        for size in self.sizes:
+            invoice_id, count = self.post('/invoice/', invoice_payload(f"INV/Q-{size}", invoice_items(size)))
+            counts[size] = count - self.extra_batches(size, ('invoice',) + self.item_fields)
+            self.assertEqual(InvoiceItem.objects.filter(invoice_id=invoice_id).count(), size)
+        self.assertEqual(len(set(counts.values())), 1, counts)
+
+    def test_edit(self):
+        counts = {}
+        for size in self.sizes:
+            # One more item than size, so every edit drops, changes and adds items
+            invoice_id, _ = self.post('/invoice/', invoice_payload(f"INV/E-{size}", invoice_items(size + 1)))
+            saved = list(
+                InvoiceItem.objects.filter(invoice_id=invoice_id).order_by('id').values('id', *self.item_fields)
+            )
+            kept = saved[:-(-size // 2)]
+            for item in kept:
+                item['quantity'] = '3'
+            added = invoice_items(size + 1 - len(kept), offset=size + 1)
+            _, count = self.post(f"/invoice/{invoice_id}/edit/", invoice_payload(f"INV/E-{size}", kept + added))
+            counts[size] = (
+                count
+                - self.extra_batches(len(kept), ('pk', 'pk') + self.item_fields)
+                - self.extra_batches(len(added), ('invoice',) + self.item_fields)
+            )
+
+            after = InvoiceItem.objects.filter(invoice_id=invoice_id)
+            self.assertEqual(after.count(), size + 1)
+            self.assertEqual(after.filter(quantity=3).count(), len(kept))
+            self.assertFalse(after.filter(id__in=[i['id'] for i in saved[len(kept):]]).exists())
+        self.assertEqual(len(set(counts.values())), 1, counts)
+
+
+class InvoiceListApiTests(TestCase):
+    """The invoice list API's keyset pages, filters and sorts."""
+
+    @classmethod
+    def setUpTestData(cls):
+        # Few distinct dates and totals, so every sort other than id has ties
+        Invoice.objects.bulk_create([
+            Invoice(
+                invoice_number=f"INV/L-{n:03d}", invoice_date=date(2025, 6, 1) + timedelta(days=n % 4),
+                buyer_name=f"BUYER {n % 5}", buyer_gstin=f"3{n % 2}ABCDE1234F1Z5", place_of_supply='33',
+                subtotal=100 * (n % 3), grand_total=100 * (n % 3), total_in_words='Hundreds',
+            )
+            for n in range(30)
+        ])
+        InvoiceItem.objects.bulk_create([
+            InvoiceItem(
+                invoice=invoice, quantity=1, rate=100, gst_rate=5,
+                **({'description': 'COTTON SAREE', 'hsn_code': '5208'} if n % 6 == 0 else
+                   {'description': 'SILK', 'hsn_code': '5007'}),
+            )
+            for n, invoice in enumerate(Invoice.objects.order_by('invoice_number'))
+        ])
+
+    def setUp(self):
+        self.client.force_login(User.objects.create_user(username='clerk', password='x'))
+
+    def page_through(self, page_size=4, **params):
+        """Every id the list returns, following next_cursor; fails on an empty or repeated page."""
+        ids, cursor = [], None
+        while True:
+            response = self.client.get(
+                '/core/invoices/', {**params, 'page_size': page_size, **({'cursor': cursor} if cursor else {})},
+            )
+            self.assertEqual(response.status_code, 200, response.content)
+            body = response.json()
+            self.assertTrue(body['invoices'])
+            ids += [row['id'] for row in body['invoices']]
+            cursor = body['next_cursor']
+            if cursor is None:
+                return ids
+
+    def expected(self, sort_field, descending, **filters):
+        rows = Invoice.objects.search(**filters).values('id', sort_field)
+        return [r['id'] for r in sorted(rows, key=lambda r: (r[sort_field], r['id']), reverse=descending)]
+
+    def test_pages_return_every_row_once(self):
+        self.assertEqual(self.page_through(), self.expected('id', True))
+        # A page size the row count divides evenly, so the last page is full
+        self.assertEqual(self.page_through(page_size=5), self.expected('id', True))
+
+    def test_pages_split_ties_by_id(self):
+        for sort in ('invoice_date', '-invoice_date', 'grand_total', '-grand_total'):
+            with self.subTest(sort=sort):
+                ids = self.page_through(sort=sort)
+                self.assertEqual(ids, self.expected(sort.lstrip('-'), sort.startswith('-')))
+                self.assertEqual(len(set(ids)), 30)
+
+    def test_search(self):
+        def numbers(**filters):
+            return sorted(int(n[-3:]) for n in Invoice.objects.search(**filters).values_list('invoice_number', flat=True))
+
+        self.assertEqual(numbers(buyer='yer 1'), [1, 6, 11, 16, 21, 26])
+        self.assertEqual(len(numbers(gstin='31')), 15)
+        self.assertEqual(numbers(gstin='ABCDE'), [])   # a prefix match only
+        self.assertEqual(numbers(number='inv/l-00'), list(range(10)))
+        self.assertEqual(numbers(item='cotton'), [0, 6, 12, 18, 24])
+        self.assertEqual(numbers(item='520'), [0, 6, 12, 18, 24])   # HSN prefix
+        self.assertEqual(numbers(item='208'), [])
+        self.assertEqual(numbers(min_amount=Decimal(100), max_amount=Decimal(100)), list(range(1, 30, 3)))
+        self.assertEqual(numbers(buyer='BUYER 0', item='cotton', min_amount=Decimal(0)), [0])
+
+    def test_sort_and_filters_from_the_query_string(self):
+        response = self.client.get('/core/invoices/', {'sort': 'buyer_name', 'buyer': 'BUYER 3', 'page_size': 100})
+        rows = response.json()['invoices']
+        self.assertEqual([r['id'] for r in rows], self.expected('buyer_name', False, buyer='BUYER 3'))
+
+        bad = [{'sort': 'buyer_gstin'}, {'sort': '--id'}, {'min_amount': 'lots'}, {'page_size': 0}]
+        bad += [{'min_amount': v} for v in ('NaN', 'sNaN', 'Infinity')] + [{'max_amount': '-Infinity'}]
+        for params in bad:
+            with self.subTest(params=params):
+                self.assertEqual(self.client.get('/core/invoices/', params).status_code, 400)
+
+    def test_pages_of_a_filtered_list_in_another_sort(self):
+        filters = {'gstin': '30', 'min_amount': '100'}
+        ids = self.page_through(page_size=3, sort='-grand_total', **filters)
+        self.assertEqual(ids, self.expected('grand_total', True, gstin='30', min_amount=Decimal(100)))
+        self.assertEqual(len(ids), 10)
+
+    def test_malformed_cursor_is_rejected(self):
+        for cursor in ('not base64!', 'W10=', 'WyJ4IiwgMV0='):   # garbage, [], ["x", 1]
+            with self.subTest(cursor=cursor):
+                response = self.client.get('/core/invoices/', {'sort': 'invoice_date', 'cursor': cursor})
+                self.assertEqual(response.status_code, 400)
+
+
+class DailyRollupTests(TestCase):
+    """The rollups kept up to date on every write match a rebuild from the invoices."""
+
+    def setUp(self):
+        self.client.force_login(User.objects.create_user(username='clerk', password='x'))
+
+    def post(self, url, payload=None):
+        return self.client.post(url, payload or {}, content_type='application/json')
+
+    def rollups(self):
+        return (
+            sorted(DailyInvoiceSummary.objects.values_list(
+                'date', 'invoice_count', 'subtotal', 'cgst_total', 'sgst_total', 'igst_total', 'grand_total',
+            )),
+            sorted(DailyBuyerRevenue.objects.values_list('date', 'buyer_name', 'invoice_count', 'revenue')),
+            sorted(DailyItemRevenue.objects.values_list('date', 'description', 'line_count', 'revenue')),
+        )
+
+    def assertMatchesRebuild(self):
+        incremental = self.rollups()
+        self.assertTrue(all(incremental))
+        rebuild_daily_summaries()
+        self.assertEqual(incremental, self.rollups())
+
+    def test_create_edit_delete(self):
+        ids = [
+            self.post('/invoice/', invoice_payload(f"INV/R-{n}", invoice_items(n + 1, offset=n))).json()['invoice_id']
+            for n in range(3)
+        ]
+        self.assertMatchesRebuild()
+
+        # Move one invoice to another day and buyer, with different items
+        payload = invoice_payload('INV/R-0', invoice_items(2, offset=5))
+        payload.update(invoice_date='20-06-2025', buyer_name='globex', grand_total='210.00')
+        self.assertEqual(self.post(f"/invoice/{ids[0]}/edit/", payload).status_code, 200)
+        self.assertMatchesRebuild()
+
+        self.assertEqual(self.post(f"/invoice/{ids[1]}/delete/").status_code, 200)
+        self.assertMatchesRebuild()
+
+    def test_repeated_delete_is_not_counted_twice(self):
+        invoice_id = self.post('/invoice/', invoice_payload('INV/R-1', invoice_items(2))).json()['invoice_id']
+        self.post('/invoice/', invoice_payload('INV/R-2', invoice_items(1)))
+        self.assertEqual(self.post(f"/invoice/{invoice_id}/delete/").status_code, 200)
+        before = self.rollups()
+
+        self.assertEqual(self.post(f"/invoice/{invoice_id}/delete/").status_code, 404)
+        self.assertEqual(self.rollups(), before)
+        self.assertMatchesRebuild()
+
+
+class InvoiceImportTests(TestCase):
+
+    def records(self, *numbers, **overrides):
+        return [(line, {**invoice_payload(n, invoice_items(1)), **overrides}) for line, n in enumerate(numbers, 1)]
+
+    def test_bad_rows_are_reported_and_skipped(self):
+        totals_left_blank = {
+            k: v for k, v in invoice_payload('J-8', invoice_items(1)).items()
+            if k not in ('subtotal', 'cgst_total', 'sgst_total', 'igst_total', 'grand_total', 'total_in_words')
+        }
+        lines = [
+            json.dumps(invoice_payload('J-1', invoice_items(1))),
+            '{not json',
+            '',
+            '[]',
+            json.dumps(invoice_payload('', invoice_items(1))),
+            json.dumps({**invoice_payload('J-6', [{**invoice_items(1)[0], 'quantity': 'two'}]), 'invoice_date': '31-02-2025'}),
+            json.dumps(invoice_payload('J-7', [])),
+            json.dumps(totals_left_blank),
+        ]
+        result = importer.import_invoices(importer.read_jsonl(io.StringIO('\n'.join(lines))))
+
+        self.assertEqual(result.created, 2)
+        self.assertEqual([e['line'] for e in result.errors], [2, 4, 5, 6, 7])
+        self.assertEqual(result.errors[3]['errors'], [
+            "invoice_date must be DD-MM-YYYY or YYYY-MM-DD", "item 1: quantity must be a number",
+        ])
+        # Totals left out are worked out from the items, as the invoice form does
+        computed = Invoice.objects.get(invoice_number='J-8')
+        self.assertEqual(
+            (computed.subtotal, computed.cgst_total, computed.sgst_total, computed.grand_total),
+            (Decimal('100.00'), Decimal('2.50'), Decimal('2.50'), Decimal('105.00')),
+        )
+        self.assertEqual(computed.total_in_words, 'One Hundred And Five Rupees Only')
+        self.assertEqual(DailyInvoiceSummary.objects.get(date=date(2025, 6, 15)).invoice_count, 2)
+
+    def test_csv_rows_of_one_invoice_make_one_invoice(self):
+        text = (
+            "invoice_number,invoice_date,buyer_name,place_of_supply,description,hsn_code,quantity,rate,gst_rate\n"
+            "C-1,15-06-2025,acme,33,COTTON,5208,2,50,5\n"
+            "C-1,15-06-2025,acme,33,SILK,5007,1,200,5\n"
+            "C-2,2025-06-16,acme,33,COTTON,5208,x,50,5\n"
+            "C-3,2025-06-16,acme,33,COTTON,5208,1,50,5\n"
+        )
+        result = importer.import_invoices(importer.read_csv(io.StringIO(text)))
+        self.assertEqual(result.created, 2)
+        self.assertEqual([(e['line'], e['invoice_number']) for e in result.errors], [(4, 'C-2')])
+        self.assertEqual(
+            sorted(InvoiceItem.objects.filter(invoice__invoice_number='C-1').values_list('description', flat=True)),
+            ['COTTON', 'SILK'],
+        )
+
+    def test_duplicate_numbers(self):
+        importer.import_invoices(self.records('D-0'))
+        # One invoice per chunk, so the repeat is caught across chunks too
+        result = importer.import_invoices(self.records('D-1', 'D-0', 'D-1', 'D-2'), chunk_size=1)
+        self.assertEqual(result.created, 2)
+        self.assertEqual([(e['line'], e['errors']) for e in result.errors], [
+            (2, ["invoice_number already exists"]),
+            (3, ["invoice_number appears more than once in the file"]),
+        ])
+
+    def test_failed_chunk_rolls_back_on_its_own(self):
+        advance_past = numbering.advance_past
+        calls = []
+
+        def fail_second_chunk(numbers):
+            calls.append(1)
+            if len(calls) == 2:
+                raise IntegrityError('duplicate key value')
+            return advance_past(numbers)
+
+        with mock.patch.object(numbering, 'advance_past', fail_second_chunk):
+            result = importer.import_invoices(self.records('R-1', 'R-2', 'R-3', 'R-4', 'R-5'), chunk_size=2)
+
+        self.assertEqual(result.created, 3)
+        self.assertEqual([e['line'] for e in result.errors], [3, 4])
+        self.assertTrue(result.errors[0]['errors'][0].startswith("chunk rolled back"))
+        self.assertEqual(sorted(Invoice.objects.values_list('invoice_number', flat=True)), ['R-1', 'R-2', 'R-5'])
+        self.assertEqual(InvoiceItem.objects.count(), 3)
+        self.assertEqual(DailyInvoiceSummary.objects.get().invoice_count, 3)
+
+    def test_dry_run_writes_nothing(self):
+        importer.import_invoices(self.records('T-0'))
+        result = importer.import_invoices(self.records('T-1', 'T-0', 'T-2'), dry_run=True)
+        self.assertEqual((result.created, [e['line'] for e in result.errors]), (2, [2]))
+        self.assertEqual(list(Invoice.objects.values_list('invoice_number', flat=True)), ['T-0'])
+        self.assertEqual(DailyInvoiceSummary.objects.get().invoice_count, 1)
+
+
+class InvoiceNumberTests(TestCase):
+    def test_numbers_run_per_financial_year(self):
+        self.assertEqual(numbering.allocate(date(2025, 3, 31), series='INV'), 'INV/2024-25/001')
+        self.assertEqual(numbering.allocate(date(2025, 4, 1), series='INV'), 'INV/2025-26/001')
+        self.assertEqual(numbering.peek(date(2026, 3, 31), series='INV'), 'INV/2025-26/002')
+        self.assertEqual(numbering.allocate(date(2026, 3, 31), series='INV'), 'INV/2025-26/002')
+        self.assertEqual(numbering.allocate(date(2025, 4, 1), series='CR'), 'CR/2025-26/001')
+
+    def test_number_is_returned_on_rollback(self):
+        numbering.allocate(date(2025, 6, 1), series='INV')
+        with self.assertRaises(RuntimeError), transaction.atomic():
+            numbering.allocate(date(2025, 6, 1), series='INV')
+            raise RuntimeError
+        self.assertEqual(numbering.allocate(date(2025, 6, 1), series='INV'), 'INV/2025-26/002')
+
+    def test_imported_numbers_are_not_handed_out_again(self):
+        series = settings.INVOICE_NUMBER_SERIES
+        numbering.allocate(date(2025, 6, 1), series=series)
+        numbers = [
+            numbering.format_number(series, 2025, 7), numbering.format_number(series, 2025, 4),
+            numbering.format_number(series, 2024, 20), 'LEGACY-9',
+        ]
+        records = [(line, invoice_payload(number, invoice_items(1))) for line, number in enumerate(numbers, 1)]
+        self.assertEqual(importer.import_invoices(records).created, 4)
+
+        self.client.force_login(User.objects.create_user(username='clerk', password='x'))
+        response = self.client.post('/invoice/', invoice_payload('', invoice_items(1)), content_type='application/json')
+        self.assertEqual(
+            Invoice.objects.get(pk=response.json()['invoice_id']).invoice_number,
+            numbering.format_number(series, 2025, 8),
+        )
+        self.assertEqual(numbering.peek(date(2025, 3, 1), series=series), numbering.format_number(series, 2024, 21))
+
+    def test_parse_number(self):
+        self.assertEqual(numbering.parse_number('INV/2025-26/042'), ('INV', 2025, 42))
+        self.assertEqual(numbering.parse_number('A/B/1999-00/1000'), ('A/B', 1999, 1000))
+        self.assertIsNone(numbering.parse_number('INV/2025-27/001'))
+        self.assertIsNone(numbering.parse_number('42'))
+
+
+@skipUnless(connection.vendor == 'postgresql', "SQLite serialises writers with a database lock")
+class InvoiceNumberConcurrencyTests(TransactionTestCase):
+    """Many operators saving invoices at once get distinct, gapless numbers and no errors."""
+
+    threads = 16
+    invoices_per_thread = 10
+
+    def test_concurrent_saves(self):
+        user = User.objects.create_user(username='writer', password='x')
+        payload = invoice_payload('', invoice_items(3))
+        statuses, barrier = [], threading.Barrier(self.threads)
+
+        def operator():
+            client = Client()
+            client.force_login(user)
+            barrier.wait()
+            try:
+                for _ in range(self.invoices_per_thread):
+                    response = client.post('/invoice/', payload, content_type='application/json')
+                    statuses.append(response.status_code)
+            finally:
+                connection.close()
+
+        workers = [threading.Thread(target=operator) for _ in range(self.threads)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+
+        total = self.threads * self.invoices_per_thread
+        self.assertEqual(statuses, [201] * total)
+        numbers = sorted(Invoice.objects.values_list('invoice_number', flat=True))
+        self.assertEqual(numbers, [numbering.format_number(settings.INVOICE_NUMBER_SERIES, 2025, n) for n in range(1, total + 1)])
+
+
+class PdfCacheTests(TestCase):
+
+    def setUp(self):
+        cache_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(cache_dir.cleanup)
+        self.enterContext(override_settings(PDF_CACHE_DIR=cache_dir.name, PDF_CACHE_MAX_BYTES=10_000))
+        self.enterContext(mock.patch.object(pdf_cache, '_written_since_evict', 0))
+        self.invoice = Invoice.objects.create(
+            invoice_number='INV/C-1', invoice_date=date(2025, 6, 15), buyer_name='ACME', place_of_supply='33',
+            subtotal=100, grand_total=105, total_in_words='One Hundred Five Only',
+        )
+        self.item = InvoiceItem.objects.create(
+            invoice=self.invoice, description='ITEM', hsn_code='5208', quantity=2, rate=50, gst_rate=5,
+        )
+
+    def test_item_edit_changes_the_key(self):
+        render = mock.Mock(side_effect=[b'first', b'second'])
+        self.assertEqual(pdf_cache.get_or_render(self.invoice, render), b'first')
+        self.assertEqual(pdf_cache.get_or_render(self.invoice, render), b'first')
+
+        # Saving an item alone leaves the invoice's updated_on as it was
+        InvoiceItem.objects.filter(pk=self.item.pk).update(quantity=3)
+        self.assertEqual(pdf_cache.get_or_render(self.invoice, render), b'second')
+        self.assertEqual(render.call_count, 2)
+
+    def test_invalidate_removes_every_render_of_the_invoice(self):
+        pdf_cache.put(self.invoice.pk, 'old', b'old')
+        pdf_cache.put(self.invoice.pk, 'new', b'new')
+        pdf_cache.put(self.invoice.pk + 256, 'other', b'other')   # same shard directory
+        pdf_cache.invalidate(self.invoice.pk)
+        self.assertIsNone(pdf_cache.get(self.invoice.pk, 'old'))
+        self.assertIsNone(pdf_cache.get(self.invoice.pk, 'new'))
+        self.assertEqual(pdf_cache.get(self.invoice.pk + 256, 'other'), b'other')
+
+    def test_eviction_drops_the_least_recently_used(self):
+        for invoice_id in (1, 2, 3):
+            pdf_cache.put(invoice_id, 'k', b'x' * 3000)
+            os.utime(pdf_cache._path(invoice_id, 'k'), (invoice_id * 100, invoice_id * 100))
+        pdf_cache.get(1, 'k')   # a hit makes 1 the most recently used
+
+        pdf_cache.put(4, 'k', b'x' * 3000)
+        self.assertEqual([pdf_cache.get(i, 'k') is not None for i in (1, 2, 3, 4)], [True, False, True, True])
+
+    def test_directory_is_only_swept_once_enough_was_written(self):
+        # A sweep is due after 5% of the 10,000-byte cap
+        with mock.patch.object(pdf_cache, 'evict') as evict:
+            for invoice_id in range(4):
+                pdf_cache.put(invoice_id, 'k', b'x' * 100)
+            evict.assert_not_called()
+            pdf_cache.put(4, 'k', b'x' * 100)
+            evict.assert_called_once()
+            pdf_cache.put(5, 'k', b'x' * 100)
+            evict.assert_called_once()
+
+
+class PdfRenderJobTests(TestCase):
+
+    def setUp(self):
+        cache_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(cache_dir.cleanup)
+        self.enterContext(override_settings(PDF_CACHE_DIR=cache_dir.name))
+        self.invoice = Invoice.objects.create(
+            invoice_number='INV/J-1', invoice_date=date(2025, 6, 15), buyer_name='ACME', place_of_supply='33',
+            subtotal=100, grand_total=105, total_in_words='One Hundred Five Only',
+        )
+        InvoiceItem.objects.create(
+            invoice=self.invoice, description='ITEM', hsn_code='5208', quantity=2, rate=50, gst_rate=5,
+        )
+
+    def test_enqueue_reuses_a_waiting_job(self):
+        job = pdf_jobs.enqueue(self.invoice.pk)
+        self.assertEqual(pdf_jobs.enqueue(self.invoice.pk), job)
+        self.assertEqual(PdfRenderJob.objects.count(), 1)
+
+    def test_enqueue_queues_again_when_the_invoice_changed_during_a_render(self):
+        job = pdf_jobs.enqueue(self.invoice.pk)
+        running = pdf_jobs.claim_next()
+        self.assertEqual((running.pk, running.status), (job.pk, PdfRenderJob.STATUS_RUNNING))
+        # Saved before the render started: the running job already sees it
+        Invoice.objects.filter(pk=self.invoice.pk).update(updated_on=running.started_on - timedelta(seconds=1))
+        self.assertEqual(pdf_jobs.enqueue(self.invoice.pk), running)
+
+        Invoice.objects.filter(pk=self.invoice.pk).update(updated_on=running.started_on + timedelta(seconds=1))
+        again = pdf_jobs.enqueue(self.invoice.pk)
+        self.assertNotEqual(again, running)
+        self.assertEqual(again.status, PdfRenderJob.STATUS_QUEUED)
+        self.assertEqual(pdf_jobs.enqueue(self.invoice.pk), again)
+
+    def test_run_job_renders_into_the_cache(self):
+        pdf_jobs.enqueue(self.invoice.pk)
+        job = pdf_jobs.run_job(pdf_jobs.claim_next())
+        self.assertEqual(job.status, PdfRenderJob.STATUS_DONE)
+        self.assertIsNone(pdf_jobs.claim_next())
+        self.invoice.refresh_from_db()
+        pdf = pdf_cache.get(self.invoice.pk, pdf_cache.cache_key(self.invoice))
+        self.assertTrue(pdf.startswith(b'%PDF'))
+
+    def test_failed_render_is_retried_then_given_up(self):
+        pdf_jobs.enqueue(self.invoice.pk)
+        with mock.patch.object(pdf_cache, 'get_or_render', side_effect=RuntimeError('boom')), \
+                mock.patch('traceback.print_exc'):
+            statuses = [pdf_jobs.run_job(pdf_jobs.claim_next(), max_attempts=2).status for _ in range(2)]
+        self.assertEqual(statuses, [PdfRenderJob.STATUS_QUEUED, PdfRenderJob.STATUS_FAILED])
+        self.assertIn('boom', PdfRenderJob.objects.get().error)
+        self.assertIsNone(pdf_jobs.claim_next())
+
+    def test_stale_jobs_are_requeued_and_old_ones_purged(self):
+        pdf_jobs.enqueue(self.invoice.pk)
+        job = pdf_jobs.claim_next()
+        self.assertEqual(pdf_jobs.requeue_stale(timedelta(minutes=5)), 0)
+        PdfRenderJob.objects.filter(pk=job.pk).update(started_on=now() - timedelta(minutes=10))
+        self.assertEqual(pdf_jobs.requeue_stale(timedelta(minutes=5)), 1)
+
+        pdf_jobs.run_job(pdf_jobs.claim_next())
+        self.assertEqual(pdf_jobs.purge_finished()[0], 0)
+        self.assertEqual(pdf_jobs.purge_finished(older_than=timedelta(0))[0], 1)
+
+
+class BulkPdfExportTests(TestCase):
+    """Exports are queued by the view and built by the export worker; rendering runs in-process (workers=0)."""
+
+    def setUp(self):
+        export_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(export_dir.cleanup)
+        self.enterContext(override_settings(PDF_EXPORT_DIR=export_dir.name, PDF_CACHE_MAX_BYTES=0))
+        self.client.force_login(User.objects.create_user(username='clerk', password='x'))
+        # The last invoice runs over several pages
+        self.invoices = [
+            Invoice.objects.get(pk=self.client.post(
+                '/invoice/', invoice_payload(f"INV/X-{n}", invoice_items(count)), content_type='application/json',
+            ).json()['invoice_id'])
+            for n, count in enumerate((1, 3, 40))
+        ]
+
+    def export(self, export_format):
+        """Request an export, build it as the worker would and download it."""
+        response = self.client.get(
+            '/invoice/export/pdf/', {'format': export_format, 'from_date': '2025-06-01'}, HTTP_ACCEPT='application/json',
+        )
+        self.assertEqual(response.status_code, 202)
+        status_url = response.json()['status_url']
+        self.assertIsNone(self.client.get(status_url).json()['download_url'])
+
+        job = export_jobs.run_job(export_jobs.claim_next(), workers=0)
+        self.assertEqual((job.status, job.invoice_count, job.rendered), (PdfExportJob.STATUS_DONE, 3, 3))
+        self.assertIsNone(export_jobs.claim_next())
+
+        download = self.client.get(self.client.get(status_url).json()['download_url'])
+        self.assertEqual(download.status_code, 200)
+        self.assertIn(job.filename, download['Content-Disposition'])
+        return b''.join(download.streaming_content)
+
+    def page_texts(self, pdf_bytes):
+        return [page.extract_text() for page in PdfReader(BytesIO(pdf_bytes), strict=True).pages]
+
+    def test_zip(self):
+        with zipfile.ZipFile(BytesIO(self.export('zip'))) as archive:
+            self.assertEqual(
+                sorted(archive.namelist()),
+                sorted(f"invoice_{invoice.invoice_number.replace('/', '_')}.pdf" for invoice in self.invoices),
+            )
+            for invoice in self.invoices:
+                pdf = archive.read(f"invoice_{invoice.invoice_number.replace('/', '_')}.pdf")
+                self.assertEqual(self.page_texts(pdf), self.page_texts(generate_invoice_pdf(invoice)))
+
+    def test_merged_pdf(self):
+        expected = [text for invoice in self.invoices for text in self.page_texts(generate_invoice_pdf(invoice))]
+        self.assertGreater(len(expected), len(self.invoices))
+        self.assertEqual(self.page_texts(self.export('pdf')), expected)
+
+    def test_requests(self):
+        self.assertEqual(self.client.get('/invoice/export/pdf/', {'format': 'tar'}).status_code, 400)
+        self.assertEqual(self.client.get('/invoice/export/pdf/', {'from_date': '2030-01-01'}).status_code, 404)
+        response = self.client.get('/invoice/export/pdf/', {'format': 'pdf'})
+        self.assertEqual(response.status_code, 202)
+        self.assertTemplateUsed(response, 'pages/invoice/export_pending.html')
+
+        job = PdfExportJob.objects.get()
+        self.assertEqual(self.client.get(f"/invoice/export/pdf/{job.pk}/download/").status_code, 404)
+
+    async def test_download_streams_under_asgi(self):
+        await self.async_client.aforce_login(await User.objects.aget(username='clerk'))
+        expected = await sync_to_async(self.export)('zip')
+        job = await PdfExportJob.objects.aget()
+
+        response = await self.async_client.get(f"/invoice/export/pdf/{job.pk}/download/")
+        self.assertTrue(response.is_async)
+        self.assertEqual(response['Content-Length'], str(len(expected)))
+        self.assertEqual(b''.join([chunk async for chunk in response]), expected)
+
+    def test_finished_exports_expire(self):
+        self.export('zip')
+        job = PdfExportJob.objects.get()
+        self.assertTrue(os.path.exists(export_jobs.output_path(job)))
+        export_jobs.purge_finished(older_than=timedelta(0))
+        self.assertFalse(os.path.exists(export_jobs.output_path(job)))
+        self.assertFalse(PdfExportJob.objects.exists())
+
+
+class InvoiceDataExportTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        def invoice(number, day, items):
+            invoice = Invoice.objects.create(
+                invoice_number=number, invoice_date=day, buyer_name='ACME', buyer_gstin='33ABCDE1234F1Z5',
+                place_of_supply='33', subtotal=Decimal('150.00'), cgst_total=Decimal('3.75'),
+                sgst_total=Decimal('3.75'), round_off=Decimal('0.50'), grand_total=Decimal('158.00'),
+                total_in_words='One Hundred Fifty Eight Only',
+            )
+            InvoiceItem.objects.bulk_create([
+                InvoiceItem(invoice=invoice, description=d, hsn_code='5208', quantity=q, rate=r, gst_rate=5)
+                for d, q, r in items
+            ])
+
+        invoice('E-2', date(2025, 6, 2), [('COTTON', Decimal('2.5'), Decimal('40.00')), ('SILK, DYED', 1, 50)])
+        invoice('E-1', date(2025, 6, 1), [])
+        invoice('E-3', date(2025, 7, 1), [('COTTON', 1, 10)])   # outside the range below
+
+    def setUp(self):
+        self.client.force_login(User.objects.create_user(username='clerk', password='x'))
+
+    def download(self, export_format):
+        response = self.client.get(
+            '/invoice/export/data/', {'format': export_format, 'from_date': '2025-06-01', 'to_date': '2025-06-30'},
+        )
+        self.assertEqual(response.status_code, 200)
+        return b''.join(response.streaming_content)
+
+    def test_columns(self):
+        self.assertEqual(data_export.HEADERS, [
+            'invoice_number', 'invoice_date', 'buyer_name', 'buyer_gstin', 'place_of_supply',
+            'subtotal', 'cgst_total', 'sgst_total', 'igst_total', 'round_off', 'grand_total',
+            'item_description', 'hsn_code', 'quantity', 'rate', 'gst_rate', 'amount',
+        ])
+
+    def test_csv_reads_back_as_the_invoice_items(self):
+        rows = list(csv.DictReader(io.StringIO(self.download('csv').decode())))
+        self.assertEqual(list(rows[0]), data_export.HEADERS)
+        # One row per item, by date; an invoice without items still gets a row
+        self.assertEqual([(r['invoice_number'], r['item_description']) for r in rows], [
+            ('E-1', ''), ('E-2', 'COTTON'), ('E-2', 'SILK, DYED'),
+        ])
+
+        cotton = rows[1]
+        self.assertEqual(cotton['invoice_date'], '2025-06-02')
+        self.assertEqual(cotton['buyer_gstin'], '33ABCDE1234F1Z5')
+        item = InvoiceItem.objects.get(invoice__invoice_number='E-2', description='COTTON')
+        self.assertEqual(
+            [Decimal(cotton[f]) for f in ('quantity', 'rate', 'gst_rate', 'amount')],
+            [item.quantity, item.rate, item.gst_rate, item.amount],
+        )
+        self.assertEqual(Decimal(cotton['amount']), Decimal('100.00'))
+        invoice = Invoice.objects.get(invoice_number='E-2')
+        self.assertEqual(
+            [Decimal(cotton[f]) for f in ('subtotal', 'cgst_total', 'sgst_total', 'igst_total', 'round_off', 'grand_total')],
+            [invoice.subtotal, invoice.cgst_total, invoice.sgst_total, invoice.igst_total, invoice.round_off,
+             invoice.grand_total],
+        )
+
+    @skipUnless(importlib.util.find_spec('openpyxl'), "openpyxl is not installed")
+    def test_xlsx_has_the_same_rows(self):
+        from openpyxl import load_workbook
+
+        sheet = load_workbook(BytesIO(self.download('xlsx')), read_only=True)['Invoice items']
+        headers, *rows = sheet.values
+        self.assertEqual(list(headers), data_export.HEADERS)
+        # Read-only sheets drop a row's trailing empty cells
+        rows = [dict(zip(headers, row)) for row in rows]
+        self.assertEqual(
+            [(r['invoice_number'], r.get('item_description')) for r in rows],
+            [('E-1', None), ('E-2', 'COTTON'), ('E-2', 'SILK, DYED')],
+        )
+
+    @skipUnless(importlib.util.find_spec('pyarrow'), "pyarrow is not installed")
+    def test_parquet_has_the_same_rows(self):
+        import pyarrow.parquet as pq
+
+        table = pq.read_table(BytesIO(self.download('parquet')))
+        self.assertEqual(table.column_names, data_export.HEADERS)
+        self.assertEqual(table.column('amount').to_pylist(), [None, Decimal('100.0000'), Decimal('50.0000')])
+
+    def test_unknown_format(self):
+        self.assertEqual(self.client.get('/invoice/export/data/', {'format': 'ods'}).status_code, 400)
+
+
+class InvoiceDataExportStreamingTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='clerk', password='x')
+        self.client.force_login(self.user)
+        for n in range(3):
+            self.client.post('/invoice/', invoice_payload('', invoice_items(n + 1)), content_type='application/json')
+
+    def wsgi_csv(self):
+        response = self.client.get('/invoice/export/data/', {'format': 'csv'})
+        self.assertFalse(response.is_async)
+        return b''.join(response.streaming_content)
+
+    async def test_csv_streams_under_asgi(self):
+        expected = await sync_to_async(self.wsgi_csv)()
+
+        await self.async_client.aforce_login(self.user)
+        response = await self.async_client.get('/invoice/export/data/', {'format': 'csv'})
+        self.assertTrue(response.is_async)
+        body = b''.join([chunk async for chunk in response])
+        self.assertEqual(body, expected)
+        self.assertEqual(len(body.decode().splitlines()), 1 + 6)
+
+
+class GstrHsnSummaryTests(TestCase):
+    today = date(2025, 7, 10)
+
+    def invoice(self, day, gstin, inter_state, items):
+        invoice = Invoice.objects.create(
+            invoice_number=f"INV/G-{Invoice.objects.count()}", invoice_date=day,
+            buyer_name='ACME', buyer_gstin=gstin, place_of_supply='29' if inter_state else '33',
+            subtotal=0, igst_total=1 if inter_state else 0, grand_total=0, total_in_words='',
+        )
+        InvoiceItem.objects.bulk_create([
+            InvoiceItem(invoice=invoice, description='CLOTH', hsn_code=hsn, quantity=qty, rate=rate, gst_rate=gst)
+            for hsn, qty, rate, gst in items
+        ])
+        return invoice
+
+    def rows(self, month, supply_type):
+        return {(r['hsn_code'], r['gst_rate']): r for r in month[supply_type]}
+
+    def test_split_and_taxes(self):
+        self.invoice(date(2025, 5, 3), '33ABCDE1234F1Z5', False, [('5208', 10, 100, 5), ('6205', 1, 1000, 12)])
+        self.invoice(date(2025, 5, 9), '29ABCDE1234F1Z5', True, [('5208', 5, 100, 5)])
+        self.invoice(date(2025, 5, 20), '', False, [('5208', 2, 50, 5)])
+
+        summary = gst_reports.hsn_summary(date(2025, 5, 1), date(2025, 5, 1), today=self.today)
+        b2b = self.rows(summary['months'][0], 'B2B')
+        cloth = b2b[('5208', Decimal('5.00'))]
+        self.assertEqual((cloth['taxable_value'], cloth['cgst'], cloth['sgst'], cloth['igst']),
+                         (Decimal('1500.00'), Decimal('25.00'), Decimal('25.00'), Decimal('25.00')))
+        self.assertEqual(b2b[('6205', Decimal('12.00'))]['cgst'], Decimal('60.00'))
+        b2c = self.rows(summary['months'][0], 'B2C')
+        self.assertEqual(b2c[('5208', Decimal('5.00'))]['total_tax'], Decimal('5.00'))
+
+    def test_closed_months_are_stored_and_invalidated(self):
+        self.invoice(date(2025, 4, 15), '', False, [('5208', 1, 100, 5)])
+        self.invoice(date(2025, 7, 1), '', False, [('5208', 1, 100, 5)])
+        first, last = date(2025, 4, 1), date(2025, 7, 1)
+
+        gst_reports.hsn_summary(first, last, today=self.today)
+        self.assertEqual(GstrClosedMonth.objects.count(), 3)
+
+        # Closed months are read back (one query for markers, one for rows); July is live
+        self.invoice(date(2025, 7, 2), '', False, [('5208', 1, 100, 5)])
+        with CaptureQueriesContext(connection) as queries:
+            summary = gst_reports.hsn_summary(first, last, today=self.today)
+        self.assertEqual(len(queries), 3)
+        self.assertEqual(summary['months'][3]['B2C'][0]['line_count'], 2)
+
+        # A backdated invoice sends its month back to be recomputed
+        late = self.invoice(date(2025, 4, 30), '', False, [('5208', 1, 100, 5)])
+        gst_reports.invalidate(late.invoice_date)
+        summary = gst_reports.hsn_summary(first, last, today=self.today)
+        self.assertEqual(summary['months'][0]['B2C'][0]['line_count'], 2)
+        self.assertEqual(summary['totals']['B2C'][0]['line_count'], 4)
+
+    def test_first_report_behind_a_lagging_replica(self):
+        # A replica that has seen none of the primary's rows yet
+        replica = SQLiteDatabaseWrapper(connections.configure_settings({
+            'default': connections.settings['default'],
+            REPLICA_DB_ALIAS: {'ENGINE': 'django.db.backends.sqlite3', 'NAME': ':memory:'},
+        })[REPLICA_DB_ALIAS], alias=REPLICA_DB_ALIAS)
+        connections[REPLICA_DB_ALIAS] = replica
+        self.addCleanup(connections.__delitem__, REPLICA_DB_ALIAS)
+        self.addCleanup(replica.close)
+        with replica.schema_editor() as editor:
+            for model in (Invoice, InvoiceItem, GstrClosedMonth, GstrHsnSummary):
+                editor.create_model(model)
+
+        self.invoice(date(2025, 4, 15), '', False, [('5208', 1, 100, 5)])
+        # The test's own transaction would otherwise keep every read on the primary
+        primary_outside_transaction = {'default': mock.Mock(in_atomic_block=False)}
+        with override_settings(DATABASES={**settings.DATABASES, REPLICA_DB_ALIAS: {}}), replica_reads(), \
+                mock.patch.object(db_routers, 'connections', primary_outside_transaction):
+            summary = gst_reports.hsn_summary(date(2025, 4, 1), date(2025, 4, 1), today=self.today)
+        self.assertEqual(summary['months'][0]['B2C'][0]['line_count'], 1)
+        self.assertEqual(GstrClosedMonth.objects.get().stored_version, 0)
+
+    def test_invoice_saved_while_a_month_is_computed_keeps_it_stale(self):
+        self.invoice(date(2025, 4, 15), '', False, [('5208', 1, 100, 5)])
+        first, last = date(2025, 4, 1), date(2025, 5, 1)
+        compute = gst_reports.compute
+
+        def compute_then_write(*args, **kwargs):
+            # The report's query has already run when this invoice lands
+            rows = compute(*args, **kwargs)
+            late = self.invoice(date(2025, 4, 20), '', False, [('5208', 1, 100, 5)])
+            gst_reports.invalidate(late.invoice_date)
+            return rows
+
+        with mock.patch.object(gst_reports, 'compute', compute_then_write):
+            summary = gst_reports.hsn_summary(first, last, today=self.today)
+        self.assertEqual(summary['months'][0]['B2C'][0]['line_count'], 1)
+
+        # April was not marked as stored, so the next report recomputes it; May was
+        trusted = GstrClosedMonth.objects.filter(stored_version=F('version')).values_list('month', flat=True)
+        self.assertEqual(list(trusted), [date(2025, 5, 1)])
+        summary = gst_reports.hsn_summary(first, last, today=self.today)
+        self.assertEqual(summary['months'][0]['B2C'][0]['line_count'], 2)
+
+
+@override_settings(DATABASES={**settings.DATABASES, REPLICA_DB_ALIAS: settings.DATABASES['default']})
+class ReplicaRouterTests(SimpleTestCase):
+    databases = {'default'}
+    router = ReplicaRouter()
+
+    def test_reads_go_to_replica_only_when_asked(self):
+        self.assertIsNone(self.router.db_for_read(Invoice))
+        with replica_reads():
+            self.assertEqual(self.router.db_for_read(Invoice), REPLICA_DB_ALIAS)
+            self.assertEqual(self.router.db_for_write(Invoice), 'default')
+        self.assertIsNone(self.router.db_for_read(Invoice))
+
+    def test_users_and_open_transactions_stay_on_primary(self):
+        with replica_reads():
+            self.assertIsNone(self.router.db_for_read(User))
+            with transaction.atomic():
+                self.assertIsNone(self.router.db_for_read(Invoice))
+
+    def test_no_migrations_on_replica(self):
+        self.assertFalse(self.router.allow_migrate(REPLICA_DB_ALIAS, 'core'))
+        self.assertIsNone(self.router.allow_migrate('default', 'core'))
+
+
+@override_settings(SERVER_TIMING=True, METRICS_DIR='', PDF_RENDER_ASYNC=False, PDF_CACHE_MAX_BYTES=0)
+class RequestMetricsTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='clerk', password='x')
+        self.staff = User.objects.create_user(username='owner', password='x', is_staff=True)
+
+    def test_server_timing_header(self):
+        self.client.force_login(self.user)
+        response = self.client.get('/view/')
+        timing = response['Server-Timing']
+        self.assertRegex(timing, r'db;dur=[\d.]+;desc="\d+ queries, \d+ rows"')
+        self.assertIn('tpl;dur=', timing)
+        self.assertIn('total;dur=', timing)
+
+    def test_pdf_build_is_timed(self):
+        self.client.force_login(self.user)
+        created = self.client.post(
+            '/invoice/', json.dumps(invoice_payload('M-1', invoice_items(3))), content_type='application/json'
+        ).json()
+        response = self.client.get(f"/invoice/{created['invoice_id']}/pdf/")
+        self.assertRegex(response['Server-Timing'], rf'pdf;dur=[\d.]+;desc="{len(response.content)} bytes"')
+
+    def test_metrics_are_staff_only(self):
+        self.client.force_login(self.user)
+        self.client.get('/view/')
+        self.assertEqual(self.client.get('/metrics').status_code, 403)
+
+        self.client.force_login(self.staff)
+        body = self.client.get('/metrics').content.decode()
+        self.assertIn('# TYPE billdash_sql_queries histogram', body)
+        self.assertIn('billdash_request_duration_seconds_count{view="view-invoices"}', body)
+
+    def test_metrics_accept_a_staff_token(self):
+        token = Token.objects.create(user=self.staff)
+        response = Client().get('/metrics', HTTP_AUTHORIZATION=f"Token {token.key}")
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain'))
+
+
+class BenchmarkSuiteTests(TestCase):
+    def test_suite_runs_and_reports_every_case(self):
+        report = benchmarks.run(sizes=[30], repeat=1, include_pdf=False, today=date(2025, 9, 15))
+        self.assertEqual(Invoice.objects.filter(invoice_number__startswith='SEED/').count(), 30)
+        cases = {r['case']: r for r in report['results']}
+        self.assertEqual(set(cases), {
+            'dashboard', 'dashboard/cached', 'invoice_list/first_page', 'invoice_list/search_sorted',
+            'invoice_create/10_items', 'invoice_edit/10_items',
+        })
+        for result in cases.values():
+            self.assertEqual(result['invoices'], 30)
+            self.assertGreater(result['queries'], 0)
+            self.assertGreater(result['wall_ms_median'], 0)
+        # Only the uncached case reads the rollups
+        self.assertGreater(cases['dashboard']['queries'], cases['dashboard/cached']['queries'])
+
+
+class SeedInvoicesTests(TestCase):
+    def test_totals_are_consistent(self):
+        seeding.seed_invoices(300, seed=5, last_day=date(2025, 9, 15), years=2, batch_size=70)
+        self.assertEqual(Invoice.objects.count(), 300)
+        self.assertEqual(Invoice.objects.aggregate(first=Min('invoice_date'))['first'], date(2024, 4, 1))
+
+        items = {}
+        for item in InvoiceItem.objects.all():
+            items.setdefault(item.invoice_id, []).append(item)
+        cent = Decimal('0.01')
+        for invoice in Invoice.objects.all():
+            lines = items[invoice.pk]
+            self.assertEqual(invoice.subtotal, sum(i.quantity * i.rate for i in lines))
+            tax = sum(i.quantity * i.rate * i.gst_rate / 100 for i in lines)
+            if invoice.place_of_supply == invoice.seller_state_code:
+                self.assertEqual(invoice.igst_total, 0)
+                self.assertEqual(invoice.cgst_total, (tax / 2).quantize(cent, ROUND_HALF_UP))
+                self.assertEqual(invoice.sgst_total, invoice.cgst_total)
+            else:
+                self.assertEqual(invoice.cgst_total + invoice.sgst_total, 0)
+                self.assertEqual(invoice.igst_total, tax.quantize(cent, ROUND_HALF_UP))
+            raw = invoice.subtotal + invoice.cgst_total + invoice.sgst_total + invoice.igst_total
+            self.assertEqual(invoice.grand_total, raw.quantize(Decimal(1), ROUND_HALF_UP))
+            self.assertEqual(invoice.round_off, invoice.grand_total - raw)
+            self.assertEqual(invoice.buyer_gstin[:2], invoice.place_of_supply)
+            self.assertEqual(invoice.buyer_gstin[-1], seeding.gstin_check_digit(invoice.buyer_gstin[:14]))
+
+        # Both kinds of supply, and the daily rollups are rebuilt
+        self.assertTrue(Invoice.objects.filter(igst_total=0).exists())
+        self.assertTrue(Invoice.objects.filter(igst_total__gt=0).exists())
+        self.assertEqual(DailyInvoiceSummary.objects.aggregate(n=Sum('invoice_count'))['n'], 300)
+
+    def test_same_seed_same_invoices_and_numbering_continues(self):
+        def generated(seed):
+            return list(seeding.Generator(seed, 50, date(2025, 4, 1), date(2025, 9, 30)).invoices())
+
+        self.assertEqual(generated(1), generated(1))
+        self.assertNotEqual(generated(1), generated(2))
+
+        seeding.seed_invoices(20, seed=1, last_day=date(2025, 9, 30), years=1, series='TST')
+        self.assertEqual(numbering.allocate(date(2025, 10, 1), series='TST'), 'TST/2025-26/021')
+
+
+class InvoiceDataCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(User.objects.create_user(username='viewer', password='x'))
+
+    def test_generation_moves_on_commit_of_invoice_writes(self):
+        before = caching.generation()
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            invoice = Invoice.objects.create(
+                invoice_number='C-1', invoice_date=date(2025, 6, 1), buyer_name='X', place_of_supply='33',
+                subtotal=1, grand_total=1, total_in_words='One',
+            )
+            InvoiceItem.objects.create(invoice=invoice, description='A', quantity=1, rate=1, gst_rate=0)
+            self.assertEqual(caching.generation(), before)
+        self.assertEqual(len(callbacks), 1)   # one bump per transaction
+        self.assertGreater(caching.generation(), before)
+
+        # Counter evicted: it restarts above anything handed out before
+        cache.set(caching.GENERATION_KEY, 5, timeout=None)
+        cache.delete(caching.GENERATION_KEY)
+        self.assertGreater(caching.generation(), 5)
+
+    def test_dashboard_is_cached_until_invoices_change(self):
+        self.client.get('/dashboard/')
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get('/dashboard/')
+        self.assertFalse(any('core_dailyinvoicesummary' in q['sql'] for q in queries))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                '/invoice/', json.dumps(invoice_payload('C-2', invoice_items(1))), content_type='application/json',
+            )
+        self.assertEqual(response.status_code, 201)
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get('/dashboard/')
+        self.assertTrue(any('core_dailyinvoicesummary' in q['sql'] for q in queries))
+
+    def test_cached_dashboard_is_computed_on_the_primary(self):
+        compute = views._dashboard_context
+        on_replica = []
+
+        def record(today):
+            on_replica.append(db_routers._replica_reads.get())
+            return compute(today)
+
+        with mock.patch.object(views, '_dashboard_context', record):
+            self.assertEqual(self.client.get('/dashboard/').status_code, 200)
+        self.assertEqual(on_replica, [False])
+
+
+class AutocompleteIndexTests(TestCase):
+    def setUp(self):
+        # A fresh index per test instead of the worker-wide one, with no background
+        # refreshes: their threads could not see this test's transaction
+        self.enterContext(mock.patch.object(autocomplete, '_holder', autocomplete._IndexHolder()))
+        self.enterContext(mock.patch.object(autocomplete, 'GENERATION_CHECK_SECONDS', float('inf')))
+        self.client.force_login(User.objects.create_user(username='clerk', password='x'))
+        for n in range(3):
+            self.post(invoice_payload('', invoice_items(n + 1)))
+
+    def post(self, payload):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/invoice/', payload, content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+
+    def values(self, results):
+        return [result['value'] for result in results]
+
+    def test_prefix_matches_rank_above_substring_matches(self):
+        index = autocomplete.PrefixIndex()
+        index.add('Cotton Saree', count=5, last_used=date(2025, 1, 1))
+        index.add('Silk Saree', count=9, last_used=date(2024, 1, 1))
+        index.add('SAREE BORDER', count=1, last_used=date(2025, 6, 1))
+        index.add('cotton saree', count=2)
+
+        self.assertEqual(self.values(index.search('sar')), ['SAREE BORDER', 'Silk Saree', 'Cotton Saree'])
+        self.assertEqual(
+            self.values(index.search('saree', rank='recency')), ['SAREE BORDER', 'Cotton Saree', 'Silk Saree'],
+        )
+        self.assertEqual(index.search('COT')[0]['count'], 7)
+        self.assertEqual(self.values(index.search('sar', limit=1)), ['SAREE BORDER'])
+        # Substring matching needs a whole trigram
+        self.assertEqual(index.search('ee'), [])
+        self.assertEqual(len(index), 3)
+
+    def test_lookups(self):
+        self.assertEqual(self.values(autocomplete.search('description', 'item')), ['ITEM 0', 'ITEM 1', 'ITEM 2'])
+        self.assertEqual(autocomplete.search('description', 'item')[0]['count'], 3)
+        self.assertEqual(autocomplete.descriptions_for_hsn('5208'), ['ITEM 0', 'ITEM 1', 'ITEM 2'])
+        self.assertEqual(
+            autocomplete.buyers_for_gstin('33abcde1234f1z5'),
+            [{'buyer_name': 'ACME', 'buyer_address': '', 'place_of_supply': '33'}],
+        )
+        response = self.client.get('/api/autocomplete/', {'field': 'buyer', 'q': 'ac'})
+        self.assertEqual(self.values(response.json()['results']), ['ACME'])
+
+    def test_own_saves_are_folded_in_after_commit(self):
+        autocomplete.search('description', 'zari')
+        self.post(invoice_payload('', [{**invoice_items(1)[0], 'description': 'ZARI BORDER'}]))
+        self.assertEqual(self.values(autocomplete.search('description', 'zari')), ['ZARI BORDER'])
+
+    def test_saves_during_a_rebuild_do_not_wait_for_it(self):
+        holder = autocomplete._holder
+        autocomplete.search('description', 'zari')
+        build, waited = autocomplete._IndexHolder._build, []
+
+        def build_then_save(rebuilt):
+            build(rebuilt)
+            # The save commits after the rebuild read the invoices, while it holds refresh_lock
+            with self.captureOnCommitCallbacks() as callbacks:
+                response = self.client.post(
+                    '/invoice/', invoice_payload('', [{**invoice_items(1)[0], 'description': 'ZARI BORDER'}]),
+                    content_type='application/json',
+                )
+            self.assertEqual(response.status_code, 201)
+            saver = threading.Thread(target=lambda: [callback() for callback in callbacks], daemon=True)
+            saver.start()
+            saver.join(5)
+            waited.append(saver.is_alive())
+
+        with mock.patch.object(autocomplete._IndexHolder, '_build', build_then_save):
+            holder._background_work(rebuild=True)
+        self.assertEqual(waited, [False])
+        self.assertFalse(holder.refresh_wanted)
+        self.assertEqual(self.values(autocomplete.search('description', 'zari')), ['ZARI BORDER'])
+
+    def test_prefix_search_after_bulk_adds(self):
+        index = autocomplete.PrefixIndex()
+        for value in ['Zari', 'Lace', 'Zari Border', 'Brocade']:
+            index.add(value)
+        self.assertEqual(self.values(index.search('za')), ['Zari', 'Zari Border'])
+        index.add('Zardozi')
+        self.assertEqual(self.values(index.search('zar')), ['Zardozi', 'Zari', 'Zari Border'])
+
+    def test_other_workers_saves_are_picked_up_when_the_generation_moves(self):
+        autocomplete.search('description', 'zari')
+        invoice = Invoice.objects.create(
+            invoice_number='A-1', invoice_date=date(2025, 6, 1), buyer_name='X', place_of_supply='33',
+            subtotal=0, grand_total=0, total_in_words='Zero',
+        )
+        InvoiceItem.objects.create(invoice=invoice, description='ZARI BORDER', quantity=1, rate=1, gst_rate=5)
+
+        autocomplete._holder._refresh_if_stale()
+        self.assertEqual(autocomplete.search('description', 'zari'), [])
+        caching.bump()
+        autocomplete._holder._refresh_if_stale()
+        self.assertEqual(self.values(autocomplete.search('description', 'zari')), ['ZARI BORDER'])
+
+    def test_lookups_never_read_the_shared_cache(self):
+        holder = autocomplete._holder
+        autocomplete.search('hsn', '52')
+        started, ran = [], threading.Event()
+        with mock.patch.object(caching, 'generation', side_effect=AssertionError("read on a lookup")), \
+                mock.patch.object(autocomplete, 'GENERATION_CHECK_SECONDS', 2), \
+                mock.patch.object(holder, '_background', lambda: (started.append(True), ran.set())):
+            holder.checked_at = time.monotonic()
+            for _ in range(3):
+                self.assertEqual(self.values(async_to_sync(autocomplete.asearch)('hsn', '52')), ['5208'])
+            self.assertEqual(started, [])
+
+            # Once the interval is up, the next lookup hands the check to one background thread
+            holder.checked_at = 0.0
+            self.assertEqual(self.values(async_to_sync(autocomplete.asearch)('hsn', '52')), ['5208'])
+            autocomplete.search('hsn', '52')
+            self.assertTrue(ran.wait(5))
+        self.assertEqual(started, [True])
+
+
+class BuyerMasterTests(TestCase):
+    def setUp(self):
+        self.client.force_login(User.objects.create_user(username='clerk', password='x'))
+
+    def post(self, url, number, invoice_date, **buyer):
+        payload = {**invoice_payload(number, invoice_items(1)), 'invoice_date': invoice_date, **buyer}
+        response = self.client.post(url, json.dumps(payload), content_type='application/json')
+        self.assertIn(response.status_code, (200, 201), response.content)
+        return Invoice.objects.get(pk=response.json()['invoice_id'])
+
+    def test_kept_in_step_with_invoice_writes(self):
+        first = self.post('/invoice/', 'B-1', '15-06-2025', buyer_gstin=' 33abcde1234f1z5')
+        later = self.post('/invoice/', 'B-2', '01-08-2025', buyer_address='NEW ADDRESS')
+        self.assertEqual(first.buyer_id, later.buyer_id)
+        buyer = Buyer.objects.get()
+        self.assertEqual(
+            (buyer.key, buyer.address, buyer.first_invoice_date, buyer.last_invoice_date),
+            ('33ABCDE1234F1Z5', 'NEW ADDRESS', date(2025, 6, 15), date(2025, 8, 1)),
+        )
+
+        # Moving the latest invoice to a buyer without a GSTIN shrinks the first buyer back
+        moved = self.post(f"/invoice/{later.pk}/edit/", 'B-2', '01-08-2025', buyer_gstin='', buyer_name='walk in')
+        self.assertEqual(moved.buyer.key, 'NAME:WALK IN')
+        buyer.refresh_from_db()
+        self.assertEqual((buyer.address, buyer.last_invoice_date), ('', date(2025, 6, 15)))
+
+        self.client.post(f"/invoice/{first.pk}/delete/")
+        self.assertQuerySetEqual(Buyer.objects.values_list('key', flat=True), ['NAME:WALK IN'])
+
+    def test_seeded_invoices_are_linked(self):
+        seeding.seed_invoices(200, seed=3, last_day=date(2025, 9, 15), years=1, buyers=20)
+        self.assertFalse(Invoice.objects.filter(buyer__isnull=True).exists())
+        self.assertEqual(Buyer.objects.count(), Invoice.objects.values('buyer_gstin').distinct().count())
+        for buyer in Buyer.objects.all():
+            dates = buyer.invoices.aggregate(first=Min('invoice_date'), last=Max('invoice_date'))
+            self.assertEqual((buyer.first_invoice_date, buyer.last_invoice_date), (dates['first'], dates['last']))
+
+
+class StoredItemAmountTests(TestCase):
+    def test_amount_and_tax_are_stored_exactly(self):
+        invoice = Invoice.objects.create(
+            invoice_number='S-1', invoice_date=date(2025, 6, 1), buyer_name='X', place_of_supply='33',
+            subtotal=0, grand_total=0, total_in_words='Zero',
+        )
+        InvoiceItem.objects.bulk_create([
+            InvoiceItem(invoice=invoice, description='A', quantity=Decimal('3.33'), rate=Decimal('17.17'), gst_rate=5),
+            InvoiceItem(invoice=invoice, description='B', quantity=Decimal('7'), rate=Decimal('0.99'), gst_rate=12),
+        ])
+        self.assertEqual(
+            list(invoice.items.order_by('id').values_list('amount', 'tax_amount')),
+            [(Decimal('57.1761'), Decimal('2.858805')), (Decimal('6.93'), Decimal('0.8316'))],
+        )
+        self.assertEqual(InvoiceItem.objects.aggregate(total=Sum('amount'))['total'], Decimal('64.1061'))
+
+    def test_tax_on_whole_numbers_is_not_truncated(self):
+        invoice = Invoice.objects.create(
+            invoice_number='S-2', invoice_date=date(2025, 6, 1), buyer_name='X', place_of_supply='33',
+            subtotal=0, grand_total=0, total_in_words='Zero',
+        )
+        item = InvoiceItem.objects.create(invoice=invoice, description='A', quantity=3, rate=7, gst_rate=5)
+        item.refresh_from_db()
+        self.assertEqual((item.amount, item.tax_amount), (Decimal('21'), Decimal('1.05')))
+
+
+class ClosedYearTests(TestCase):
+    def setUp(self):
+        archive_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(archive_dir.cleanup)
+        self.enterContext(override_settings(PDF_ARCHIVE_DIR=archive_dir.name, PDF_RENDER_ASYNC=False))
+        self.client.force_login(User.objects.create_user(username='clerk', password='x'))
+
+    def post(self, url, number, invoice_date):
+        payload = {**invoice_payload(number, invoice_items(2)), 'invoice_date': invoice_date}
+        return self.client.post(url, json.dumps(payload), content_type='application/json')
+
+    def test_closed_year_is_frozen_and_archived(self):
+        invoice = Invoice.objects.get(pk=self.post('/invoice/', 'C-1', '15-06-2024').json()['invoice_id'])
+        closed = closing.close_year(2024, today=date(2025, 9, 1), workers=0)
+
+        self.assertEqual((closed.invoice_count, closed.pdfs_archived), (1, 1))
+        self.assertEqual(closed.summary['totals']['grand_total'], invoice.grand_total)
+        self.assertEqual([m['month'] for m in closed.summary['months']], ['2024-06'])
+        archived = self.client.get(f"/invoice/{invoice.pk}/pdf/").content
+        self.assertTrue(archived.startswith(b'%PDF'))
+        self.assertEqual(len(pdf_archive.archived_ids(2024)), 1)
+
+        self.assertEqual(self.post(f"/invoice/{invoice.pk}/edit/", 'C-1', '15-06-2024').status_code, 403)
+        self.assertEqual(self.post(f"/invoice/{invoice.pk}/edit/", 'C-1', '15-06-2025').status_code, 403)
+        self.assertEqual(self.client.post(f"/invoice/{invoice.pk}/delete/").status_code, 403)
+        self.assertEqual(self.post('/invoice/', 'C-2', '01-01-2025').status_code, 403)
+        self.assertEqual(self.post('/invoice/', 'C-3', '01-06-2025').status_code, 201)
+
+        result = importer.import_invoices([(1, {**invoice_payload('C-4', invoice_items(1)), 'invoice_date': '02-02-2025'})])
+        self.assertEqual((result.created, result.errors[0]['errors']), (0, ["financial year 2024-25 is closed"]))
+
+        # Re-running resumes rather than re-rendering
+        self.assertEqual(closing.close_year(2024, today=date(2025, 9, 1), workers=0).pdfs_archived, 1)
+        self.assertEqual(ClosedFinancialYear.objects.count(), 1)
+
+    def test_current_year_cannot_be_closed(self):
+        with self.assertRaises(ValueError):
+            closing.close_year(2025, today=date(2025, 9, 1))
+
+    def test_year_closed_during_an_import_stops_its_later_chunks(self):
+        records = [
+            (n, {**invoice_payload(f"C-{n}", invoice_items(1)), 'invoice_date': '02-02-2025'}) for n in range(1, 5)
+        ]
+
+        def close_after_first_chunk(result):
+            if not ClosedFinancialYear.objects.exists():
+                closing.close_year(2024, today=date(2025, 9, 1), workers=0)
+
+        result = importer.import_invoices(records, chunk_size=2, progress=close_after_first_chunk)
+        self.assertEqual(result.created, 2)
+        self.assertEqual([e['line'] for e in result.errors], [3, 4])
+        self.assertEqual(ClosedFinancialYear.objects.get().invoice_count, 2)
+
+
+@skipUnless(connection.vendor == 'postgresql', "SQLite lets one transaction write at a time")
+class ClosedYearLockTests(TransactionTestCase):
+    """Closing a year waits for writes already inside it, and writes after the close see it."""
+
+    def test_close_waits_for_writers(self):
+        archive_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(archive_dir.cleanup)
+        checked, release, closed = threading.Event(), threading.Event(), threading.Event()
+
+        def writer():
+            try:
+                with transaction.atomic():
+                    closing.ensure_open(date(2024, 6, 1))
+                    checked.set()
+                    release.wait(5)
+            finally:
+                connection.close()
+
+        def closer():
+            try:
+                with override_settings(PDF_ARCHIVE_DIR=archive_dir.name):
+                    closing.close_year(2024, today=date(2025, 9, 1), workers=0)
+                closed.set()
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=writer)]
+        threads[0].start()
+        checked.wait(5)
+        threads.append(threading.Thread(target=closer))
+        threads[1].start()
+        self.assertFalse(closed.wait(0.5), "close_year did not wait for the open write")
+        release.set()
+        for thread in threads:
+            thread.join()
+
+        self.assertTrue(closed.is_set())
+        with self.assertRaises(closing.YearClosed), transaction.atomic():
+            closing.ensure_open(date(2024, 6, 1))
+
+
+class CanvasPdfRendererTests(TestCase):
+    """
+    The canvas renderer draws what the platypus renderer draws. No rasterizer
+    is installed, so pages are compared as what one would paint: each word at
+    its position in its font, and each stroked line (see pdf_display_list).
+    """
+
+    def make_invoice(self, items, hsn_codes=1, inter_state=False, **fields):
+        invoice = Invoice.objects.create(**{
+            'invoice_number': f"PDF-{Invoice.objects.count() + 1}", 'invoice_date': date(2025, 6, 15),
+            'buyer_name': 'acme traders', 'buyer_address': '12, Main Road, Salem', 'buyer_gstin': '33ABCDE1234F1Z5',
+            'place_of_supply': '29' if inter_state else '33', 'subtotal': Decimal('1234.50'),
+            'cgst_total': 0 if inter_state else Decimal('30.86'), 'sgst_total': 0 if inter_state else Decimal('30.86'),
+            'igst_total': Decimal('61.73') if inter_state else 0, 'round_off': Decimal('-0.23'),
+            'grand_total': Decimal('1296.00'), 'total_in_words': 'One Thousand Two Hundred Ninety-Six Rupees Only',
+            **fields,
+        })
+        InvoiceItem.objects.bulk_create([
+            InvoiceItem(
+                invoice=invoice, description=f"cotton fabric {n} & lining", hsn_code=f"{5208 + n % hsn_codes}",
+                quantity=Decimal(n + 1), rate=Decimal('123.45'), gst_rate=5,
+            )
+            for n in range(items)
+        ])
+        return invoice
+
+    def assertRendersLikePlatypus(self, invoice):
+        canvas_pdf = pdf_canvas.render(invoice)
+        self.assertIsNotNone(canvas_pdf)
+        self.assertEqual(pdf_display_list(canvas_pdf), pdf_display_list(generate_invoice_pdf_platypus(invoice)))
+
+    def test_matches_platypus(self):
+        cases = {
+            'one item': self.make_invoice(1),
+            'inter-state': self.make_invoice(3, hsn_codes=3, inter_state=True, round_off=0),
+            'full page': self.make_invoice(8, hsn_codes=4),
+            'two pages, transport': self.make_invoice(
+                9, hsn_codes=2, transport_name='vrl logistics', transport_address='Coimbatore',
+            ),
+            'four pages': self.make_invoice(30, hsn_codes=3, inter_state=True),
+            'wrapped words': self.make_invoice(2, total_in_words='Ninety-Nine Lakh ' * 12 + 'Rupees Only'),
+        }
+        for name, invoice in cases.items():
+            with self.subTest(name):
+                self.assertRendersLikePlatypus(invoice)
+
+    def test_falls_back_when_the_last_page_overflows(self):
+        # Fifteen HSN codes push the tax summary off the last page, which only platypus can split
+        invoice = self.make_invoice(15, hsn_codes=15)
+        self.assertIsNone(pdf_canvas.render(invoice))
+        with override_settings(PDF_RENDERER='canvas'):
+            pdf_bytes = generate_invoice_pdf(invoice)
+        self.assertEqual(len(PdfReader(BytesIO(pdf_bytes)).pages), 3)
+
+
+@skipUnless(connection.vendor == 'postgresql', "Partitioning is a Postgres feature")
+class InvoicePartitioningTests(TestCase):
+    """
+    Convert the test database's invoice table and check that date-bounded
+    invoice list queries only read the partitions for their years. (The
+    dashboard's date-bounded figures come from the daily rollups.)
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        Invoice.objects.bulk_create([
+            Invoice(
+                invoice_number=f"INV/PART-{n:04d}", invoice_date=date(2022, 4, 1) + timedelta(days=n),
+                buyer_name=f"BUYER {n % 20}", place_of_supply='33',
+                subtotal=Decimal('100.00'), grand_total=Decimal('105.00'), total_in_words='One Hundred Five Only',
+            )
+            for n in range(0, 4 * 365, 3)
+        ])
+        partitioning.apply(today=date(2025, 9, 1), convert=True)
+
+    def scanned(self, queryset):
+        plan = json.loads(queryset.explain(format='json'))[0]['Plan']
+        return {n['Relation Name'] for n in plan_nodes(plan) if 'Relation Name' in n}
+
+    def test_date_bounded_list_reads_only_its_year(self):
+        fields = ('id', 'invoice_number', 'buyer_name', 'invoice_date', 'grand_total')
+        this_quarter = Invoice.objects.in_date_range('2025-04-01', '2025-06-30')
+        self.assertEqual(self.scanned(this_quarter.order_by('-id').values(*fields)[:101]), {'core_invoice_fy2025'})
+        self.assertEqual(
+            self.scanned(this_quarter.search(buyer='YER 1').order_by('-invoice_date', '-id').values(*fields)[:101]),
+            {'core_invoice_fy2025'},
+        )
+        self.assertEqual(
+            self.scanned(Invoice.objects.in_date_range('2023-01-01', '2024-06-30').values(*fields)),
+            {'core_invoice_fy2022', 'core_invoice_fy2023', 'core_invoice_fy2024'},
+        )
+
+    def test_rows_and_writes_survive_the_conversion(self):
+        self.assertEqual(Invoice.objects.count(), len(range(0, 4 * 365, 3)))
+        invoice = Invoice.objects.create(
+            invoice_number='INV/PART-NEW', invoice_date=date(2025, 9, 1), buyer_name='NEW', place_of_supply='33',
+            subtotal=1, grand_total=1, total_in_words='One',
+        )
+        self.assertGreater(invoice.pk, Invoice.objects.exclude(pk=invoice.pk).order_by('-id')[0].pk)
+        self.assertEqual(partitioning.plan(today=date(2025, 9, 1)), [])
+
+    def test_next_year_takes_over_rows_from_the_default_partition(self):
+        far = Invoice.objects.create(
+            invoice_number='INV/PART-FAR', invoice_date=date(2027, 5, 1), buyer_name='FAR', place_of_supply='33',
+            subtotal=1, grand_total=1, total_in_words='One',
+        )
+        self.assertEqual(self.scanned(Invoice.objects.filter(invoice_date=far.invoice_date)), {'core_invoice_default'})
+        partitioning.apply(today=date(2027, 4, 2))
+        with connection.cursor() as cursor:
+            self.assertTrue({2026, 2027, 2028} <= partitioning.attached_years(cursor))
+        self.assertEqual(self.scanned(Invoice.objects.filter(invoice_date=far.invoice_date)), {'core_invoice_fy2027'})
+        self.assertTrue(Invoice.objects.filter(pk=far.pk).exists())
+
+    def test_edit_refuses_a_number_used_in_another_year(self):
+        # Each partition only has its own unique index, so both rows save
+        _, second = (
+            Invoice.objects.create(
+                invoice_number='INV/PART-DUP', invoice_date=day, buyer_name='DUP', place_of_supply='33',
+                subtotal=1, grand_total=1, total_in_words='One',
+            )
+            for day in (date(2023, 5, 1), date(2024, 5, 1))
+        )
+        self.client.force_login(User.objects.create_user(username='clerk', password='x'))
+        response = self.client.post(
+            f'/invoice/{second.pk}/edit/', invoice_payload('INV/PART-DUP', invoice_items(1)),
+            content_type='application/json',
+        )
+        self.assertEqual(response.status_code, 409, response.content)
+        second.refresh_from_db()
+        self.assertEqual(second.invoice_date, date(2024, 5, 1))
+
+
+@skipUnless(connection.vendor == 'postgresql', "Partitioning is a Postgres feature")
+class PartitionNewYearRaceTests(TransactionTestCase):
+    """
+    Adding a year while other sessions write, on a scratch table shaped like
+    the partitioned invoice table so the real one stays as the other tests
+    expect it.
+    """
+    table = 'partition_race_invoice'
+
+    def setUp(self):
+        qn = connection.ops.quote_name
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"CREATE TABLE {qn(self.table)} (id serial, invoice_number varchar(100), invoice_date date) "
+                f"PARTITION BY RANGE (invoice_date)"
+            )
+            cursor.execute(
+                f"CREATE TABLE {qn(partitioning.default_partition_name(self.table))} PARTITION OF {qn(self.table)} DEFAULT"
+            )
+            cursor.execute(f"INSERT INTO {qn(self.table)} (invoice_number, invoice_date) VALUES ('EARLY', '2027-05-01')")
+        self.addCleanup(self.drop)
+
+    def drop(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f"DROP TABLE IF EXISTS {connection.ops.quote_name(self.table)} CASCADE")
+
+    def test_row_written_during_the_move_is_kept(self):
+        qn = connection.ops.quote_name
+        written = threading.Event()
+
+        def writer():
+            try:
+                with connection.cursor() as cursor:
+                    cursor.execute(
+                        f"INSERT INTO {qn(self.table)} (invoice_number, invoice_date) VALUES ('LATE', '2027-06-01')"
+                    )
+                written.set()
+            finally:
+                connection.close()
+
+        thread = threading.Thread(target=writer)
+        with transaction.atomic(), connection.cursor() as cursor:
+            # What apply() holds on the parent while adding years
+            cursor.execute(f"LOCK TABLE {qn(self.table)} IN SHARE UPDATE EXCLUSIVE MODE")
+            for statement in partitioning._new_year(qn, self.table, 2027):
+                cursor.execute(statement)
+                if 'INSERT INTO' in statement:
+                    # Rows are copied out of the default partition; a write now must not be lost
+                    thread.start()
+                    self.assertFalse(written.wait(0.5), "a write reached the default partition mid-move")
+        thread.join(5)
+        self.assertTrue(written.is_set())
+
+        with connection.cursor() as cursor:
+            cursor.execute(f"SELECT invoice_number FROM {qn(partitioning.partition_name(2027, self.table))} ORDER BY 1")
+            self.assertEqual([row[0] for row in cursor.fetchall()], ['EARLY', 'LATE'])
+            cursor.execute(f"SELECT COUNT(*) FROM {qn(partitioning.default_partition_name(self.table))}")
+            self.assertEqual(cursor.fetchone()[0], 0)
@@ -16,11 +16,20 @@ urlpatterns = [
     path('dashboard/', views.dashboard_view, name='dashboard'),
     path('invoice/', views.invoice_view, name='invoice'),
     path('invoice/<int:invoice_id>/pdf/', views.generate_invoice_pdf_view, name='generate-invoice-pdf'),
+    path('invoice/export/pdf/', views.export_invoice_pdfs_view, name='export-invoice-pdfs'),
+    path('invoice/export/pdf/<int:job_id>/', views.pdf_export_status_view, name='pdf-export-status'),
+    path('invoice/export/pdf/<int:job_id>/download/', views.pdf_export_download_view, name='pdf-export-download'),
+    path('invoice/export/data/', views.export_invoice_data_view, name='export-invoice-data'),
+    path('invoice/import/', views.import_invoices_view, name='import-invoices'),
+    path('invoice/pdf-jobs/<int:job_id>/', views.pdf_job_status_view, name='pdf-job-status'),
     path('invoice/<int:invoice_id>/edit/', views.edit_invoice_view, name='edit-invoice'),
     path('invoice/<int:invoice_id>/delete/', views.delete_invoice_view, name='delete-invoice'),
     path('view/', views.view_invoices, name='view-invoices'),
     path('core/invoices/', views.get_invoices_api, name='core-get-invoices'),
+    path('reports/gstr1-hsn/', views.gstr1_hsn_summary_view, name='gstr1-hsn-summary'),
     path('api/buyer-details/', views.get_buyer_details, name='buyer-details'),
     path('api/hsn-descriptions/', views.get_hsn_descriptions, name='hsn-descriptions'),
+    path('api/autocomplete/', views.autocomplete_api, name='autocomplete'),
+    path('metrics', views.metrics_view, name='metrics'),
 
 ]
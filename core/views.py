@@ -1,13 +1,15 @@
 import os
+import csv
 import json
+import base64
+import binascii
 import traceback
 from io import BytesIO
 from decimal import Decimal
 from datetime import datetime
-from num2words import num2words
 from reportlab.lib import colors
-from django.db.models import Sum, F, Count
-from django.db.models.functions import TruncMonth
+from django.db.models import Sum, F, Count, Q
+from django.core.exceptions import ValidationError
 from django.conf import settings
 from rest_framework import status
 from django.db import transaction
@@ -17,18 +19,31 @@ from django.utils.timezone import now
 from django.forms import model_to_dict
 from reportlab.lib.pagesizes import A4
 from reportlab.pdfbase import pdfmetrics
-from .models import Invoice, InvoiceItem
+from .models import (
+    Buyer, Invoice, InvoiceItem, DailyInvoiceSummary, DailyBuyerRevenue, DailyItemRevenue, PdfExportJob,
+    PdfRenderJob,
+)
+from .db_routers import read_from_replica
+from .rollups import apply_invoice_delta, invoice_contribution
+from . import (
+    autocomplete, bulk_export, buyers, caching, closing, data_export, export_jobs, gst_reports, importer, metrics,
+    numbering, pdf_archive, pdf_cache, pdf_canvas, pdf_jobs, pdf_resources,
+)
 from rest_framework.response import Response
 from reportlab.pdfbase.ttfonts import TTFont
 from django.forms.models import model_to_dict
 from django.utils.dateparse import parse_date
 from rest_framework.authtoken.models import Token
-from django.http import HttpResponse, JsonResponse
+from django.http import FileResponse, Http404, HttpResponse, JsonResponse, StreamingHttpResponse
 from django.contrib.auth.decorators import login_required
 from django.core.serializers.json import DjangoJSONEncoder
 from reportlab.lib.enums import TA_CENTER, TA_RIGHT, TA_LEFT
 from django.shortcuts import get_object_or_404, render, redirect
-from rest_framework.permissions import AllowAny, IsAuthenticated
+from django.urls import reverse
+from django.core.handlers.asgi import ASGIRequest
+from asgiref.sync import sync_to_async
+from rest_framework.permissions import AllowAny, IsAdminUser, IsAuthenticated
+from rest_framework.authentication import SessionAuthentication, TokenAuthentication
 from rest_framework.decorators import api_view, permission_classes, authentication_classes
 from django.views.decorators.csrf import csrf_exempt, ensure_csrf_cookie
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
@@ -75,72 +90,83 @@ def login_api(request):
 @login_required
 def dashboard_view(request):
     today = date.today()
+    # The figures only change when invoice data does (or the day turns over).
+    # Computed on the primary: the cache key's generation is bumped as soon as
+    # a write commits, and figures read from a lagging replica would be cached
+    # under the new generation until it expires.
+    context = caching.get_or_set(
+        'dashboard', today.isoformat(), lambda: _dashboard_context(today), settings.DASHBOARD_CACHE_SECONDS,
+    )
+    return render(request, 'pages/dashboard/dashboard.html', context)
+
+
+def _dashboard_context(today):
     start_of_week = today - timedelta(days=today.weekday())
     start_of_month = today.replace(day=1)
 
 
-    if today.month >= 4:
-        start_of_financial_year = date(today.year, 4, 1)
-        end_of_financial_year = date(today.year + 1, 3, 31)
-    else:
-        start_of_financial_year = date(today.year - 1, 4, 1)
-        end_of_financial_year = date(today.year, 3, 31)
-
-    # --- Base QuerySets for each period ---
-    daily_invoices = Invoice.objects.filter(invoice_date=today)
-    weekly_invoices = Invoice.objects.filter(invoice_date__gte=start_of_week)
-    monthly_invoices = Invoice.objects.filter(invoice_date__gte=start_of_month)
-    yearly_invoices = Invoice.objects.filter(
-        invoice_date__range=[start_of_financial_year, end_of_financial_year]
+    start_of_financial_year, end_of_financial_year = numbering.financial_year_bounds(today)
+
+    # --- Per-day rollups covering this week, this month and this financial year ---
+    # Weekly and monthly figures have no upper bound, so later-dated rows count too.
+    daily_rows = list(
+        DailyInvoiceSummary.objects.filter(date__gte=min(start_of_week, start_of_financial_year))
+        .values('date', 'invoice_count', 'grand_total')
     )
 
-    # --- Calculations for Counts ---
-    daily_invoice_count = daily_invoices.count()
-    weekly_invoice_count = weekly_invoices.count()
-    monthly_invoice_count = monthly_invoices.count()
-    yearly_invoice_count = yearly_invoices.count()
+    def period_totals(rows):
+        rows = list(rows)
+        return sum(r['invoice_count'] for r in rows), sum((r['grand_total'] for r in rows), Decimal(0))
 
-    # --- Calculations for Amounts ---
-    # The 'or 0' handles cases where there are no invoices, preventing None
-    daily_amount_total = daily_invoices.aggregate(total=Sum('grand_total'))['total'] or 0
-    weekly_amount_total = weekly_invoices.aggregate(total=Sum('grand_total'))['total'] or 0
-    monthly_amount_total = monthly_invoices.aggregate(total=Sum('grand_total'))['total'] or 0
-    yearly_amount_total = yearly_invoices.aggregate(total=Sum('grand_total'))['total'] or 0
+    daily_invoice_count, daily_amount_total = period_totals(r for r in daily_rows if r['date'] == today)
+    weekly_invoice_count, weekly_amount_total = period_totals(r for r in daily_rows if r['date'] >= start_of_week)
+    monthly_invoice_count, monthly_amount_total = period_totals(r for r in daily_rows if r['date'] >= start_of_month)
+    yearly_rows = sorted(
+        (r for r in daily_rows if start_of_financial_year <= r['date'] <= end_of_financial_year),
+        key=lambda r: r['date']
+    )
+    yearly_invoice_count, yearly_amount_total = period_totals(yearly_rows)
 
     # --- Original calculations for summary cards (can be kept or simplified) ---
-    total_invoice_count = Invoice.objects.count()
-    total_invoiced_amount_agg = Invoice.objects.aggregate(total=Sum('grand_total'))
-    total_invoiced_amount = total_invoiced_amount_agg['total'] or 0
-    total_clients_count = Invoice.objects.values('buyer_name').distinct().count()
+    totals = DailyInvoiceSummary.objects.aggregate(count=Sum('invoice_count'), total=Sum('grand_total'))
+    total_invoice_count = totals['count'] or 0
+    total_invoiced_amount = totals['total'] or 0
+    total_clients_count = Buyer.objects.count()
 
-    # New clients this month
-    buyers_this_month = set(monthly_invoices.values_list('buyer_name', flat=True).distinct())
-    buyers_before_this_month = set(Invoice.objects.filter(invoice_date__lt=start_of_month).values_list('buyer_name', flat=True).distinct())
-    new_clients_count = len(buyers_this_month - buyers_before_this_month)
+    # New clients this month: buyers whose first invoice falls in it
+    new_clients_count = Buyer.objects.filter(first_invoice_date__gte=start_of_month).count()
 
     # --- Chart Data ---
     # Top 5 Clients by Revenue (All time or Yearly? Let's use Yearly for dashboard relevance)
-    top_clients_qs = yearly_invoices.values('buyer_name').annotate(total_revenue=Sum('grand_total')).order_by('-total_revenue')[:5]
+    top_clients_qs = (
+        DailyBuyerRevenue.objects.filter(date__range=[start_of_financial_year, end_of_financial_year])
+        .values('buyer_name').annotate(total_revenue=Sum('revenue')).order_by('-total_revenue')[:5]
+    )
     top_clients_labels = json.dumps([c['buyer_name'] for c in top_clients_qs], cls=DjangoJSONEncoder)
     top_clients_data = json.dumps([float(c['total_revenue'] or 0) for c in top_clients_qs])
 
     # Top 5 Products/Services by Revenue
-    top_items_qs = InvoiceItem.objects.filter(invoice__in=yearly_invoices).values('description').annotate(total_revenue=Sum(F('quantity') * F('rate'))).order_by('-total_revenue')[:5]
+    top_items_qs = (
+        DailyItemRevenue.objects.filter(date__range=[start_of_financial_year, end_of_financial_year])
+        .values('description').annotate(total_revenue=Sum('revenue')).order_by('-total_revenue')[:5]
+    )
     top_items_labels = json.dumps([i['description'] for i in top_items_qs], cls=DjangoJSONEncoder)
     top_items_data = json.dumps([float(i['total_revenue'] or 0) for i in top_items_qs])
 
-    # Revenue Trend (Monthly)
-    monthly_trend_qs = yearly_invoices.annotate(month=TruncMonth('invoice_date')).values('month').annotate(total_revenue=Sum('grand_total')).order_by('month')
-    trend_labels = json.dumps([c['month'].strftime('%b %Y') for c in monthly_trend_qs if c['month']], cls=DjangoJSONEncoder)
-    trend_data = json.dumps([float(c['total_revenue'] or 0) for c in monthly_trend_qs])
+    # Revenue and Invoice Count Trends (Monthly), folded from the yearly daily rows
+    monthly_trend = {}
+    for row in yearly_rows:
+        month = monthly_trend.setdefault(row['date'].replace(day=1), {'total_revenue': Decimal(0), 'invoice_count': 0})
+        month['total_revenue'] += row['grand_total']
+        month['invoice_count'] += row['invoice_count']
 
-    # Invoice Count Trend (Monthly)
-    monthly_count_qs = yearly_invoices.annotate(month=TruncMonth('invoice_date')).values('month').annotate(invoice_count=Count('id')).order_by('month')
-    count_labels = json.dumps([c['month'].strftime('%b %Y') for c in monthly_count_qs if c['month']], cls=DjangoJSONEncoder)
-    count_data = json.dumps([c['invoice_count'] for c in monthly_count_qs])
+    trend_labels = json.dumps([m.strftime('%b %Y') for m in monthly_trend], cls=DjangoJSONEncoder)
+    trend_data = json.dumps([float(m['total_revenue']) for m in monthly_trend.values()])
+    count_labels = trend_labels
+    count_data = json.dumps([m['invoice_count'] for m in monthly_trend.values()])
 
     # Recent 5 invoices based on created_on
-    recent_invoices = Invoice.objects.order_by('-created_on')[:5]
+    recent_invoices = list(Invoice.objects.order_by('-created_on')[:5])
 
     context = {
         # Original Stats for top cards
@@ -174,8 +200,7 @@ def dashboard_view(request):
         'count_data': count_data,
         'recent_invoices': recent_invoices,
     }
-
-    return render(request, 'pages/dashboard/dashboard.html', context)
+    return context
 # -------------------------------
 
 
@@ -187,6 +212,15 @@ def dashboard_view(request):
 
 
 def generate_invoice_pdf(invoice):
+    """Render an invoice with the PDF_RENDERER setting's renderer."""
+    if settings.PDF_RENDERER == 'canvas':
+        pdf_bytes = pdf_canvas.render(invoice)
+        if pdf_bytes is not None:
+            return pdf_bytes
+    return generate_invoice_pdf_platypus(invoice)
+
+
+def generate_invoice_pdf_platypus(invoice):
 
     buffer = BytesIO()
     doc = SimpleDocTemplate(
@@ -196,221 +230,21 @@ def generate_invoice_pdf(invoice):
     )
 
     # --- Configuration and Data Preparation ---
-    ITEMS_PER_PAGE = 8  
+    ITEMS_PER_PAGE = pdf_canvas.ITEMS_PER_PAGE
     D = Decimal
 
-    invoice_items = []
-    for item in invoice.items.all():
-        amount = item.quantity * item.rate
-        invoice_items.append({
-            "desc": item.description.upper() if item.description else "", "hsn": item.hsn_code,
-            "qty": item.quantity, "rate": D(item.rate),
-            "amount": D(amount), "gst_rate": D(item.gst_rate)
-        })
-
-    hsn_summary = {}
-    for item in invoice_items:
-        hsn = item['hsn']
-        if hsn not in hsn_summary:
-            hsn_summary[hsn] = {'taxable_value': D(0), 'gst_rate': item['gst_rate']}
-        hsn_summary[hsn]['taxable_value'] += item['amount']
-
-    # --- Reusable Styles ---
-    styles = getSampleStyleSheet()
-    style_normal = styles['Normal']
-    style_right = ParagraphStyle(name='right', parent=style_normal, alignment=TA_RIGHT)
-    style_bold_right = ParagraphStyle(name='bold_right', parent=style_normal, alignment=TA_RIGHT, fontName='Helvetica-Bold')
-    style_left_bold = ParagraphStyle(name='left_bold', parent=style_normal, fontName='Helvetica-Bold')
-
-     # --- Page Frame Drawer (Header/Footer) ---
-    def draw_page_frame(canvas, doc):
-        canvas.saveState()
-        page_num_str = f" (Page {canvas.getPageNumber()})" if doc.page > 1 else ""
-
-        # Outer Frame
-        canvas.setLineWidth(1)
-        canvas.rect(1 * cm, 1.5 * cm, A4[0] - 2 * cm, A4[1] - 3.5 * cm)
-
-        # Page Title
-        canvas.setFont('Helvetica-Bold', 16)
-        canvas.drawCentredString(10.5 * cm, 28 * cm, f"Tax Invoice{page_num_str}")
-
-        # Seller Details
-        canvas.setFont('Helvetica-Bold', 10)
-        canvas.drawString(1.2 * cm, 27 * cm, invoice.seller_name)
-        canvas.setFont('Helvetica', 9)
-        y = 26.45 * cm
-        for line in invoice.seller_address.split(','):
-             canvas.drawString(1.2 * cm, y, line.strip())
-             y -= 0.4 * cm
-        canvas.drawString(1.2 * cm, y, f"GSTIN/UIN: {invoice.seller_gstin}")
-        y -= 0.4 * cm
-        canvas.drawString(1.2 * cm, y, f"State Name: {invoice.seller_state}, Code: {invoice.seller_state_code}")
-
-        # Invoice Details Box
-        box_left, box_top, box_width, box_height = 10*cm, 27.7*cm, 10*cm, 4.8*cm
-        canvas.rect(box_left, box_top - box_height, box_width, box_height)
-        col_split = box_left + (box_width / 2)
-        row_height = 0.8 * cm
-        for i in range(1, 7):
-            canvas.line(box_left, box_top - i * row_height, box_left + box_width, box_top - i * row_height)
-        
-        # Vertical dividers (skip row 2)
-        canvas.line(col_split, box_top, col_split, box_top - row_height)
-        canvas.line(col_split, box_top - 2 * row_height, col_split, box_top - box_height)
-        
-        labels = [
-            ("Invoice No.", invoice.invoice_number, "Dated", invoice.invoice_date.strftime('%d-%b-%Y')),
-            ("E-way bill no", invoice.e_way_bill_no or "", None, None),
-            ("Mode/Terms of Payment", invoice.payment_mode or "", "Other References", ""),
-            ("Buyer's Order No.", "", "Dated", ""),
-            ("Dispatch Doc No.", "", "Delivery Note Date", ""),
-            ("Dispatched through", "", "Destination", "")
-        ]
-        canvas.setFont('Helvetica', 8)
-        text_padding_x = 4
-        text_padding_y = 7.5
-        for i, row_data in enumerate(labels):
-            y_text = box_top - i * row_height - text_padding_y
-            l1, v1, l2, v2 = row_data
-            
-            canvas.drawString(box_left + text_padding_x, y_text, l1)
-            canvas.setFont('Helvetica-Bold', 9)
-            canvas.drawString(box_left + text_padding_x, y_text - 11.5, str(v1))
-            canvas.setFont('Helvetica', 8)
-            
-            if l2 is not None:
-                canvas.drawString(col_split + text_padding_x, y_text, l2)
-                canvas.setFont('Helvetica-Bold', 9)
-                canvas.drawString(col_split + text_padding_x, y_text - 11.5, str(v2))
-                canvas.setFont('Helvetica', 8)
-        canvas.drawString(box_left + text_padding_x, (box_top - box_height - 0.4 * cm), "Terms of Delivery")
-
-        # --- CORRECTED Buyer & Transport Details ---
-        # Main container box for the sections
-        box_left, box_bottom, box_width, box_height = 1 * cm, 19.8 * cm, 9 * cm, 4.5 * cm
-        canvas.rect(box_left, box_bottom, box_width, box_height, stroke=1, fill=0)
-
-        text_x = 1.2 * cm
-        line_spacing = 0.35 * cm  
-        top_padding = 0.35 * cm
-
-        has_transport = bool(getattr(invoice, 'transport_name', '') or getattr(invoice, 'transport_gstin', '') or getattr(invoice, 'transport_address', ''))
-
-        if has_transport:
-            section_height = box_height / 2
-            divider_y = box_bottom + section_height
-            canvas.line(box_left, divider_y, box_left + box_width, divider_y)
-            
-            # Buyer section (Top half)
-            y = box_bottom + box_height - top_padding
-            canvas.setFont('Helvetica', 9)
-            canvas.drawString(text_x, y, "Buyer (Bill to)")
-            y -= (line_spacing + 0.15 * cm)
-            canvas.setFont('Helvetica-Bold', 10)
-            canvas.drawString(text_x, y, getattr(invoice, 'buyer_name', '').upper())
-            y -= (line_spacing + 0.15 * cm)
-            canvas.setFont('Helvetica', 9)
-            if getattr(invoice, 'buyer_address', ''):
-                canvas.drawString(text_x, y, getattr(invoice, 'buyer_address', '').upper())
-                y -= line_spacing
-            if getattr(invoice, 'buyer_gstin', ''):
-                canvas.drawString(text_x, y, f"GSTIN/UIN: {getattr(invoice, 'buyer_gstin', '').upper()}")
-                y -= line_spacing
-            canvas.drawString(text_x, y, f"Place of Supply: {getattr(invoice, 'place_of_supply', '').upper()}")
-
-            # Transport section (Bottom half)
-            y = box_bottom + section_height - top_padding
-            canvas.setFont('Helvetica', 9)
-            canvas.drawString(text_x, y, "Transport Details")
-            y -= (line_spacing + 0.15 * cm)
-            canvas.setFont('Helvetica-Bold', 10)
-            canvas.drawString(text_x, y, getattr(invoice, 'transport_name', '').upper())
-            y -= (line_spacing + 0.15 * cm)
-            canvas.setFont('Helvetica', 9)
-            if getattr(invoice, 'transport_gstin', ''):
-                canvas.drawString(text_x, y, f"GSTIN/UIN: {getattr(invoice, 'transport_gstin', '').upper()}")
-                y -= line_spacing
-            if getattr(invoice, 'transport_address', ''):
-                canvas.drawString(text_x, y, f"Address: {getattr(invoice, 'transport_address', '').upper()}")
-        else:
-            # Buyer section (Full box)
-            y = box_bottom + box_height - top_padding
-            canvas.setFont('Helvetica', 9)
-            canvas.drawString(text_x, y, "Buyer (Bill to)")
-            y -= (line_spacing + 0.15 * cm)
-            canvas.setFont('Helvetica-Bold', 10)
-            canvas.drawString(text_x, y, getattr(invoice, 'buyer_name', '').upper())
-            y -= (line_spacing + 0.15 * cm)
-            canvas.setFont('Helvetica', 9)
-            
-            if getattr(invoice, 'buyer_address', ''):
-                for line in getattr(invoice, 'buyer_address', '').split(','):
-                    if line.strip():
-                        canvas.drawString(text_x, y, line.strip().upper())
-                        y -= line_spacing
-            
-            if getattr(invoice, 'buyer_gstin', ''):
-                canvas.drawString(text_x, y, f"GSTIN/UIN: {getattr(invoice, 'buyer_gstin', '').upper()}")
-                y -= line_spacing
-            canvas.drawString(text_x, y, f"Place of Supply: {getattr(invoice, 'place_of_supply', '').upper()}")
-        # --- END OF CORRECTION ---
-
-        # Declaration and Signature Box
-
-        page_width = A4[0]
-        footer_y = 1.5 * cm
-        left_x = 1.2 * cm
-
-        canvas.setFont('Helvetica-Bold', 10)
-        declaration_title = "Declaration"
-        canvas.drawString(left_x, footer_y + 3 * cm, declaration_title)
-        text_width = canvas.stringWidth(declaration_title, 'Helvetica-Bold', 10)
-        canvas.line(left_x, footer_y + 2.9 * cm, left_x + text_width, footer_y + 2.9 * cm)
-        declaration_text = ["We declare that this invoice shows the actual price of the goods described and that all particulars are true and correct."]
-        text_obj = canvas.beginText(left_x, footer_y + 2.5 * cm)
-        text_obj.setFont("Helvetica", 9)
-        text_obj.setLeading(12)
-        for line in declaration_text: text_obj.textLine(line)
-        canvas.drawText(text_obj)
-        
-        # --- Bank Details Box on the left bottom ---
-        bank_box_width = 9.7 * cm
-        bank_box_height = 2.2 * cm
-        bank_x = 1 * cm
-        bank_y = footer_y  # same baseline as declaration box
-
-        # Draw rectangle for bank details box
-        canvas.rect(bank_x, bank_y, bank_box_width, bank_box_height)
-
-        # Bank details title
-        canvas.setFont('Helvetica-Bold', 10)
-        canvas.drawString(bank_x + 0.3 * cm, bank_y + bank_box_height - 0.4 * cm, "Bank Details")
+    invoice_items, hsn_summary = pdf_canvas.invoice_lines(invoice)
 
-        # Bank details content (adjust these to your invoice attributes or static text)
-        canvas.setFont('Helvetica', 9)
-        line_height = 0.4 * cm
-        start_y = bank_y + bank_box_height - 0.8 * cm
+    # --- Reusable Styles (built once per worker) ---
+    styles = pdf_resources.get_styles()
+    style_normal = styles['normal']
+    style_right = styles['right']
+    style_bold_right = styles['bold_right']
+    style_left_bold = styles['left_bold']
 
-        canvas.drawString(bank_x + 0.3 * cm, start_y, "Beneficiary Name    : KAVIN TEX")
-        canvas.drawString(bank_x + 0.3 * cm, start_y - line_height, "Bank A/c. No.          : 292700050900034")
-        canvas.drawString(bank_x + 0.3 * cm, start_y - 2 * line_height, "Name of the Bank   : TMBL")
-        canvas.drawString(bank_x + 0.3 * cm, start_y - 3 * line_height, "IFSC Code              : TMBL0000292")
-
-        
-        right_box_width = 9.3 * cm
-        right_box_height = 2.2 * cm
-        right_x = page_width - right_box_width - 1 * cm
-        canvas.rect(right_x, footer_y, right_box_width, right_box_height)
-        canvas.setFont('Helvetica-Bold', 10)
-        canvas.drawRightString(right_x + right_box_width - 0.3 * cm, footer_y + 1.7 * cm, f"for {invoice.seller_name}")
-        canvas.setFont('Helvetica', 9)
-        canvas.drawRightString(right_x + right_box_width - 0.3 * cm, footer_y + 0.4 * cm, "Authorised Signatory")
-
-        canvas.setFont('Helvetica', 9)
-        canvas.drawCentredString(10.5 * cm, 1 * cm, "This is a Computer Generated Invoice")
-        
-        canvas.restoreState()
+    # --- Page Frame (Header/Footer), shared with the canvas renderer ---
+    def draw_page_frame(canvas, doc):
+        pdf_canvas.draw_page_frame(canvas, invoice)
 
     # --- Build Story ---
     story = []
@@ -463,26 +297,9 @@ def generate_invoice_pdf(invoice):
                 table_data.append(['', Paragraph("Round Off", style_right), '', '', '', '', Paragraph(f"{invoice.round_off:.2f}", style_right)])
             
             total_qty = sum(item['qty'] for item in invoice_items)
-            
-  
-            # pdfmetrics.registerFont(TTFont('DejaVuSans', 'DejaVuSans.ttf'))
-            # Use the actual location based on your structure
-            font_path = os.path.join(
-                settings.BASE_DIR,
-                'core',
-                'static',
-                'assets',
-                'fonts',
-                'DejaVuSans',
-                'DejaVuSans.ttf'
-            )
-
-            # Optional: Check file exists before registering
-            if not os.path.exists(font_path):
-                raise FileNotFoundError(f"Font file not found at: {font_path}")
-
-            # Register the font
-            pdfmetrics.registerFont(TTFont('DejaVuSans', font_path))
+
+            # The rupee sign needs DejaVuSans, registered once per worker
+            pdf_resources.ensure_fonts()
 
             table_data.append([
                 '', 
@@ -496,7 +313,7 @@ def generate_invoice_pdf(invoice):
 
             # =========================================================================
 
-        item_table = Table(table_data, colWidths=[1.5*cm, 6.8*cm, 2*cm, 2.3*cm, 2.1*cm, 1.3*cm, 3*cm])
+        item_table = Table(table_data, colWidths=pdf_canvas.ITEM_COL_WIDTHS)
         item_table.setStyle(TableStyle([
             ('GRID', (0, 0), (-1, -1), 1, colors.black), ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
             ('ALIGN', (0, 1), (0, -1), 'CENTER'), ('ALIGN', (2, 1), (2, -1), 'CENTER'), ('ALIGN', (5, 1), (5, -1), 'CENTER'),
@@ -523,12 +340,12 @@ def generate_invoice_pdf(invoice):
         header1 = [Paragraph(f"<b>{h}</b>", style_normal) for h in ["HSN", "Taxable Value", "Central Tax (CGST)", "", "State Tax (SGST)", "", "Total Tax"]]
         header2 = ['', '', Paragraph("<b>Rate</b>", style_normal), Paragraph("<b>Amount</b>", style_normal), Paragraph("<b>Rate</b>", style_normal), Paragraph("<b>Amount</b>", style_normal), '']
         tax_summary_data.extend([header1, header2])
-        col_widths = [3*cm, 3*cm, 2*cm, 2.5*cm, 2*cm, 2.5*cm, 4*cm]
+        col_widths = pdf_canvas.INTRA_STATE_COL_WIDTHS
     else:
         header1 = [Paragraph(f"<b>{h}</b>", style_normal) for h in ["HSN", "Taxable Value", "Integrated Tax (IGST)", "", "Total Tax"]]
         header2 = ['', '', Paragraph("<b>Rate</b>", style_normal), Paragraph("<b>Amount</b>", style_normal), '']
         tax_summary_data.extend([header1, header2])
-        col_widths = [4*cm, 4*cm, 3*cm, 4*cm, 4*cm]
+        col_widths = pdf_canvas.INTER_STATE_COL_WIDTHS
 
     total_taxable_value, total_cgst, total_sgst, total_igst = (D(0), D(0), D(0), D(0))
     for hsn, data in hsn_summary.items():
@@ -536,12 +353,12 @@ def generate_invoice_pdf(invoice):
         total_taxable_value += taxable_value
         row = [hsn, Paragraph(f"{taxable_value:.2f}", style_right)]
         if is_intra_state:
-            cgst_amount = (taxable_value * (gst_rate / 2) / 100).quantize(D("0.01"))
+            cgst_amount = (data['tax'] / 2).quantize(D("0.01"))
             total_cgst += cgst_amount
             total_sgst += cgst_amount
             row.extend([f"{gst_rate/2:.2f}%", Paragraph(f"{cgst_amount:.2f}", style_right), f"{gst_rate/2:.2f}%", Paragraph(f"{cgst_amount:.2f}", style_right), Paragraph(f"{cgst_amount * 2:.2f}", style_right)])
         else:
-            igst_amount = (taxable_value * gst_rate / 100).quantize(D("0.01"))
+            igst_amount = data['tax'].quantize(D("0.01"))
             total_igst += igst_amount
             row.extend([f"{gst_rate:.2f}%", Paragraph(f"{igst_amount:.2f}", style_right), Paragraph(f"{igst_amount:.2f}", style_right)])
         tax_summary_data.append(row)
@@ -570,18 +387,13 @@ def generate_invoice_pdf(invoice):
     story.append(Spacer(1, 0.5 * cm))
 
     # Tax in Words
-    total_tax_integer = int(total_tax)
-    total_tax_paisa = int((total_tax - total_tax_integer) * 100)
-    tax_words = num2words(total_tax_integer, lang='en_IN').title()
-    if total_tax_paisa > 0:
-        tax_words += " and " + num2words(total_tax_paisa, lang='en_IN').title() + " Paisa"
-    tax_words += " Only"
-    story.append(Paragraph(f"Tax Amount (in words): <b>INR {tax_words}</b>", style_normal))
+    story.append(Paragraph(f"Tax Amount (in words): <b>INR {pdf_canvas.tax_in_words(total_tax)}</b>", style_normal))
 
     # --- Build the PDF document ---
-    doc.build(story, onFirstPage=draw_page_frame, onLaterPages=draw_page_frame)
-    
-    pdf_bytes = buffer.getvalue()
+    with metrics.pdf_build() as build:
+        doc.build(story, onFirstPage=draw_page_frame, onLaterPages=draw_page_frame)
+        pdf_bytes = buffer.getvalue()
+        build['size'] = len(pdf_bytes)
     buffer.close()
     return pdf_bytes
 
@@ -592,8 +404,23 @@ def generate_invoice_pdf(invoice):
 def generate_invoice_pdf_view(request, invoice_id):
  
     invoice = get_object_or_404(Invoice, pk=invoice_id)
-    
-    pdf_bytes = generate_invoice_pdf(invoice)
+
+    # Closed years are served as archived when they were closed
+    pdf_bytes = pdf_archive.get(invoice)
+    if pdf_bytes is None and settings.PDF_RENDER_ASYNC and pdf_cache.is_enabled():
+        # Rendering happens in run_pdf_worker; only serve what is already cached
+        pdf_bytes = pdf_cache.get(invoice.pk, pdf_cache.cache_key(invoice))
+        if pdf_bytes is None:
+            job = pdf_jobs.enqueue(invoice.pk)
+            status_url = reverse('pdf-job-status', args=[job.pk])
+            if request.GET.get('format') == 'json' or 'application/json' in request.headers.get('Accept', ''):
+                return JsonResponse({'job_id': job.pk, 'status': job.status, 'status_url': status_url}, status=202)
+            return render(request, 'pages/invoice/pdf_pending.html', {
+                'invoice': invoice,
+                'status_url': status_url,
+            }, status=202)
+    elif pdf_bytes is None:
+        pdf_bytes = pdf_cache.get_or_render(invoice, generate_invoice_pdf)
 
     disposition = 'attachment' if request.GET.get('download') else 'inline'
 
@@ -602,26 +429,155 @@ def generate_invoice_pdf_view(request, invoice_id):
 
     return response
 
-    
+
+@login_required
+def pdf_job_status_view(request, job_id):
+    job = get_object_or_404(PdfRenderJob, pk=job_id)
+    return JsonResponse({
+        'job_id': job.pk,
+        'invoice_id': job.invoice_id,
+        'status': job.status,
+        'attempts': job.attempts,
+        'pdf_url': reverse('generate-invoice-pdf', args=[job.invoice_id]),
+    })
+
+
+# ------------------------- Streamed Downloads -------------------------
+def _streaming_body(request, chunks):
+    """
+    The response body for a blocking iterator of chunks. Under ASGI a sync
+    iterator would be read to the end before the first byte went out, so
+    there each chunk is produced in the sync thread (where the view's
+    database connection lives) and handed over one by one.
+    """
+    if not isinstance(request, ASGIRequest):
+        return chunks
+    return _astream_chunks(iter(chunks))
+
+
+async def _astream_chunks(chunks):
+    read = sync_to_async(next, thread_sensitive=True)
+    try:
+        while (chunk := await read(chunks, None)) is not None:
+            yield chunk
+    finally:
+        if hasattr(chunks, 'close'):
+            await sync_to_async(chunks.close, thread_sensitive=True)()
+
+
+# ------------------------- Bulk PDF Export -------------------------
+@login_required
+def export_invoice_pdfs_view(request):
+    """
+    Queue a ZIP of PDFs (format=zip) or one merged PDF (format=pdf) of every
+    invoice in a date range. run_export_worker builds it; the page returned
+    polls the job and downloads the file once it is ready (JSON clients get
+    the job's status URL). Takes the same from_date/to_date filters as
+    get_invoices_api and falls back to the range saved in the session.
+    """
+    export_format = request.GET.get('format', 'zip')
+    if export_format not in bulk_export.EXPORT_FORMATS:
+        return JsonResponse({'error': 'format must be "zip" or "pdf"'}, status=400)
+
+    from_date_str = request.GET.get('from_date', request.session.get('invoice_from_date', '')).strip()
+    to_date_str = request.GET.get('to_date', request.session.get('invoice_to_date', '')).strip()
+    if not Invoice.objects.in_date_range(from_date_str, to_date_str).exists():
+        return JsonResponse({'error': 'No invoices found for the selected dates.'}, status=404)
+
+    job = export_jobs.enqueue(export_format, from_date_str, to_date_str, request.user)
+    status_url = reverse('pdf-export-status', args=[job.pk])
+    if 'application/json' in request.headers.get('Accept', ''):
+        return JsonResponse({'job_id': job.pk, 'status': job.status, 'status_url': status_url}, status=202)
+    return render(request, 'pages/invoice/export_pending.html', {'job': job, 'status_url': status_url}, status=202)
+
+
+@login_required
+def pdf_export_status_view(request, job_id):
+    job = get_object_or_404(PdfExportJob, pk=job_id)
+    return JsonResponse({
+        'job_id': job.pk,
+        'format': job.format,
+        'status': job.status,
+        'invoice_count': job.invoice_count,
+        'rendered': job.rendered,
+        'download_url': reverse('pdf-export-download', args=[job.pk]) if job.status == PdfExportJob.STATUS_DONE else None,
+    })
+
+
+@login_required
+def pdf_export_download_view(request, job_id):
+    job = get_object_or_404(PdfExportJob, pk=job_id, status=PdfExportJob.STATUS_DONE)
+    try:
+        export = open(export_jobs.output_path(job), 'rb')
+    except FileNotFoundError:
+        raise Http404("This export has expired.")
+    _, content_type = bulk_export.EXPORT_FORMATS[job.format]
+    response = FileResponse(export, as_attachment=True, filename=job.filename, content_type=content_type)
+    if isinstance(request, ASGIRequest):
+        # Headers are already set from the file; only the body is swapped for one ASGI streams
+        response.streaming_content = _streaming_body(request, iter(lambda: export.read(response.block_size), b''))
+    return response
+
+
+@login_required
+def export_invoice_data_view(request):
+    """
+    Stream every invoice item in a date range for reconciliation, as
+    format=csv (default), xlsx or parquet. Same date filters and session
+    fallback as export_invoice_pdfs_view.
+    """
+    export_format = request.GET.get('format', 'csv')
+    if export_format not in data_export.EXPORT_FORMATS:
+        return JsonResponse({'error': f"format must be one of {', '.join(data_export.EXPORT_FORMATS)}"}, status=400)
+
+    from_date_str = request.GET.get('from_date', request.session.get('invoice_from_date', '')).strip()
+    to_date_str = request.GET.get('to_date', request.session.get('invoice_to_date', '')).strip()
+
+    stream, content_type = data_export.EXPORT_FORMATS[export_format]
+    try:
+        body = stream(data_export.export_rows(from_date_str, to_date_str))
+    except data_export.ExportUnavailable as e:
+        return JsonResponse({'error': str(e)}, status=501)
+
+    filename = f"invoice_items_{from_date_str or 'start'}_to_{to_date_str or 'end'}.{export_format}"
+    response = StreamingHttpResponse(_streaming_body(request, body), content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+
+# ------------------------- GST Reports -------------------------
+@login_required
+@read_from_replica
+def gstr1_hsn_summary_view(request):
+    """
+    GSTR-1 HSN-wise summary, B2B and B2C, per month plus period totals.
+    Period is fy=2025 (for 2025-26) and/or from_month/to_month as YYYY-MM,
+    defaulting to the current financial year. format=json (default) or csv.
+    """
+    try:
+        first, last = gst_reports.parse_period(
+            request.GET.get('fy', ''), request.GET.get('from_month', ''), request.GET.get('to_month', ''),
+        )
+    except ValueError:
+        return JsonResponse({'error': 'Use fy=YYYY and/or from_month/to_month as YYYY-MM'}, status=400)
+
+    summary = gst_reports.hsn_summary(first, last)
+    if request.GET.get('format') == 'csv':
+        response = HttpResponse(content_type='text/csv')
+        response['Content-Disposition'] = f'attachment; filename="gstr1_hsn_{first:%Y-%m}_to_{last:%Y-%m}.csv"'
+        csv.writer(response).writerows(gst_reports.csv_rows(summary))
+        return response
+    return JsonResponse(summary, encoder=DjangoJSONEncoder)
+
+INVOICE_ITEM_FIELDS = ('description', 'hsn_code', 'quantity', 'rate', 'gst_rate')
+
+
 @login_required
 def invoice_view(request):
     if request.method == 'GET':
-
-        latest_invoice = Invoice.objects.order_by('-id').first()
-        
-        if latest_invoice and latest_invoice.invoice_number:
-            try:
-                parts = latest_invoice.invoice_number.split('-')
-                number = int(parts[-1]) + 1
-            except (ValueError, IndexError):
-                number = 1
-        else:
-            number = 1
-        current_year = datetime.now().year
-        next_invoice_number = f"INV/{current_year}-{number:03d}"  
-        
+        # Preview only: the number is allocated when the invoice is saved
         return render(request, 'pages/invoice/invoice.html', {
-            'next_invoice_number': next_invoice_number
+            'next_invoice_number': numbering.peek(date.today())
         })
 
     elif request.method == 'POST':
@@ -631,14 +587,15 @@ def invoice_view(request):
             with transaction.atomic():
                 invoice_date_str = data.get('invoice_date')
                 invoice_date_obj = datetime.strptime(invoice_date_str, '%d-%m-%Y').date()
+                closing.ensure_open(invoice_date_obj)
 
                 # --- Compute grand_total and round_off BEFORE creating the invoice ---
                 raw_grand_total = float(data.get('grand_total', 0.0))
                 rounded_grand_total = round(raw_grand_total)
                 round_off = round(rounded_grand_total - raw_grand_total, 2)
 
-                invoice = Invoice.objects.create(
-                    invoice_number=data.get('invoice_number'),
+                invoice = Invoice(
+                    invoice_number=numbering.allocate(invoice_date_obj),
                     invoice_date=invoice_date_obj,
                     seller_name=data.get('seller_name'),
                     seller_address=data.get('seller_address'),
@@ -664,27 +621,72 @@ def invoice_view(request):
                     total_in_words=data.get('total_in_words'),
                     created_by=request.user
                 )
+                buyers.link([invoice])
+                invoice.save()
 
+                InvoiceItem.objects.bulk_create([
+                    InvoiceItem(invoice=invoice, **{f: item_data.get(f) for f in INVOICE_ITEM_FIELDS})
+                    for item_data in data.get('items', [])
+                ])
 
-                items_data = data.get('items', [])
-                for item_data in items_data:
-                    InvoiceItem.objects.create(
-                        invoice=invoice,
-                        description=item_data.get('description'),
-                        hsn_code=item_data.get('hsn_code'),
-                        quantity=item_data.get('quantity'),
-                        rate=item_data.get('rate'),
-                        gst_rate=item_data.get('gst_rate')
-                    )
+                apply_invoice_delta(new=invoice_contribution(invoice.id))
+                gst_reports.invalidate(invoice.invoice_date)
+                pdf_jobs.enqueue_on_commit(invoice.id)
+                autocomplete.refresh_on_commit()
 
-            return JsonResponse({'message': 'Invoice created successfully!', 'invoice_id': invoice.id}, status=201)
+            return JsonResponse({
+                'message': 'Invoice created successfully!',
+                'invoice_id': invoice.id,
+                'invoice_number': invoice.invoice_number,
+            }, status=201)
 
+        except closing.YearClosed as e:
+            return JsonResponse({'error': str(e)}, status=403)
         except Exception as e:
             traceback.print_exc()
             return JsonResponse({'error': f'An unexpected error occurred: {str(e)}'}, status=500)
 
     return JsonResponse({'error': 'Method not allowed'}, status=405)
 
+# ------------------------- Bulk Import -------------------------
+IMPORT_MAX_ERRORS = 1000
+
+
+@login_required
+def import_invoices_view(request):
+    """
+    POST a CSV or JSON Lines file as ``file`` (multipart). The format comes
+    from ``format`` or the file extension; ``chunk_size`` sets invoices per
+    transaction and ``dry_run=true`` validates without saving.
+    """
+    if request.method != 'POST':
+        return JsonResponse({'error': 'Method not allowed'}, status=405)
+
+    upload = request.FILES.get('file')
+    if upload is None:
+        return JsonResponse({'error': 'file is required'}, status=400)
+    fmt = request.POST.get('format') or importer.format_for_filename(upload.name)
+    if fmt not in importer.FORMATS:
+        return JsonResponse({'error': f"format must be one of {', '.join(importer.FORMATS)}"}, status=400)
+    try:
+        chunk_size = int(request.POST.get('chunk_size', importer.DEFAULT_CHUNK_SIZE))
+        if chunk_size < 1:
+            raise ValueError
+    except ValueError:
+        return JsonResponse({'error': 'chunk_size must be a positive integer'}, status=400)
+
+    try:
+        result = importer.import_invoices(
+            importer.READERS[fmt](importer.open_text(upload.file)),
+            user=request.user, chunk_size=chunk_size,
+            dry_run=request.POST.get('dry_run') == 'true',
+        )
+    except (UnicodeDecodeError, csv.Error) as e:
+        return JsonResponse({'error': f'Could not read file: {e}'}, status=400)
+
+    http_status = 201 if result.created else 400 if result.errors else 200
+    return JsonResponse(result.as_dict(max_errors=IMPORT_MAX_ERRORS), status=http_status, encoder=DjangoJSONEncoder)
+
 # -----------------------
 
 @login_required
@@ -693,102 +695,217 @@ def view_invoices(request):
     to_date = request.session.get('invoice_to_date', '')
     return render(request, 'pages/invoice/view-invoices.html', {
         'from_date': from_date,
-        'to_date': to_date
+        'to_date': to_date,
+        'page_size': INVOICE_PAGE_SIZE,
+        'page_size_options': [50, 100, 250, 500, INVOICE_MAX_PAGE_SIZE],
     })
 
 
+INVOICE_LIST_FIELDS = ('id', 'invoice_number', 'buyer_name', 'invoice_date', 'grand_total')
+INVOICE_SORT_FIELDS = INVOICE_LIST_FIELDS
+INVOICE_PAGE_SIZE = 100
+INVOICE_MAX_PAGE_SIZE = 1000
+
+
 @login_required
-def get_invoices_api(request):
+@read_from_replica
+async def get_invoices_api(request):
     """
     API endpoint to get invoices.
     Can be filtered by from_date, to_date, or both.
+    Also filters by buyer, gstin, number (prefix), item (description or HSN)
+    and min_amount/max_amount, and sorts by any listed column (sort=buyer_name,
+    sort=-grand_total, ...; newest first by default).
+    Returns one page of page_size invoices; pass the returned next_cursor back
+    as cursor for the next page. stream=true returns every matching invoice in
+    a single streamed response instead.
+    Async: under ASGI (SERVER_MODE=asgi) the list waits on the database
+    without holding up a worker.
     """
+    session = request.session
     if request.GET.get('clear') == 'true':
-        request.session.pop('invoice_from_date', None)
-        request.session.pop('invoice_to_date', None)
-        request.session.modified = True
+        await session.apop('invoice_from_date', None)
+        await session.apop('invoice_to_date', None)
+        session.modified = True
         return JsonResponse({'invoices': []})
     else:
         if 'from_date' in request.GET or 'to_date' in request.GET:
             from_date_str = request.GET.get('from_date', '').strip()
             to_date_str = request.GET.get('to_date', '').strip()
             if from_date_str:
-                request.session['invoice_from_date'] = from_date_str
+                await session.aset('invoice_from_date', from_date_str)
             else:
-                request.session.pop('invoice_from_date', None)
+                await session.apop('invoice_from_date', None)
 
             if to_date_str:
-                request.session['invoice_to_date'] = to_date_str
+                await session.aset('invoice_to_date', to_date_str)
             else:
-                request.session.pop('invoice_to_date', None)
-            request.session.modified = True
+                await session.apop('invoice_to_date', None)
+            session.modified = True
         else:
-            from_date_str = request.session.get('invoice_from_date', '')
-            to_date_str = request.session.get('invoice_to_date', '')
+            from_date_str = await session.aget('invoice_from_date', '')
+            to_date_str = await session.aget('invoice_to_date', '')
+
+    # Start with the base queryset, fetching only the columns the list shows
+    try:
+        filters = _parse_invoice_filters(request.GET)
+        sort = request.GET.get('sort', '-id')
+        descending = sort.startswith('-')
+        sort_field = sort[1:] if descending else sort
+        if sort_field not in INVOICE_SORT_FIELDS:
+            raise ValueError(f"sort must be one of {', '.join(INVOICE_SORT_FIELDS)}, optionally prefixed with '-'")
+        page_size = int(request.GET.get('page_size', INVOICE_PAGE_SIZE))
+        if not 1 <= page_size <= INVOICE_MAX_PAGE_SIZE:
+            raise ValueError(f"page_size must be between 1 and {INVOICE_MAX_PAGE_SIZE}")
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+
+    direction = '-' if descending else ''
+    invoices = (
+        Invoice.objects.in_date_range(from_date_str, to_date_str)
+        .search(**filters)
+        .order_by(*dict.fromkeys([f'{direction}{sort_field}', f'{direction}id']))
+        .values(*INVOICE_LIST_FIELDS)
+    )
 
-    # Start with the base queryset
-    invoices = Invoice.objects.all().order_by('-id')
+    # stream=true: every matching invoice, written out as the rows are read
+    if request.GET.get('stream') == 'true':
+        # Each server streams its own kind of iterator without buffering it first
+        stream = _astream_invoice_list if isinstance(request, ASGIRequest) else _stream_invoice_list
+        return StreamingHttpResponse(stream(invoices), content_type='application/json')
 
-    if from_date_str:
+    # Otherwise one keyset page, continuing after the row the cursor points at
+    cursor = request.GET.get('cursor')
+    if cursor:
         try:
-            from_date = parse_date(from_date_str)
-            if from_date:
-                invoices = invoices.filter(invoice_date__gte=from_date)
-        except (ValueError, TypeError):
-            pass
+            invoices = invoices.filter(_keyset_after(cursor, sort_field, descending))
+        except ValueError:
+            return JsonResponse({'error': 'Invalid cursor'}, status=400)
 
-    if to_date_str:
+    rows = [row async for row in invoices[:page_size + 1]]
+    has_more = len(rows) > page_size
+    rows = rows[:page_size]
+
+    return JsonResponse({
+        'invoices': [_serialize_invoice_row(row) for row in rows],
+        'next_cursor': _encode_cursor(rows[-1], sort_field) if has_more else None,
+    })
+
+
+def _parse_invoice_filters(params):
+    """Read the invoice list's search parameters into InvoiceQuerySet.search() arguments."""
+    def amount(name):
+        value = params.get(name, '').strip()
+        if not value:
+            return None
         try:
-            to_date = parse_date(to_date_str)
-            if to_date:
-                invoices = invoices.filter(invoice_date__lte=to_date)
-        except (ValueError, TypeError):
-            pass
-            
-    # Serialize the final filtered data
-    data = [{
-        'id': invoice.id,
-        'invoice_number': invoice.invoice_number,
-        'buyer_name': invoice.buyer_name,
-        'invoice_date': invoice.invoice_date.strftime('%Y-%m-%d'),
-        'grand_total': str(invoice.grand_total),
-    } for invoice in invoices]
-              
-    return JsonResponse({'invoices': data})
+            number = Decimal(value)
+            # NaN and Infinity parse, but the query would reject them later
+            if not number.is_finite():
+                raise ValueError
+            return Invoice._meta.get_field('grand_total').to_python(number)
+        except (ArithmeticError, ValueError, ValidationError):
+            raise ValueError(f"{name} must be a number")
+
+    return {
+        'buyer': params.get('buyer', '').strip(),
+        'gstin': params.get('gstin', '').strip(),
+        'number': params.get('number', '').strip(),
+        'item': params.get('item', '').strip(),
+        'min_amount': amount('min_amount'),
+        'max_amount': amount('max_amount'),
+    }
+
+
+def _encode_cursor(row, sort_field):
+    payload = json.dumps([row[sort_field], row['id']], cls=DjangoJSONEncoder)
+    return base64.urlsafe_b64encode(payload.encode()).decode()
+
+
+def _keyset_after(cursor, sort_field, descending):
+    """Q object selecting the rows that come after ``cursor`` in the current sort order."""
+    try:
+        value, last_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        value = Invoice._meta.get_field(sort_field).to_python(value)
+        last_id = int(last_id)
+    except (TypeError, ValueError, binascii.Error, ValidationError):
+        raise ValueError('Invalid cursor')
+
+    op = 'lt' if descending else 'gt'
+    if sort_field == 'id':
+        return Q(**{f'id__{op}': last_id})
+    return Q(**{f'{sort_field}__{op}': value}) | Q(**{sort_field: value, f'id__{op}': last_id})
+
+
+def _serialize_invoice_row(row):
+    return {
+        'id': row['id'],
+        'invoice_number': row['invoice_number'],
+        'buyer_name': row['buyer_name'],
+        'invoice_date': row['invoice_date'].strftime('%Y-%m-%d'),
+        'grand_total': str(row['grand_total']),
+    }
+
+
+def _stream_invoice_list(invoices):
+    yield '{"invoices": ['
+    for i, row in enumerate(invoices.iterator(chunk_size=2000)):
+        yield (',' if i else '') + json.dumps(_serialize_invoice_row(row))
+    yield '], "next_cursor": null}'
 
 
+async def _astream_invoice_list(invoices):
+    yield '{"invoices": ['
+    i = 0
+    async for row in invoices.aiterator(chunk_size=2000):
+        yield (',' if i else '') + json.dumps(_serialize_invoice_row(row))
+        i += 1
+    yield '], "next_cursor": null}'
 
-def get_buyer_details(request):
-    print("get_buyer_details called")
+
+@read_from_replica
+async def get_buyer_details(request):
     if not request.GET.get('gstin'):
         return JsonResponse({'error': 'GSTIN parameter is required'}, status=400)
     gstin = request.GET.get('gstin', '').strip()
-    print(f"Received GSTIN: {gstin}")
     try:
-        invoices = Invoice.objects.filter(buyer_gstin__iexact=gstin).values(
-            'buyer_name', 'buyer_address', 'place_of_supply'
-        ).distinct()
-        print(f"Found {invoices.count()} distinct records for GSTIN: {gstin}")
-        
-        buyers = list(invoices)
-        if buyers:
-            return JsonResponse({'buyers': buyers})
-        else:
-            return JsonResponse({'buyers': []})
+        return JsonResponse({'buyers': await autocomplete.abuyers_for_gstin(gstin)})
     except Exception as e:
         return JsonResponse({'error': str(e)}, status=400)
 
-def get_hsn_descriptions(request):
+@read_from_replica
+async def get_hsn_descriptions(request):
     hsn = request.GET.get('hsn')
     if not hsn:
         return JsonResponse({'error': 'HSN parameter is required'}, status=400)
     
     try:
-        descriptions = list(InvoiceItem.objects.filter(hsn_code=hsn).exclude(description__exact='').values_list('description', flat=True).distinct())
-        return JsonResponse({'descriptions': descriptions})
+        return JsonResponse({'descriptions': await autocomplete.adescriptions_for_hsn(hsn)})
     except Exception as e:
         return JsonResponse({'error': str(e)}, status=400)
 
+@login_required
+@read_from_replica
+async def autocomplete_api(request):
+    """
+    Prefix/substring suggestions for the invoice form, served from memory.
+    field is one of hsn, description, buyer, gstin; rank is frequency or recency.
+    """
+    field = request.GET.get('field')
+    query = request.GET.get('q', '')
+    rank = request.GET.get('rank', 'frequency')
+    if field not in autocomplete.FIELDS:
+        return JsonResponse({'error': f"field must be one of {', '.join(autocomplete.FIELDS)}"}, status=400)
+    if rank not in autocomplete.RANKINGS:
+        return JsonResponse({'error': f"rank must be one of {', '.join(autocomplete.RANKINGS)}"}, status=400)
+    try:
+        limit = min(max(int(request.GET.get('limit', 10)), 1), 50)
+    except ValueError:
+        return JsonResponse({'error': 'limit must be an integer'}, status=400)
+
+    results = await autocomplete.asearch(field, query, limit=limit, rank=rank)
+    return JsonResponse({'results': results}, encoder=DjangoJSONEncoder)
+
 # ------------------------- Logout: For Template User (HTML redirect) -------------------------
 def logout_view(request):
     logout(request)
@@ -828,8 +945,21 @@ def edit_invoice_view(request, invoice_id):
         try:
             data = json.loads(request.body)
             with transaction.atomic():
+                # Lock the row so concurrent edits read their "before" one after the other
+                invoice = Invoice.objects.select_for_update().get(pk=invoice_id)
+                rollup_before = invoice_contribution(invoice.id)
+                buyer_before = invoice.buyer_id
+
                 # --- Update main Invoice ---
                 invoice.invoice_date = datetime.strptime(data.get('invoice_date'), '%d-%m-%Y').date()
+                closing.ensure_open(rollup_before['invoice_date'], invoice.invoice_date)
+                # A partitioned invoice table only enforces unique numbers within
+                # a financial year (core.partitioning), and a new date can move
+                # the invoice into another year's partition
+                if Invoice.objects.filter(invoice_number=invoice.invoice_number).exclude(pk=invoice.pk).exists():
+                    return JsonResponse(
+                        {'error': f"Invoice number {invoice.invoice_number} is used by another invoice."}, status=409,
+                    )
                 invoice.buyer_name = data.get('buyer_name').upper() if data.get('buyer_name') else ''
                 invoice.buyer_address = data.get('buyer_address').upper() if data.get('buyer_address') else ''
                 invoice.buyer_gstin = data.get('buyer_gstin', '')
@@ -856,37 +986,29 @@ def edit_invoice_view(request, invoice_id):
                 invoice.transport_address = data.get('transport_address', '')
                 invoice.transport_gstin = data.get('transport_gstin', '')
 
-                # --- Sync Invoice Items ---
-                frontend_item_ids = {item['id'] for item in data.get('items', []) if 'id' in item}
-                invoice.items.exclude(id__in=frontend_item_ids).delete()
-
                  # Optional override: manually update updated_on
                 invoice.updated_on = now()
 
+                buyers.link([invoice])
                 invoice.save()
+                if (invoice.buyer_id, invoice.invoice_date) != (buyer_before, rollup_before['invoice_date']):
+                    buyers.refresh([buyer_before])
 
-                for item_data in data.get('items', []):
-                    item_id = item_data.get('id')
-                    if item_id:
-                        InvoiceItem.objects.filter(id=item_id, invoice=invoice).update(
-                            description=item_data.get('description'),
-                            hsn_code=item_data.get('hsn_code'),
-                            quantity=item_data.get('quantity'),
-                            rate=item_data.get('rate'),
-                            gst_rate=item_data.get('gst_rate')
-                        )
-                    else:
-                        InvoiceItem.objects.create(
-                            invoice=invoice,
-                            description=item_data.get('description'),
-                            hsn_code=item_data.get('hsn_code'),
-                            quantity=item_data.get('quantity'),
-                            rate=item_data.get('rate'),
-                            gst_rate=item_data.get('gst_rate')
-                        )
+                # --- Sync Invoice Items ---
+                sync_invoice_items(invoice, data.get('items', []))
+
+                apply_invoice_delta(old=rollup_before, new=invoice_contribution(invoice.id))
+                gst_reports.invalidate(rollup_before['invoice_date'], invoice.invoice_date)
+                transaction.on_commit(lambda: pdf_cache.invalidate(invoice.id))
+                pdf_jobs.enqueue_on_commit(invoice.id)
+                autocomplete.refresh_on_commit()
 
             return JsonResponse({'message': 'Invoice updated successfully!', 'invoice_id': invoice.id}, status=200)
 
+        except Invoice.DoesNotExist:
+            return JsonResponse({'error': 'Invoice not found.'}, status=404)
+        except closing.YearClosed as e:
+            return JsonResponse({'error': str(e)}, status=403)
         except Exception as e:
             traceback.print_exc()
             return JsonResponse({'error': f'An unexpected error occurred: {str(e)}'}, status=500)
@@ -894,6 +1016,45 @@ def edit_invoice_view(request, invoice_id):
     return JsonResponse({'error': 'Method not allowed'}, status=405)
 
 
+def sync_invoice_items(invoice, items_data):
+    """
+    Make the invoice's items match the posted list in a fixed number of
+    queries: one read, then at most one delete, one bulk update and one bulk
+    insert. Posted items with an id update that item (ids belonging to other
+    invoices are ignored), items without one are added, and saved items
+    missing from the list are removed.
+    """
+    existing = {item.id: item for item in invoice.items.all()}
+    fields = [InvoiceItem._meta.get_field(f) for f in INVOICE_ITEM_FIELDS]
+
+    to_create, to_update, kept = [], [], set()
+    for item_data in items_data:
+        item_id = item_data.get('id')
+        if not item_id:
+            to_create.append(InvoiceItem(invoice=invoice, **{f: item_data.get(f) for f in INVOICE_ITEM_FIELDS}))
+            continue
+        item = existing.get(int(item_id))
+        if item is None:
+            continue
+        kept.add(item.id)
+        changed = False
+        for field in fields:
+            value = field.to_python(item_data.get(field.name))
+            if value != getattr(item, field.attname):
+                setattr(item, field.attname, value)
+                changed = True
+        if changed:
+            to_update.append(item)
+
+    removed = existing.keys() - kept
+    if removed:
+        InvoiceItem.objects.filter(id__in=removed).delete()
+    if to_update:
+        InvoiceItem.objects.bulk_update(to_update, INVOICE_ITEM_FIELDS)
+    if to_create:
+        InvoiceItem.objects.bulk_create(to_create)
+
+
 # -------------------delete invoice -------------------
 @login_required
 def delete_invoice_view(request, invoice_id):
@@ -901,9 +1062,30 @@ def delete_invoice_view(request, invoice_id):
     Deletes an invoice.
     """
     try:
-        invoice = get_object_or_404(Invoice, pk=invoice_id)
-        invoice.delete()
+        with transaction.atomic():
+            # Locked so a double-submitted delete cannot subtract the invoice from the rollups twice
+            invoice = Invoice.objects.select_for_update().filter(pk=invoice_id).first()
+            if invoice is None:
+                return JsonResponse({'error': 'Invoice not found.'}, status=404)
+            closing.ensure_open(invoice.invoice_date)
+            rollup_before = invoice_contribution(invoice.id)
+            invoice.delete()
+            buyers.refresh([invoice.buyer_id])
+            apply_invoice_delta(old=rollup_before)
+            gst_reports.invalidate(rollup_before['invoice_date'])
+            transaction.on_commit(lambda: pdf_cache.invalidate(invoice_id))
         return JsonResponse({'message': 'Invoice deleted successfully!'}, status=200)
 
+    except closing.YearClosed as e:
+        return JsonResponse({'error': str(e)}, status=403)
     except Exception as e:
         return JsonResponse({'error': f'An error occurred: {str(e)}'}, status=500)
+
+
+# ------------------------- Metrics (Prometheus) -------------------------
+@api_view(['GET'])
+@authentication_classes([SessionAuthentication, TokenAuthentication])
+@permission_classes([IsAdminUser])
+def metrics_view(request):
+    """Per-view request histograms for staff, or a scraper using a staff user's API token."""
+    return HttpResponse(metrics.exposition(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -21,6 +21,10 @@ PY
 echo "Running migrations..."
 python manage.py migrate --noinput
 
+# Only adds the coming years' partitions, and only once the table has been
+# partitioned with --convert; otherwise it does nothing
+python manage.py partition_invoices
+
 echo "Collecting static files..."
 python manage.py collectstatic --noinput
 
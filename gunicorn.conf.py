@@ -0,0 +1,34 @@
+# Picked up automatically by gunicorn when started from the project root
+# (the Docker image's working directory).
+import os
+
+# SERVER_MODE=asgi runs the same app through uvicorn workers: async views
+# (invoice list, buyer/HSN lookups, autocomplete) share one event loop, and
+# sync views such as PDF rendering run in a thread beside it.
+if os.getenv('SERVER_MODE', 'wsgi').lower() == 'asgi':
+    wsgi_app = 'config.asgi:application'
+    worker_class = 'uvicorn_worker.UvicornWorker'
+else:
+    wsgi_app = 'config.wsgi:application'
+
+
+def on_starting(server):
+    # Workers' metric snapshots (core.metrics) start from zero with each server
+    metrics_dir = os.getenv('METRICS_DIR')
+    if metrics_dir and os.path.isdir(metrics_dir):
+        for name in os.listdir(metrics_dir):
+            if name.startswith('metrics-'):
+                os.remove(os.path.join(metrics_dir, name))
+
+
+def post_worker_init(worker):
+    # Load PDF fonts and styles before the worker takes its first request
+    from core import autocomplete, pdf_resources
+    pdf_resources.warm_up()
+
+    # Build the autocomplete index up front; if the database isn't reachable
+    # yet, the first lookup builds it instead
+    try:
+        autocomplete.warm_up()
+    except Exception:
+        worker.log.exception("Autocomplete warm-up failed")